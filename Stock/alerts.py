@@ -0,0 +1,358 @@
+"""
+Resident intraday alert daemon.
+
+Instead of a cold run that imports, downloads, renders and posts every time, the
+daemon keeps one StockData per watched ticker in memory. Every poll fetches the bars
+closed since the last one for the whole watchlist in one bulk call, appends them
+incrementally and checks a few cheap triggers against the state before the update:
+
+level_cross: the close moved through a key level
+gap_new:     one of the new bars opened a gap
+gap_filled:  one of the new bars filled an earlier gap
+sma_cross:   the fast SMA crossed the slow one (SMA_20 / SMA_94 by default)
+
+Only tickers with a fired trigger get a chart rendered and sent through MyBot.
+ReplayFeed serves bars from local fixtures a step at a time, so a session can be
+replayed offline without Yahoo or Telegram.
+
+Usage:
+    python -m Stock.alerts [--tickers ^GSPC ^NDX] [--interval 5m] [--period-days 30] [--poll 60]
+                           [--text-only] [--dry-run]
+    python -m Stock.alerts --replay bars.csv [more.csv ...] [--interval 5m] [--warmup 500] [--step 1]
+"""
+import argparse
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from github_logger import log, log_error
+from Stock.cache import OHLCV_COLUMNS, Fetcher, YahooFetcher, align_timestamp
+from Stock.data import StockData
+from Stock.timeframes import interval_length
+
+ALERT_KINDS = ('level_cross', 'gap_new', 'gap_filled', 'sma_cross')
+DEFAULT_CROSS = ('SMA_20', 'SMA_94')
+
+
+@dataclass
+class Alert:
+    ticker: str
+    time: pd.Timestamp
+    kind: str  # One of ALERT_KINDS
+    price: float
+    detail: str
+
+
+@dataclass
+class Watch:
+    """A watched ticker's analyzer and the state the next update is compared against"""
+    analyzer: StockData
+    bars: int = 0
+    close: Optional[float] = None
+    spread: float = np.nan  # Fast minus slow SMA on the last bar
+
+
+def closed_bars(frame: pd.DataFrame, after: Optional[pd.Timestamp], now: pd.Timestamp,
+                bar_length: pd.Timedelta) -> tuple[pd.DatetimeIndex, np.ndarray]:
+    """
+    Index and (bars x OHLCV_COLUMNS) values of the complete bars after `after` that had
+    closed by now, Yahoo's newest intraday row is still forming. Rows are located by
+    bisection on the index.
+    """
+    index = frame.index
+    # Bisecting the int64 nanoseconds skips boxing and validating a Timestamp per lookup
+    times = index.as_unit('ns').asi8
+    first = np.searchsorted(times, align_timestamp(after, index).value, side='right') if after is not None else 0
+    last = np.searchsorted(times, (align_timestamp(now, index) - bar_length).value, side='right')
+    if last <= first:
+        return index[:0], np.empty((0, len(OHLCV_COLUMNS)))
+
+    values = frame.to_numpy(dtype=float)[first:last]
+    if frame.columns.tolist() != OHLCV_COLUMNS:
+        values = values[:, frame.columns.get_indexer(OHLCV_COLUMNS)]
+    index = index[first:last]
+    complete = ~np.isnan(values).any(axis=1)
+    if not complete.all():
+        index, values = index[complete], values[complete]
+    return index, values
+
+
+def _remember(watch: Watch, fast: str, slow: str) -> None:
+    analyzer = watch.analyzer
+    watch.close = float(analyzer.get_last('Close'))
+    watch.spread = float(analyzer.get_last(fast) - analyzer.get_last(slow))
+
+
+def check_triggers(watch: Watch, appended: int, fast: str = DEFAULT_CROSS[0],
+                   slow: str = DEFAULT_CROSS[1]) -> list[Alert]:
+    """Alerts fired by the appended bars the analyzer just absorbed, then move watch on to the new state"""
+    analyzer = watch.analyzer
+    ticker, first_new_bar = analyzer.ticker, watch.bars
+    timestamp = analyzer.last_timestamp()
+    prev_close, prev_spread = watch.close, watch.spread
+    watch.bars += appended
+    _remember(watch, fast, slow)
+    alerts = []
+
+    # Key level ids are positions in analyzer.key_levels, the price index finds the crossed ones by bisection
+    if prev_close is not None and prev_close != watch.close:
+        ids = analyzer.level_index.between(min(prev_close, watch.close), max(prev_close, watch.close))
+        direction = 'above' if watch.close > prev_close else 'below'
+        for i in ids.tolist():
+            price = analyzer.key_levels[i].price
+            if price != prev_close:
+                alerts.append(Alert(ticker, timestamp, 'level_cross', price, f"crossed {direction} key level {price:.2f}"))
+
+    gaps = analyzer.gaps
+    for row in np.flatnonzero(gaps.index >= first_new_bar).tolist():
+        direction = 'up' if gaps.is_up[row] else 'down'
+        alerts.append(Alert(ticker, timestamp, 'gap_new', float(gaps.gap_from[row]),
+                            f"new {direction} gap {gaps.gap_from[row]:.2f} -> {gaps.gap_to[row]:.2f}"))
+    for row in np.flatnonzero(gaps.fill_index >= first_new_bar).tolist():
+        direction = 'up' if gaps.is_up[row] else 'down'
+        alerts.append(Alert(ticker, timestamp, 'gap_filled', float(gaps.gap_from[row]),
+                            f"filled {direction} gap at {gaps.gap_from[row]:.2f}"))
+
+    # NaN spreads (too few bars for the slow SMA) compare as no sign and never cross
+    if np.sign(prev_spread) * np.sign(watch.spread) < 0:
+        direction = 'above' if watch.spread > 0 else 'below'
+        alerts.append(Alert(ticker, timestamp, 'sma_cross', float(analyzer.get_last(fast)),
+                            f"{fast} crossed {direction} {slow}"))
+    return alerts
+
+
+def format_alerts(alerts: Sequence[Alert]) -> str:
+    """One line per alert, prefixed with the time of the bar that fired it"""
+    lines = []
+    for alert in alerts:
+        timestamp = alert.time.strftime('%d-%m-%Y %H:%M')
+        lines.append(f"{timestamp} {alert.ticker}: {alert.detail}")
+    return "\n".join(lines)
+
+
+class PrintNotifier:
+    """Stands in for MyBot in dry runs and replays, printing what would have been sent"""
+
+    async def send_message_to_group(self, text: str) -> None:
+        print(text)
+
+    async def send_charts_to_group(self, charts) -> None:
+        for image, caption in charts:
+            size = len(image.getvalue()) if image is not None else 0
+            print(f"[chart {size} bytes]\n{caption}")
+
+
+class AlertDaemon:
+    """
+    Keeps a StockData per ticker in memory and sends charts only when a trigger fires.
+
+    fetcher is a Stock.cache Fetcher (one yf.download for the watchlist by default),
+    notifier anything with MyBot's send_message_to_group / send_charts_to_group, and
+    clock returns the current time, bars are only appended once they have closed.
+    analyzer_options go to every StockData.
+    """
+
+    def __init__(self, tickers: Sequence[str], interval: str = '5m', period_days: int = 30,
+                 fetcher: Optional[Fetcher] = None, notifier=None, poll_seconds: float = 60.0,
+                 render: bool = True, cross: tuple[str, str] = DEFAULT_CROSS,
+                 clock: Optional[Callable[[], pd.Timestamp]] = None, render_options: Optional[dict] = None,
+                 **analyzer_options):
+        self.tickers = [ticker.upper() for ticker in tickers]
+        self.interval = interval
+        self.period_days = period_days
+        self.fetcher = fetcher or YahooFetcher()
+        self.notifier = notifier
+        self.poll_seconds = poll_seconds
+        self.render = render
+        self.cross = cross
+        self.clock = clock or (lambda: pd.Timestamp.now(tz='UTC'))
+        self.render_options = render_options or {}
+        self.bar_length = interval_length(interval)
+
+        # The cross is read on every poll, so both SMAs have to be columns and not lazy indicators
+        indicators = tuple(analyzer_options.pop('indicators', StockData.INDICATORS))
+        self.analyzer_options = dict(analyzer_options, indicators=indicators + tuple(
+            name for name in cross if name not in indicators
+        ))
+        self.watches: dict[str, Watch] = {}
+        self.last_poll_cpu = 0.0
+
+    def _watch(self, ticker: str, index: pd.DatetimeIndex, values: np.ndarray) -> Watch:
+        analyzer = StockData(ticker, self.period_days, self.interval, **self.analyzer_options)
+        analyzer.append_arrays(index, values)
+        watch = Watch(analyzer, bars=len(index))
+        _remember(watch, *self.cross)
+        return watch
+
+    def _fetch(self) -> dict[str, pd.DataFrame]:
+        """New tickers get their whole history, watched ones the bars since the oldest last bar among them"""
+        frames = {}
+        missing = [ticker for ticker in self.tickers if ticker not in self.watches]
+        if missing:
+            frames.update(self.fetcher(missing, self.interval, period=f"{self.period_days}d"))
+        watched = [ticker for ticker in self.tickers if ticker in self.watches]
+        if watched:
+            since = min(self.watches[ticker].analyzer.last_timestamp() for ticker in watched)
+            frames.update(self.fetcher(watched, self.interval, start=since))
+        return frames
+
+    def poll(self) -> list[Alert]:
+        """Append the bars closed since the last poll and return the triggers they fired"""
+        frames = self._fetch()
+        cpu_start = time.process_time()
+        now = self.clock()
+        alerts = []
+        for ticker, frame in frames.items():
+            watch = self.watches.get(ticker)
+            after = watch.analyzer.last_timestamp() if watch is not None else None
+            index, values = closed_bars(frame, after, now, self.bar_length)
+            if not len(index):
+                continue
+            if watch is None:
+                # The first poll of a ticker only builds its state, there is nothing to compare against
+                self.watches[ticker] = self._watch(ticker, index, values)
+                continue
+            watch.analyzer.append_arrays(index, values)
+            alerts.extend(check_triggers(watch, len(index), *self.cross))
+        self.last_poll_cpu = time.process_time() - cpu_start
+        return alerts
+
+    async def notify(self, alerts: Sequence[Alert]) -> None:
+        """Send one chart per ticker with its alerts as the caption, or a single message without rendering"""
+        if self.notifier is None:
+            from telegram_bot import MyBot
+
+            self.notifier = MyBot()
+        if not self.render:
+            await self.notifier.send_message_to_group(format_alerts(alerts))
+            return
+
+        from Stock.img_generator import ImgGenerator
+
+        by_ticker: dict[str, list[Alert]] = {}
+        for alert in alerts:
+            by_ticker.setdefault(alert.ticker, []).append(alert)
+
+        # The daemon stays resident, so matplotlib and its fonts load with the first chart only
+        loop = asyncio.get_running_loop()
+        charts = []
+        for ticker, ticker_alerts in by_ticker.items():
+            render = partial(ImgGenerator.run, self.watches[ticker].analyzer, **self.render_options)
+            charts.append((await loop.run_in_executor(None, render), format_alerts(ticker_alerts)))
+        await self.notifier.send_charts_to_group(charts)
+
+    async def run(self, polls: Optional[int] = None) -> None:
+        """Poll every poll_seconds, forever unless a number of polls is given, a failed poll or send is logged"""
+        loop = asyncio.get_running_loop()
+        count = 0
+        while polls is None or count < polls:
+            started = time.monotonic()
+            try:
+                alerts = await loop.run_in_executor(None, self.poll)
+                if alerts:
+                    log(f"{len(alerts)} alerts, poll took {self.last_poll_cpu * 1000:.1f}ms cpu")
+                    await self.notify(alerts)
+            except Exception as e:
+                log_error(f"Alert poll failed: {e}")
+            count += 1
+            await asyncio.sleep(max(0.0, self.poll_seconds - (time.monotonic() - started)))
+
+
+class ReplayFeed:
+    """
+    Fetcher over local frames that only reveals bars up to a moving point in time.
+    Every advance() reveals the next step bars of the shared time axis, use feed.clock
+    as the daemon's clock so all revealed bars count as closed.
+    """
+
+    def __init__(self, frames: dict[str, pd.DataFrame], interval: str, warmup: int = 100, step: int = 1):
+        if warmup < 2 or step < 1:
+            raise ValueError("warmup must be at least 2 bars and step at least 1")
+        self.frames = {ticker.upper(): frame[OHLCV_COLUMNS].dropna().sort_index() for ticker, frame in frames.items()}
+        indexes = [pd.DatetimeIndex(frame.index) for frame in self.frames.values()]
+        self.times = indexes[0].append(indexes[1:]).unique().sort_values()
+        if len(self.times) < warmup:
+            raise ValueError(f"Need at least {warmup} bars to replay, got {len(self.times)}")
+        self.bar_length = interval_length(interval)
+        self.position = warmup
+        self.step = step
+
+    def clock(self) -> pd.Timestamp:
+        return self.times[self.position - 1] + self.bar_length
+
+    def advance(self) -> bool:
+        """Reveal the next step, False once every bar has been served"""
+        if self.position >= len(self.times):
+            return False
+        self.position = min(self.position + self.step, len(self.times))
+        return True
+
+    def __call__(self, tickers: list[str], interval: str, **window) -> dict[str, pd.DataFrame]:
+        now = self.times[self.position - 1]
+        frames = {}
+        for ticker in tickers:
+            frame = self.frames.get(ticker)
+            if frame is None:
+                continue
+            end = frame.index.searchsorted(align_timestamp(now, frame.index), side='right')
+            if 'start' in window:
+                start = frame.index.searchsorted(align_timestamp(pd.Timestamp(window['start']), frame.index))
+            else:
+                days = int(str(window['period']).rstrip('d'))
+                start = frame.index.searchsorted(frame.index[max(end - 1, 0)] - pd.Timedelta(days=days))
+            if end > start:
+                frames[ticker] = frame.iloc[start:end]
+        return frames
+
+
+async def replay(daemon: AlertDaemon, feed: ReplayFeed) -> list[Alert]:
+    """Load the warmup bars, then poll once per feed step without sleeping, returns every alert fired"""
+    daemon.poll()
+    fired = []
+    while feed.advance():
+        alerts = daemon.poll()
+        if alerts:
+            await daemon.notify(alerts)
+            fired.extend(alerts)
+    return fired
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', nargs='+', default=['^GSPC'])
+    parser.add_argument('--interval', default='5m')
+    parser.add_argument('--period-days', type=int, default=30, help="History loaded when a ticker is first watched")
+    parser.add_argument('--poll', type=float, default=60.0, help="Seconds between polls")
+    parser.add_argument('--text-only', action='store_true', help="Send the alerts as a message without charts")
+    parser.add_argument('--dry-run', action='store_true', help="Print alerts instead of sending them")
+    parser.add_argument('--replay', nargs='+', default=None, help="CSV or Parquet fixtures, the ticker is the file name")
+    parser.add_argument('--warmup', type=int, default=500, help="Replay: bars loaded before the first poll")
+    parser.add_argument('--step', type=int, default=1, help="Replay: bars revealed per poll")
+    args = parser.parse_args()
+
+    if args.replay:
+        from Stock.backtest import load_bars
+
+        frames = {os.path.splitext(os.path.basename(path))[0]: load_bars(path) for path in args.replay}
+        feed = ReplayFeed(frames, args.interval, warmup=args.warmup, step=args.step)
+        daemon = AlertDaemon(list(feed.frames), args.interval, fetcher=feed, clock=feed.clock,
+                             notifier=PrintNotifier(), render=not args.text_only)
+        start = time.perf_counter()
+        alerts = asyncio.run(replay(daemon, feed))
+        print(f"\nReplayed {len(feed.times)} bars of {len(frames)} tickers in {time.perf_counter() - start:.2f}s, "
+              f"{len(alerts)} alerts")
+        return
+
+    daemon = AlertDaemon(args.tickers, args.interval, period_days=args.period_days, poll_seconds=args.poll,
+                         notifier=PrintNotifier() if args.dry_run else None, render=not args.text_only)
+    asyncio.run(daemon.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Replay a historical OHLCV series through StockData and record what the daily
+message would have said at every step.
+
+The expanding replay appends bars to one StockData, so gaps, key levels and
+islands are updated incrementally instead of re-analyzing the whole history at
+each step. With --window every step re-analyzes only the trailing window bars
+(walk-forward). Bars come from a local CSV or Parquet fixture, nothing is downloaded.
+
+Usage:
+    python -m Stock.backtest bars.csv [--ticker ^GSPC] [--interval 1d] [--warmup 100]
+                                      [--step 1] [--window 500] [--results-db .results/results.sqlite]
+                                      [--output report.csv]
+"""
+import argparse
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from message import message_generator
+from Stock.cache import OHLCV_COLUMNS
+from Stock.data import StockData
+from Stock.results_store import ResultsStore
+
+
+@dataclass
+class BacktestStep:
+    time: pd.Timestamp
+    bars: int
+    close: Optional[float] = None
+    support: Optional[float] = None
+    resistance: Optional[float] = None
+    gaps: int = 0
+    open_gaps: int = 0
+    key_levels: int = 0
+    islands: int = 0
+    message: Optional[str] = None
+    error: Optional[str] = None
+
+
+def load_bars(path: str) -> pd.DataFrame:
+    """Read an OHLCV fixture from .csv or .parquet, indexed by bar time"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        frame = pd.read_csv(path, index_col=0)
+    elif extension in ('.parquet', '.pq'):
+        frame = pd.read_parquet(path)
+    else:
+        raise ValueError(f"Unsupported fixture format {extension!r}, expected .csv or .parquet")
+
+    index = pd.to_datetime(frame.index)
+    if not isinstance(index, pd.DatetimeIndex):
+        # Mixed UTC offsets (e.g. across daylight saving) only parse onto a common UTC axis
+        index = pd.to_datetime(frame.index, utc=True)
+    frame.index = index
+    missing = [col for col in OHLCV_COLUMNS if col not in frame.columns]
+    if missing:
+        raise ValueError(f"Fixture {path} is missing columns {missing}")
+    return frame[OHLCV_COLUMNS].dropna().sort_index()
+
+
+def replay(bars: pd.DataFrame, warmup: int = 100, step: int = 1, window: Optional[int] = None,
+           ticker: str = 'BACKTEST', interval: str = '1d', key_level_method: str = 'chain') -> Iterator[StockData]:
+    """
+    Yield the analyzer as it would have looked after every step of bars.
+    The expanding replay yields the same StockData object each time, updated in place.
+    """
+    if warmup < 2 or step < 1:
+        raise ValueError("warmup must be at least 2 bars and step at least 1")
+    if len(bars) < warmup:
+        raise ValueError(f"Need at least {warmup} bars to replay, got {len(bars)}")
+
+    period_days = (bars.index[-1] - bars.index[0]).days + 1
+    ends = list(range(warmup, len(bars), step)) + [len(bars)]
+
+    if window is not None:
+        for end in ends:
+            analyzer = StockData(ticker, period_days, interval, key_level_method=key_level_method)
+            analyzer.data = bars.iloc[max(end - window, 0):end].copy()
+            analyzer.analyze()
+            yield analyzer
+        return
+
+    index = pd.DatetimeIndex(bars.index)
+    values = bars[OHLCV_COLUMNS].to_numpy(dtype=float)
+    analyzer = StockData(ticker, period_days, interval, key_level_method=key_level_method)
+    start = 0
+    for end in ends:
+        analyzer.append_arrays(index[start:end], values[start:end])
+        start = end
+        yield analyzer
+
+
+def record_step(analyzer: StockData, bars: int, breadth: str) -> BacktestStep:
+    """Snapshot one replay step, including the message or the reason it could not be built"""
+    close = analyzer.get_last('Close')
+    levels = analyzer.get_surrounding_key_levels()
+    step = BacktestStep(
+        time=analyzer.last_timestamp(),
+        bars=bars,
+        close=close,
+        support=next((p for p in levels if p < close), None),
+        resistance=next((p for p in levels if p > close), None),
+        gaps=len(analyzer.gaps),
+        open_gaps=len(analyzer.open_gap_index),
+        key_levels=len(analyzer.key_levels),
+        islands=len(analyzer.islands)
+    )
+    try:
+        step.message = message_generator(analyzer, breadth=breadth, as_of=step.time)
+    except Exception as e:
+        step.error = f"{type(e).__name__}: {e}"
+    return step
+
+
+def _breadth_as_of(breadth: Optional[pd.Series], timestamp: pd.Timestamp) -> str:
+    if breadth is None:
+        return "S5TW 20 SMA: n/a"
+    percentage = breadth.asof(timestamp)
+    return f"S5TW 20 SMA: {round(percentage, 2) if not np.isnan(percentage) else 0}%"
+
+
+def run_backtest(bars: pd.DataFrame, warmup: int = 100, step: int = 1, window: Optional[int] = None,
+                 ticker: str = 'BACKTEST', interval: str = '1d', key_level_method: str = 'chain',
+                 breadth: Optional[pd.Series] = None) -> pd.DataFrame:
+    """
+    Replay bars and return one row per step with levels, counts and the message.
+    breadth is an optional percentage series (e.g. compute_breadth(...)['SMA_20']) read as of each step.
+    """
+    bars = bars[OHLCV_COLUMNS].dropna()
+    rows = []
+    for analyzer in replay(bars, warmup, step, window, ticker, interval, key_level_method):
+        timestamp = analyzer.last_timestamp()
+        position = bars.index.get_loc(timestamp) + 1
+        rows.append(vars(record_step(analyzer, position, _breadth_as_of(breadth, timestamp))))
+    return pd.DataFrame(rows).set_index('time')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('fixture', help="CSV or Parquet file with Open/High/Low/Close/Volume columns")
+    parser.add_argument('--ticker', default='BACKTEST')
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--warmup', type=int, default=100, help="Bars analyzed before the first step")
+    parser.add_argument('--step', type=int, default=1, help="Bars appended per step")
+    parser.add_argument('--window', type=int, default=None, help="Walk-forward: analyze only the trailing bars")
+    parser.add_argument('--key-level-method', default='chain')
+    parser.add_argument('--results-db', default=None, help="Read breadth as of each step from this results store")
+    parser.add_argument('--output', default=None, help="Optional CSV path for the step table")
+    args = parser.parse_args()
+
+    bars = load_bars(args.fixture)
+    breadth = None
+    if args.results_db:
+        breadth = ResultsStore(args.results_db).breadth_history(20)
+        # The store keeps UTC, asof needs the same kind of axis as the bars
+        tz = pd.DatetimeIndex(bars.index).tz
+        breadth.index = breadth.index.tz_convert(tz) if tz is not None else breadth.index.tz_localize(None)
+    start = time.perf_counter()
+    report = run_backtest(
+        bars,
+        warmup=args.warmup,
+        step=args.step,
+        window=args.window,
+        ticker=args.ticker,
+        interval=args.interval,
+        key_level_method=args.key_level_method,
+        breadth=breadth
+    )
+    elapsed = time.perf_counter() - start
+
+    print(report.drop(columns='message').tail(20).to_string())
+    print(f"\nReplayed {len(bars)} bars in {len(report)} steps in {elapsed:.2f}s "
+          f"({report['error'].notna().sum()} steps without a message)")
+    if args.output:
+        report.to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Run the StockData gap / key-level / island pipeline over a whole ticker universe.
+
+Bars for every ticker come from one bulk download (or the local OHLCV cache),
+then the per-ticker analysis is spread over a process pool.
+
+Usage:
+    python -m Stock.batch [--period-days 500] [--interval 1d] [--workers 8] [--output summary.csv]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pandas as pd
+
+from constants import TICKERS
+from Stock.cache import OHLCVCache, YahooFetcher
+from Stock.custom_dataclasses import GapTable, Island, KeyLevel
+from Stock.data import StockData
+
+
+@dataclass
+class TickerResult:
+    ticker: str
+    bars: int = 0
+    gaps: GapTable = field(default_factory=GapTable)
+    key_levels: list[KeyLevel] = field(default_factory=list)
+    islands: list[Island] = field(default_factory=list)
+    close: Optional[float] = None
+    support: Optional[float] = None
+    resistance: Optional[float] = None
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+def analyze_ticker(ticker: str, frame: pd.DataFrame, period_days: int, interval: str) -> TickerResult:
+    """Analyze one ticker's bars, runs inside a worker process"""
+    start = time.perf_counter()
+    result = TickerResult(ticker=ticker, bars=len(frame))
+    try:
+        analyzer = StockData(ticker, period_days, interval)
+        analyzer.data = frame
+        analyzer.analyze()
+
+        close = analyzer.get_last('Close')
+        levels = analyzer.get_surrounding_key_levels()
+        result.gaps = analyzer.gaps
+        result.key_levels = analyzer.key_levels
+        result.islands = analyzer.islands
+        result.close = close
+        result.support = next((p for p in levels if p < close), None)
+        result.resistance = next((p for p in levels if p > close), None)
+    except Exception as e:
+        result.error = str(e)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def _analyze_item(item: tuple) -> TickerResult:
+    return analyze_ticker(*item)
+
+
+def summarize(results: list[TickerResult]) -> pd.DataFrame:
+    """One row per ticker with result counts, nearest levels and timing"""
+    rows = [{
+        'ticker': r.ticker,
+        'bars': r.bars,
+        'gaps': len(r.gaps),
+        'open_gaps': int((~r.gaps.filled).sum()),
+        'key_levels': len(r.key_levels),
+        'islands': len(r.islands),
+        'close': r.close,
+        'support': r.support,
+        'resistance': r.resistance,
+        'seconds': r.seconds,
+        'error': r.error
+    } for r in results]
+    return pd.DataFrame(rows).set_index('ticker')
+
+
+def run_batch(tickers: list[str] = TICKERS, period_days: int = 500, interval: str = '1d',
+              cache: Optional[OHLCVCache] = None, workers: Optional[int] = None) -> tuple[pd.DataFrame, list[TickerResult]]:
+    """Download all tickers in one go, analyze them in parallel and return (summary, results)"""
+    if cache is not None:
+        frames = cache.get_many(list(tickers), interval, period_days)
+    else:
+        frames = YahooFetcher()(list(tickers), interval, period=f"{period_days}d")
+
+    items = [(ticker, frames[ticker], period_days, interval) for ticker in tickers if ticker in frames]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        results = [_analyze_item(item) for item in items]
+    else:
+        # A few chunks per worker keeps the pickling overhead low while balancing uneven tickers
+        chunksize = max(1, len(items) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_analyze_item, items, chunksize=chunksize))
+
+    missing = [TickerResult(ticker=t, error="No data found") for t in tickers if t not in frames]
+    results += missing
+    return summarize(results), results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--period-days', type=int, default=500)
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-cache', action='store_true', help="Download directly instead of using the OHLCV cache")
+    parser.add_argument('--output', default=None, help="Optional CSV path for the summary table")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary, _ = run_batch(
+        period_days=args.period_days,
+        interval=args.interval,
+        cache=None if args.no_cache else OHLCVCache(),
+        workers=args.workers
+    )
+    elapsed = time.perf_counter() - start
+
+    print(summary.to_string())
+    print(f"\nAnalyzed {len(summary)} tickers in {elapsed:.2f}s "
+          f"({summary['seconds'].sum():.2f}s of per-ticker analysis)")
+    if args.output:
+        summary.to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import json
+import os
+import shutil
+import time
+from datetime import timedelta
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from profiler import add_bytes
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+DEFAULT_CACHE_DIR = os.getenv("OHLCV_CACHE_DIR", ".ohlcv_cache")
+
+# A fetcher takes (tickers, interval, **window) where window is either period="30d"
+# or start=<timestamp>, and returns {ticker: OHLCV frame} for the tickers it found
+Fetcher = Callable[..., dict[str, pd.DataFrame]]
+
+
+class YahooFetcher:
+    """Fetch OHLCV bars for many tickers with a single yf.download call"""
+
+    def __call__(self, tickers: list[str], interval: str, **window) -> dict[str, pd.DataFrame]:
+        import yfinance as yf
+
+        data = yf.download(
+            tickers,
+            interval=interval,
+            auto_adjust=True,
+            group_by='ticker',
+            progress=False,
+            threads=True,
+            **window
+        )
+        if data.empty:
+            return {}
+
+        # Older yfinance versions return flat columns for a single ticker
+        if not isinstance(data.columns, pd.MultiIndex):
+            data = pd.concat({tickers[0]: data}, axis=1)
+
+        frames = {}
+        available = set(data.columns.get_level_values(0))
+        for ticker in tickers:
+            if ticker not in available:
+                continue
+            frame = data[ticker][OHLCV_COLUMNS].dropna()
+            if not frame.empty:
+                frames[ticker] = frame
+        return frames
+
+
+class LocalFetcher:
+    """Serve bars from in-memory frames, e.g. fixtures standing in for Yahoo"""
+
+    def __init__(self, frames: dict[str, pd.DataFrame]):
+        self.frames = frames
+        self.calls = []
+
+    def __call__(self, tickers: list[str], interval: str, **window) -> dict[str, pd.DataFrame]:
+        self.calls.append((list(tickers), interval, window))
+        frames = {}
+        for ticker in tickers:
+            frame = self.frames.get(ticker)
+            if frame is None:
+                continue
+            if 'start' in window:
+                frame = frame[frame.index >= align_timestamp(pd.Timestamp(window['start']), frame.index)]
+            elif 'period' in window:
+                days = int(str(window['period']).rstrip('d'))
+                frame = frame[frame.index >= frame.index[-1] - pd.Timedelta(days=days)]
+            if not frame.empty:
+                frames[ticker] = frame[OHLCV_COLUMNS]
+        return frames
+
+
+def align_timestamp(timestamp: pd.Timestamp, index: pd.DatetimeIndex) -> pd.Timestamp:
+    """Make a timestamp comparable with an index that may or may not be timezone-aware"""
+    if index.tz is None:
+        return timestamp.tz_convert('UTC').tz_localize(None) if timestamp.tz else timestamp
+    return timestamp.tz_localize('UTC').tz_convert(index.tz) if timestamp.tz is None else timestamp
+
+
+class OHLCVCache:
+    """
+    On-disk cache of OHLCV bars keyed by (ticker, interval).
+
+    Each entry is a directory of memory-mapped .npy columns plus a meta.json.
+    Entries younger than ttl are served without any network call, older ones
+    only download the bars after the last cached timestamp, and entries not
+    refreshed for max_age are evicted.
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, fetcher: Optional[Fetcher] = None,
+                 ttl: timedelta = timedelta(minutes=15), max_age: timedelta = timedelta(days=30),
+                 clock: Callable[[], float] = time.time):
+        self.root = root
+        self.fetcher = fetcher or YahooFetcher()
+        self.ttl = ttl
+        self.max_age = max_age
+        self.clock = clock
+
+    def _path(self, ticker: str, interval: str) -> str:
+        return os.path.join(self.root, interval, ticker.replace(os.sep, '_'))
+
+    def load(self, ticker: str, interval: str) -> Optional[tuple[pd.DataFrame, dict]]:
+        """Return the cached frame and its metadata, or None if there is no complete entry"""
+        path = self._path(ticker, interval)
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                      for name in ['index'] + OHLCV_COLUMNS}
+        except (OSError, ValueError):
+            return None
+
+        # A crash between column writes leaves mismatched lengths behind
+        if any(len(arr) != meta['rows'] for arr in arrays.values()):
+            return None
+
+        index = pd.DatetimeIndex(pd.to_datetime(np.asarray(arrays.pop('index'))))
+        if meta['tz']:
+            index = index.tz_localize('UTC').tz_convert(meta['tz'])
+        return pd.DataFrame(arrays, index=index), meta
+
+    def save(self, ticker: str, interval: str, frame: pd.DataFrame, covered_from: float) -> None:
+        """Write a frame column by column, metadata last so readers never see a partial entry"""
+        path = self._path(ticker, interval)
+        os.makedirs(path, exist_ok=True)
+
+        index = pd.DatetimeIndex(frame.index)
+        arrays = {'index': index.as_unit('ns').asi8}
+        arrays.update({col: frame[col].to_numpy() for col in OHLCV_COLUMNS})
+        for name, values in arrays.items():
+            tmp_path = os.path.join(path, f'{name}.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, values)
+            os.replace(tmp_path, os.path.join(path, f'{name}.npy'))
+
+        meta = {
+            'rows': len(frame),
+            'tz': str(index.tz) if index.tz is not None else None,
+            'fetched_at': self.clock(),
+            'covered_from': covered_from
+        }
+        tmp_path = os.path.join(path, 'meta.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(path, 'meta.json'))
+
+    def get(self, ticker: str, interval: str, period_days: int) -> pd.DataFrame:
+        """Return the last period_days of bars for one ticker"""
+        frame = self.get_many([ticker], interval, period_days).get(ticker)
+        return frame if frame is not None else pd.DataFrame(columns=OHLCV_COLUMNS)
+
+    def get_many(self, tickers: list[str], interval: str, period_days: int) -> dict[str, pd.DataFrame]:
+        """Return the last period_days of bars for each ticker, fetching only what is missing"""
+        now = self.clock()
+        window_start = now - period_days * 86400
+
+        cached, covered, missing, stale = {}, {}, [], []
+        for ticker in tickers:
+            entry = self.load(ticker, interval)
+            if entry is None or entry[1]['covered_from'] > window_start:
+                missing.append(ticker)
+                continue
+            frame, meta = entry
+            cached[ticker] = frame
+            covered[ticker] = meta['covered_from']
+            if now - meta['fetched_at'] >= self.ttl.total_seconds():
+                stale.append(ticker)
+
+        # One bulk call for tickers without usable history, one for the deltas
+        if missing:
+            fetched = self.fetcher(missing, interval, period=f"{period_days}d")
+            add_bytes(received=sum(frame.memory_usage().sum() for frame in fetched.values()))
+            for ticker, frame in fetched.items():
+                self.save(ticker, interval, frame, window_start)
+                cached[ticker] = frame
+
+        if stale:
+            start = min(align_timestamp(cached[ticker].index[-1], pd.DatetimeIndex([], tz='UTC')) for ticker in stale)
+            fetched = self.fetcher(stale, interval, start=start)
+            add_bytes(received=sum(frame.memory_usage().sum() for frame in fetched.values()))
+            for ticker in stale:
+                frame = cached[ticker]
+                new = fetched.get(ticker)
+                if new is not None and not new.empty:
+                    # The last cached bar may have been incomplete, so fetched bars win
+                    frame = pd.concat([frame[frame.index < new.index[0]], new[OHLCV_COLUMNS]])
+                    cached[ticker] = frame
+                self.save(ticker, interval, frame, covered[ticker])
+
+        self.evict()
+
+        start = pd.Timestamp(window_start, unit='s', tz='UTC')
+        return {
+            ticker: frame[frame.index >= align_timestamp(start, frame.index)]
+            for ticker, frame in cached.items()
+        }
+
+    def evict(self) -> int:
+        """Delete entries that were not refreshed within max_age, returns how many were removed"""
+        if not os.path.isdir(self.root):
+            return 0
+
+        removed = 0
+        cutoff = self.clock() - self.max_age.total_seconds()
+        for interval in os.listdir(self.root):
+            interval_path = os.path.join(self.root, interval)
+            if not os.path.isdir(interval_path):
+                continue
+            for ticker in os.listdir(interval_path):
+                path = os.path.join(interval_path, ticker)
+                try:
+                    with open(os.path.join(path, 'meta.json')) as f:
+                        fetched_at = json.load(f)['fetched_at']
+                except (OSError, ValueError, KeyError):
+                    fetched_at = 0
+                if fetched_at < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+        return removed
@@ -1,35 +1,72 @@
 from datetime import datetime
+from functools import lru_cache
 from io import BytesIO
 from typing import Optional
 
 import matplotlib.pyplot as plt
 import mplfinance as mpf
-from PIL import Image
+from matplotlib.collections import PolyCollection
 
+from profiler import instrument
 from Stock.data import StockData
+from Stock.indicators import parse_indicator
+
+
+@lru_cache(maxsize=None)
+def chart_style() -> dict:
+    """The mplfinance style every chart is drawn with, built once per process"""
+    return mpf.make_mpf_style(base_mpf_style='yahoo')
 
 
 class StockChart:
-    def __init__(self, analyzer: StockData):
+    IMAGE_FORMATS = {'png': 'png', 'jpeg': 'jpeg', 'jpg': 'jpeg', 'webp': 'webp'}
+    INDICATOR_COLORS = {'SMA_20': 'green', 'SMA_94': 'red'}
+    OVERLAY_COLORS = ('orange', 'purple', 'brown', 'teal', 'olive')  # For indicators without a fixed color
+
+    def __init__(self, analyzer: StockData, size: tuple[int, int] = (1920, 1080), dpi: int = 96,
+                 image_format: str = 'png', quality: int = 90):
+        """
+        size is the output resolution in pixels and dpi the scale text and lines are drawn at,
+        the figure is laid out at size / dpi inches so it is rasterized once at the final size.
+        quality only applies to JPEG and WebP output.
+        """
+        if image_format.lower() not in self.IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
         self.analyzer = analyzer
+        self.size = size
+        self.dpi = dpi
+        self.image_format = self.IMAGE_FORMATS[image_format.lower()]
+        self.quality = quality
         self.fig = None
         self.ax = None
 
+    def _overlays(self) -> list[tuple[str, str, str]]:
+        """(column, label, color) of the analyzer's indicators drawn on the price scale, e.g. ('SMA_20', '20 SMA', 'green')"""
+        overlays, spare = [], iter(self.OVERLAY_COLORS)
+        for name in self.analyzer.indicators:
+            kind, period = parse_indicator(name)
+            if kind == 'ATR':
+                # ATR is a price range, not a price, it has no place on the candles
+                continue
+            label = f'{period} {kind}' if period is not None else kind
+            overlays.append((name, label, self.INDICATOR_COLORS.get(name) or next(spare, 'gray')))
+        return overlays
+
     def create_base_chart(self) -> None:
         """Create the base candlestick chart with moving averages"""
         add_plots = [
-            mpf.make_addplot(self.analyzer.data['SMA_20'], color='green', width=1.0),
-            mpf.make_addplot(self.analyzer.data['SMA_94'], color='red', width=1.0)
+            mpf.make_addplot(self.analyzer.data[name], color=color, width=1.0)
+            for name, _, color in self._overlays()
         ]
         
         self.fig, axlist = mpf.plot(
             self.analyzer.data,
             type='candle',
-            style='yahoo',
+            style=chart_style(),
             addplot=add_plots,
             title=f'{self.analyzer.ticker} Chart ({self.analyzer.period_days}d, {self.analyzer.interval}) - Gaps & Key Levels',
             ylabel='',
-            figsize=(20, 10),
+            figsize=(self.size[0] / self.dpi, self.size[1] / self.dpi),
             returnfig=True
         )
         
@@ -37,8 +74,9 @@ class StockChart:
         self._add_current_price_info()
 
     def _add_current_price_info(self) -> None:
-        """Add current price and timestamp to chart"""
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        """Add current price and the time of the last bar to chart"""
+        # Stamping the bar instead of the wall clock keeps the image a function of the data, see Stock.render_cache
+        current_time = self.analyzer.data.index[-1].strftime("%Y-%m-%d %H:%M")
         current_price = self.analyzer.data['Close'].iloc[-1]
         self.ax.text(
             0.98, 0.98,
@@ -50,75 +88,117 @@ class StockChart:
             bbox=dict(facecolor='white', alpha=0.7, edgecolor='none')
         )
 
+    def _cull_labels(self, xs: list[float], ys: list[float], chars: int, fontsize: int) -> list[int]:
+        """
+        Indices of the labels to draw, in priority order, skipping any label whose
+        estimated text box would overlap one that was already placed
+        """
+        pos = self.ax.get_position()
+        fig_width, fig_height = self.fig.get_size_inches()
+        y_min, y_max = self.ax.get_ylim()
+        x_per_px = (len(self.analyzer.data) + 20) / (pos.width * fig_width * self.dpi)
+        y_per_px = (y_max - y_min) / (pos.height * fig_height * self.dpi)
+
+        text_px = fontsize * self.dpi / 72
+        width = chars * 0.6 * text_px * x_per_px
+        height = text_px * y_per_px
+
+        # Bucket placed labels on a grid of label-sized cells so each check is O(1)
+        kept, cells = [], {}
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            cx, cy = int(x // width), int(y // height)
+            neighbours = ((cx + dx, cy + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+            if any(abs(x - ox) < width and abs(y - oy) < height
+                   for cell in neighbours for ox, oy in cells.get(cell, ())):
+                continue
+            cells.setdefault((cx, cy), []).append((x, y))
+            kept.append(i)
+        return kept
+
     def plot_gaps(self) -> None:
         """Visualize gaps on the chart"""
-        y_min, y_max = self.ax.get_ylim()
-        y_range = y_max - y_min
-        
-        for gap in self.analyzer.gaps:
-            # Calculate normalized y-coordinates
-            y_from = (gap.gap_from - y_min) / y_range
-            y_to = (gap.gap_to - y_min) / y_range
-            
-            # Draw gap rectangle
-            self.ax.axvspan(
-                gap.index - 0.5, gap.index + 0.5,
-                ymin=y_from,
-                ymax=y_to,
-                facecolor='none',
-                alpha=0.3 if gap.filled else 0.6,
-                edgecolor='none'
-            )
-            
-            # Add gap status label
+        gaps = self.analyzer.gaps
+        if not gaps:
+            return
+
+        # Draw all gap rectangles as a single collection
+        self.ax.add_collection(PolyCollection(
+            [[(g.index - 0.5, g.gap_from), (g.index + 0.5, g.gap_from),
+              (g.index + 0.5, g.gap_to), (g.index - 0.5, g.gap_to)] for g in gaps],
+            facecolors='none',
+            edgecolors='none',
+            alpha=[0.3 if g.filled else 0.6 for g in gaps]
+        ), autolim=False)
+
+        # Add gap status labels, open and recent gaps win when labels collide
+        ranked = sorted(gaps, key=lambda g: (g.filled, -g.index))
+        xs = [g.index - 0.4 for g in ranked]
+        ys = [(g.gap_from + g.gap_to) / 2 for g in ranked]
+        for i in self._cull_labels(xs, ys, chars=6, fontsize=7):
+            gap = ranked[i]
             self.ax.text(
-                gap.index - 0.4,
-                (gap.gap_from + gap.gap_to) / 2,
+                xs[i],
+                ys[i],
                 "Filled" if gap.filled else "Open",
                 ha='left', va='center',
                 color='black' if gap.filled else 'red',
                 fontsize=7,
                 bbox=dict(facecolor='none', alpha=0.7, edgecolor='none')
             )
-            
-            # Mark unfilled gaps with reference lines
-            if not gap.filled:
-                self.ax.hlines(  
-                    y=gap.ref_price,  
-                    xmin=gap.index - 0.5,  
-                    xmax=len(self.analyzer.data) + 10,  
-                    color='red',  
-                    linestyle='--',  
-                    alpha=0.5,  
-                    linewidth=1.5  
-                )  
-
-                # Add label to the open gap level in red  
-                self.ax.text(  
-                    gap.index - 0.5,  
-                    gap.ref_price,  
-                    f'{gap.ref_price:.2f}',  
-                    ha='right', va='center',  
-                    color='red',  
-                    fontsize=8,  
-                    bbox=dict(facecolor='none', alpha=0, edgecolor='none')  
-                )  
+
+        # Mark unfilled gaps with reference lines, one LineCollection for all of them
+        open_gaps = [g for g in reversed(gaps) if not g.filled]
+        if not open_gaps:
+            return
+
+        self.ax.hlines(
+            y=[g.ref_price for g in open_gaps],
+            xmin=[g.index - 0.5 for g in open_gaps],
+            xmax=len(self.analyzer.data) + 10,
+            color='red',
+            linestyle='--',
+            alpha=0.5,
+            linewidth=1.5
+        )
+
+        # Add label to the open gap level in red
+        xs = [g.index - 0.5 for g in open_gaps]
+        ys = [g.ref_price for g in open_gaps]
+        for i in self._cull_labels(xs, ys, chars=8, fontsize=8):
+            self.ax.text(
+                xs[i],
+                ys[i],
+                f'{ys[i]:.2f}',
+                ha='right', va='center',
+                color='red',
+                fontsize=8,
+                bbox=dict(facecolor='none', alpha=0, edgecolor='none')
+            )
 
     def plot_key_levels(self) -> None:
         """Draw significant price levels on chart"""
-        for level in self.analyzer.key_levels:
-            self.ax.hlines(
-                y=level.price,
-                xmin=level.start_index - 0.5,
-                xmax=len(self.analyzer.data) + 10,
-                color='blue',
-                linestyle='--',
-                alpha=0.5,
-                linewidth=1.5
-            )
+        levels = sorted(self.analyzer.key_levels, key=lambda level: -level.gap_count)
+        if not levels:
+            return
+
+        self.ax.hlines(
+            y=[level.price for level in levels],
+            xmin=[level.start_index - 0.5 for level in levels],
+            xmax=len(self.analyzer.data) + 10,
+            color='blue',
+            linestyle='--',
+            alpha=0.5,
+            linewidth=1.5
+        )
+
+        # Levels backed by more gaps keep their label when labels collide
+        xs = [level.start_index - 0.5 for level in levels]
+        ys = [level.price for level in levels]
+        for i in self._cull_labels(xs, ys, chars=12, fontsize=8):
+            level = levels[i]
             self.ax.text(
-                level.start_index - 0.5,
-                level.price,
+                xs[i],
+                ys[i],
                 f'{level.price:.2f} ({level.gap_count})',
                 ha='right', va='center',
                 color='blue',
@@ -128,21 +208,24 @@ class StockChart:
 
     def plot_islands(self) -> None:
         """Highlight island reversal patterns on chart"""
-        for island in self.analyzer.islands:
-            x = [island.start_index - 0.5, island.end_index + 0.5, 
-                 island.end_index + 0.5, island.start_index - 0.5]
-            y = [island.low, island.low, island.high, island.high]
-            
-            self.ax.fill(
-                x, y,
-                facecolor='purple',
-                alpha=0.1,
-                edgecolor='none'
-            )
-            
+        islands = self.analyzer.islands[::-1]
+        if not islands:
+            return
+
+        self.ax.add_collection(PolyCollection(
+            [[(i.start_index - 0.5, i.low), (i.end_index + 0.5, i.low),
+              (i.end_index + 0.5, i.high), (i.start_index - 0.5, i.high)] for i in islands],
+            facecolors='purple',
+            alpha=0.1,
+            edgecolors='none'
+        ), autolim=False)
+
+        xs = [island.start_index for island in islands]
+        ys = [island.high for island in islands]
+        for i in self._cull_labels(xs, ys, chars=6, fontsize=8):
             self.ax.text(
-                island.start_index, 
-                island.high,
+                xs[i],
+                ys[i],
                 'Island',
                 rotation=0,
                 va='bottom',
@@ -157,10 +240,8 @@ class StockChart:
         current_price = self.analyzer.data['Close'].iloc[-1]
         
         sma_labels = [
-            (self.analyzer.data['SMA_20'].iloc[-1], '20 SMA', 'green'),
-            (self.analyzer.data['SMA_94'].iloc[-1], '94 SMA', 'red'),
-            (current_price, 'Price', 'black')
-        ]
+            (self.analyzer.data[name].iloc[-1], label, color) for name, label, color in self._overlays()
+        ] + [(current_price, 'Price', 'black')]
         
         for value, label, color in sma_labels:
             self.ax.text(
@@ -178,41 +259,32 @@ class StockChart:
         self.ax.set_xlim(left=-10, right=len(self.analyzer.data)+10)
         plt.tight_layout()
 
+    def _savefig(self, target) -> None:
+        """Rasterize the figure once at the configured size and encode it straight to target"""
+        options = {}
+        if self.image_format in ('jpeg', 'webp'):
+            options['pil_kwargs'] = {'quality': self.quality}
+        self.fig.savefig(target, format=self.image_format, dpi=self.dpi, **options)
+        plt.close(self.fig)  # Close the figure to free memory
+
     def save_chart(self) -> str:
-        """Save chart and optimize image file size"""
-        image_path = f"{self.analyzer.ticker}_{datetime.now().strftime('%Y-%m-%d_%H:%M')}.png"
-        self.fig.savefig(image_path, dpi=600, bbox_inches='tight')
-        plt.close(self.fig)
-        
-        # Optimize image size
-        with Image.open(image_path) as img:
-            img.save(image_path, optimize=True, quality=85)
-        
+        """Save chart to a file in the configured format"""
+        extension = 'jpg' if self.image_format == 'jpeg' else self.image_format
+        image_path = f"{self.analyzer.ticker}_{datetime.now().strftime('%Y-%m-%d_%H:%M')}.{extension}"
+        self._savefig(image_path)
         return image_path
     
+    @instrument()
     def save_chart_to_buffer(self) -> BytesIO:
-        """Save high-quality chart to in-memory buffer with 600 DPI"""
+        """Save chart to an in-memory buffer at the configured resolution and format"""
         buffer = BytesIO()
-        
-        # Save the matplotlib figure to the buffer
-        self.fig.savefig(buffer, format='PNG', dpi=600, bbox_inches='tight')
-        plt.close(self.fig)  # Close the figure to free memory
-
-        # Optimize image with PIL
+        self._savefig(buffer)
         buffer.seek(0)
-        img = Image.open(buffer)
-
-        resized_img = img.resize((1920, 1080), Image.LANCZOS)
-
-        # Save resized image to new buffer
-        optimized_buffer = BytesIO()
-        resized_img.save(optimized_buffer, format='PNG', optimize=True, quality=95)
-        optimized_buffer.seek(0)
-
-        return optimized_buffer
+        return buffer
 
+    @instrument()
     def visualize_pipline(self) -> Optional[BytesIO]:
-        """Run complete visualization pipeline with high-quality output"""
+        """Run complete visualization pipeline"""
         try:
             self.create_base_chart()
             self.plot_gaps()
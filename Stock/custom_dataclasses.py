@@ -1,6 +1,37 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Iterator, Optional, Union
 
-@dataclass
+import numpy as np
+import pandas as pd
+
+
+def _slotted(cls):
+    """Rebuild a frozen dataclass with __slots__, as dataclass(slots=True) only exists from Python 3.10"""
+    names = tuple(f.name for f in fields(cls))
+    namespace = {key: value for key, value in cls.__dict__.items()
+                 if key not in names and key not in ('__dict__', '__weakref__')}
+    namespace['__slots__'] = names
+
+    # Frozen instances can't be restored through setattr, so pickle them as plain tuples
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in names)
+
+    def __setstate__(self, state):
+        for name, value in zip(names, state):
+            object.__setattr__(self, name, value)
+
+    namespace['__getstate__'] = __getstate__
+    namespace['__setstate__'] = __setstate__
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+def _as_naive_utc(timestamp: pd.Timestamp) -> pd.Timestamp:
+    return timestamp.tz_convert('UTC').tz_localize(None) if timestamp.tz is not None else timestamp
+
+
+@_slotted
+@dataclass(frozen=True)
 class Gap:
     index: int
     price_level: float
@@ -10,18 +41,166 @@ class Gap:
     volume: float
     ref_price: float
     filled: bool = False
+    fill_index: Optional[int] = None
+    fill_time: Optional[datetime] = None
 
 
-@dataclass
+@_slotted
+@dataclass(frozen=True)
 class KeyLevel:
     price: float
     start_index: int
     gap_count: int
 
 
-@dataclass
+@_slotted
+@dataclass(frozen=True)
+class TimeframeLevel:
+    price: float
+    gap_count: int
+    timeframes: tuple[str, ...]
+    first_seen: datetime
+
+
+@_slotted
+@dataclass(frozen=True)
 class Island:
     high: float
     low: float
     start_index: int
-    end_index: int
\ No newline at end of file
+    end_index: int
+    gap_count: int = 2
+    kind: str = 'island'  # 'island' reversal or 'exhaustion' gap, see Stock.islands
+
+
+class GapTable:
+    """
+    Struct-of-arrays store for gaps, one NumPy array per field instead of one object per gap.
+
+    Filters are array masks that return new tables. Iterating or indexing with an
+    int yields Gap views, so code written against a list of Gap keeps working.
+    Open gaps have fill_index -1 and a NaT fill_time (stored as UTC, tz kept aside).
+    """
+    COLUMNS = {
+        'index': np.int64,
+        'price_level': float,
+        'gap_from': float,
+        'gap_to': float,
+        'is_up': bool,
+        'volume': float,
+        'ref_price': float,
+        'fill_index': np.int64,
+        'fill_time': 'datetime64[ns]'
+    }
+
+    def __init__(self, tz=None, **columns):
+        size = len(columns.get('index', ()))
+        defaults = {'fill_index': np.full(size, -1), 'fill_time': np.full(size, np.datetime64('NaT'))}
+        for name, dtype in self.COLUMNS.items():
+            values = columns[name] if name in columns else defaults.get(name, ())
+            setattr(self, name, np.asarray(values, dtype=dtype))
+        self.tz = tz
+
+    @classmethod
+    def from_gaps(cls, gaps: list[Gap]) -> 'GapTable':
+        """Pack a list of Gap objects into a table"""
+        times = [pd.Timestamp(gap.fill_time) for gap in gaps if gap.fill_time is not None]
+        tz = times[0].tz if times else None
+        fill_time = [
+            _as_naive_utc(pd.Timestamp(gap.fill_time)) if gap.fill_time is not None else np.datetime64('NaT')
+            for gap in gaps
+        ]
+        return cls(
+            tz=tz,
+            index=[gap.index for gap in gaps],
+            price_level=[gap.price_level for gap in gaps],
+            gap_from=[gap.gap_from for gap in gaps],
+            gap_to=[gap.gap_to for gap in gaps],
+            is_up=[gap.gap_type == 'up' for gap in gaps],
+            volume=[gap.volume for gap in gaps],
+            ref_price=[gap.ref_price for gap in gaps],
+            fill_index=[gap.fill_index if gap.fill_index is not None else -1 for gap in gaps],
+            fill_time=fill_time
+        )
+
+    def extend(self, other: 'GapTable') -> None:
+        """Append the rows of another table in place"""
+        for name in self.COLUMNS:
+            setattr(self, name, np.concatenate([getattr(self, name), getattr(other, name)]))
+        self.tz = other.tz
+
+    def set_fills(self, fill_index: np.ndarray, timestamps: pd.DatetimeIndex) -> None:
+        """Record fill bars (-1 for open gaps), looking their times up in the bars' index"""
+        self.fill_index = np.asarray(fill_index, dtype=np.int64)
+        self.tz = timestamps.tz
+        times = timestamps.tz_convert('UTC').tz_localize(None) if self.tz is not None else timestamps
+        filled = self.fill_index >= 0
+        self.fill_time = np.full(len(self), np.datetime64('NaT'), dtype='datetime64[ns]')
+        self.fill_time[filled] = times.to_numpy(dtype='datetime64[ns]')[self.fill_index[filled]]
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[Gap]:
+        return (self._view(i) for i in range(len(self)))
+
+    def __reversed__(self) -> Iterator[Gap]:
+        return (self._view(i) for i in reversed(range(len(self))))
+
+    def __getitem__(self, key: Union[int, slice, np.ndarray]) -> Union[Gap, 'GapTable']:
+        if isinstance(key, (int, np.integer)):
+            return self._view(range(len(self))[key])
+        return self._take(key)
+
+    def __repr__(self) -> str:
+        return f"GapTable({len(self)} gaps, {int(self.filled.sum())} filled)"
+
+    def _view(self, i: int) -> Gap:
+        fill_index = int(self.fill_index[i])
+        fill_time = None
+        if fill_index >= 0:
+            fill_time = pd.Timestamp(self.fill_time[i])
+            if self.tz is not None:
+                fill_time = fill_time.tz_localize('UTC').tz_convert(self.tz)
+        return Gap(
+            index=int(self.index[i]),
+            price_level=float(self.price_level[i]),
+            gap_from=float(self.gap_from[i]),
+            gap_to=float(self.gap_to[i]),
+            gap_type='up' if self.is_up[i] else 'down',
+            volume=float(self.volume[i]),
+            ref_price=float(self.ref_price[i]),
+            filled=fill_index >= 0,
+            fill_index=fill_index if fill_index >= 0 else None,
+            fill_time=fill_time
+        )
+
+    def _take(self, selector) -> 'GapTable':
+        if isinstance(selector, np.ndarray) and selector.dtype == bool:
+            # Resolve a mask to positions once instead of once per column
+            selector = np.flatnonzero(selector)
+        return GapTable(tz=self.tz, **{name: getattr(self, name)[selector] for name in self.COLUMNS})
+
+    @property
+    def filled(self) -> np.ndarray:
+        return self.fill_index >= 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.COLUMNS)
+
+    def open(self) -> 'GapTable':
+        """Gaps that have not been filled yet"""
+        return self._take(~self.filled)
+
+    def filled_gaps(self) -> 'GapTable':
+        return self._take(self.filled)
+
+    def of_type(self, gap_type: str) -> 'GapTable':
+        """Only 'up' or only 'down' gaps"""
+        return self._take(self.is_up == (gap_type == 'up'))
+
+    def in_price_range(self, low: float, high: float, column: str = 'price_level') -> 'GapTable':
+        """Gaps whose column value lies within [low, high]"""
+        values = getattr(self, column)
+        return self._take((values >= low) & (values <= high))
@@ -2,174 +2,432 @@ from typing import Optional
 
 import numpy as np
 import pandas as pd
-import yfinance as yf
 
-from Stock.custom_dataclasses import Gap, Island, KeyLevel
+from profiler import add_bytes, instrument
+from Stock.cache import OHLCV_COLUMNS, OHLCVCache
+from Stock.custom_dataclasses import Gap, GapTable, Island, KeyLevel
+from Stock.gaps import detect_gaps, find_gap_fills
+from Stock.incremental import StreamState
+from Stock.indicators import IndicatorEngine, lookback, parse_indicator
+from Stock.islands import ISLAND_WINDOW, find_islands
+from Stock.levels import LevelClusters
+from Stock.range_query import PriceIndex
 
 
 class StockData:
-    SMA_PERIODS = [1, 20, 94]  # Simple moving average periods to calculate
+    INDICATORS = ('SMA_20', 'SMA_94')  # Indicator columns kept in the frame, see Stock.indicators for names
+    OHLCV_COLUMNS = OHLCV_COLUMNS
 
-    def __init__(self, ticker: str, period_days: int, interval: str):
+    def __init__(self, ticker: str, period_days: int, interval: str, cache: Optional[OHLCVCache] = None,
+                 key_level_method: str = 'chain', island_window: int = ISLAND_WINDOW, island_max_run: int = 1,
+                 exhaustion: bool = False, indicators: Optional[tuple[str, ...]] = None,
+                 indicator_dtype: type = np.float64):
         self.ticker = ticker.upper()
         self.period_days = period_days
         self.interval = interval.lower()
+        self.cache = cache
+        self.key_level_method = key_level_method
+        self.island_window = island_window
+        self.island_max_run = island_max_run
+        self.exhaustion = exhaustion
+        self.indicators = tuple(indicators) if indicators is not None else self.INDICATORS
+        for name in self.indicators:
+            parse_indicator(name)
+        self.indicator_dtype = indicator_dtype
         self.data = None
-        self.gaps = []
+        self.gaps = GapTable()
         self.key_levels = []
         self.islands = []
+        self.level_index = PriceIndex()
+        self.open_gap_index = PriceIndex()
+        self._gap_ids = None
+        self._gap_size = None
+        self._levels = None
 
-    def fetch_data(self) -> None:
-        """Download and clean stock data"""
-        self.data = yf.download(
+    @property
+    def data(self) -> Optional[pd.DataFrame]:
+        # Bars appended in streaming mode are kept as arrays and only become rows when the frame is read
+        if self._pending:
+            index = self._pending[0][0].append([index for index, _ in self._pending[1:]])
+            columns = {name: np.concatenate([cols[name] for _, cols in self._pending]) for name in self._pending[0][1]}
+            dtypes = {col: dtype for col, dtype in self._data.dtypes.items() if col in columns}
+            self._data = pd.concat([self._data, pd.DataFrame(columns, index=index).astype(dtypes)])
+            self._pending = []
+        return self._data
+
+    @data.setter
+    def data(self, frame: Optional[pd.DataFrame]) -> None:
+        self._data = frame
+        self._pending = []
+        self._stream = None
+        self._engine = None
+        self._indicator_state = {}
+        self._last_time = None
+
+    def _download(self, **window) -> pd.DataFrame:
+        """Download bars for the given yfinance window and keep clean OHLCV columns"""
+        # yfinance is only imported once a download is really needed, cached runs never load it
+        import yfinance as yf
+
+        data = yf.download(
             self.ticker, 
-            period=f"{self.period_days}d", 
             interval=self.interval, 
-            auto_adjust=True
+            auto_adjust=True,
+            **window
         )
-        
-        if self.data.empty:
-            raise ValueError(f"No data found for {self.ticker}")
+        if data.empty:
+            return data
+        add_bytes(received=data.memory_usage().sum())
         
         # Flatten multi-index columns if present
-        if isinstance(self.data.columns, pd.MultiIndex):
-            self.data.columns = self.data.columns.get_level_values(0)
+        if isinstance(data.columns, pd.MultiIndex):
+            data.columns = data.columns.get_level_values(0)
+
+        return data[self.OHLCV_COLUMNS].dropna()
+
+    @instrument()
+    def fetch_data(self) -> None:
+        """Download and clean stock data, going through the local cache when one is set"""
+        if self.cache is not None:
+            self.data = self.cache.get(self.ticker, self.interval, self.period_days)
+        else:
+            self.data = self._download(period=f"{self.period_days}d")
         
-        self.data = self.data[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
+        if self.data.empty:
+            raise ValueError(f"No data found for {self.ticker}")
+
+    def _mean_close(self) -> float:
+        """Mean close of the whole history, which scales the gap and level thresholds"""
+        if self._stream is not None:
+            return self._stream.mean_close
+        return self.data['Close'].mean()
+
+    def _indicator_engine(self) -> IndicatorEngine:
+        columns = {col: self.data[col].to_numpy(dtype=float) for col in ('High', 'Low', 'Close', 'Volume')}
+        return IndicatorEngine(columns, pd.DatetimeIndex(self.data.index), dtype=self.indicator_dtype)
 
-    def calculate_sma(self) -> None:
-        """Calculate all moving averages"""
-        for period in self.SMA_PERIODS:
-            self.data[f'SMA_{period}'] = self.data['Close'].rolling(window=period).mean()
+    @instrument()
+    def calculate_indicators(self) -> None:
+        """Add the configured indicator columns, all computed from one engine over the bars"""
+        self._engine = self._indicator_engine()
+        for name in self.indicators:
+            self.data[name] = self._engine[name]
+        self._indicator_state = self._engine.state
 
+    def indicator(self, name: str) -> np.ndarray:
+        """Any indicator (e.g. 'EMA_50', 'ATR_14', 'VWAP') for every bar, computed on first request"""
+        if self._engine is None:
+            self._engine = self._indicator_engine()
+        return self._engine[name]
+
+    def _extend_indicators(self, start: int, index: pd.DatetimeIndex) -> dict[str, np.ndarray]:
+        """Configured indicators of the bars streamed in from position start, continuing the earlier values"""
+        history = min(start, max((lookback(name) for name in self.indicators), default=0))
+        columns = {col: self._stream.prices[col].values[start - history:] for col in ('High', 'Low', 'Close')}
+        columns['Volume'] = self._stream.volumes.values[start - history:]
+
+        engine = IndicatorEngine(columns, index, dtype=self.indicator_dtype, start=history,
+                                 state=self._indicator_state)
+        values = engine.compute(self.indicators)
+        self._indicator_state = engine.state
+        return values
+
+    @instrument()
     def analyze_gaps(self) -> None:
         """Identify and analyze price gaps"""
-        min_gap_size = 0.002 * self.data['Close'].mean()
-        
-        for i in range(1, len(self.data)):
-            prev, curr = self.data.iloc[i-1], self.data.iloc[i]
-            
-            gap_up = curr['Low'] - prev['High'] > min_gap_size
-            gap_down = prev['Low'] - curr['High'] > min_gap_size
-            
-            if gap_up:
-                ref_price = min(prev['Open'], prev['Close'])
-                self.gaps.append(Gap(
-                    index=i,
-                    price_level=prev['High'],
-                    gap_from=prev['High'],
-                    gap_to=curr['Low'],
-                    gap_type='up',
-                    volume=curr['Volume'],
-                    ref_price=ref_price
-                ))
-            elif gap_down:
-                ref_price = max(prev['Open'], prev['Close'])
-                self.gaps.append(Gap(
-                    index=i,
-                    price_level=prev['Low'],
-                    gap_from=prev['Low'],
-                    gap_to=curr['High'],
-                    gap_type='down',
-                    volume=curr['Volume'],
-                    ref_price=ref_price
-                ))
+        self._gap_ids = None
+        self.open_gap_index = PriceIndex()
+        min_gap_size = 0.002 * self._mean_close()
+        columns = [self.data[col].to_numpy(dtype=float) for col in self.OHLCV_COLUMNS]
+        found = detect_gaps(*columns, min_gap_size)
+
+        self.gaps = GapTable(
+            index=found.index,
+            price_level=found.gap_from,
+            gap_from=found.gap_from,
+            gap_to=found.gap_to,
+            is_up=found.is_up,
+            volume=found.volume,
+            ref_price=found.ref_price
+        )
         
         self._check_gap_fill_status()
 
     def _check_gap_fill_status(self) -> None:
         """Determine if gaps have been filled by subsequent price action"""
-        for gap in self.gaps:
-            for j in range(gap.index, len(self.data)):
-                current = self.data.iloc[j]
-                if (gap.gap_type == 'up' and current['Low'] <= gap.gap_from) or \
-                   (gap.gap_type == 'down' and current['High'] >= gap.gap_from):
-                    gap.filled = True
-                    break
-
-    def identify_key_levels(self) -> None:
-        """Cluster gaps to identify significant price levels"""
         if not self.gaps:
             return
-        
-        price_tolerance = 0.01 * self.data['Close'].mean()
-        gap_prices = [{'price': g.price_level, 'index': g.index} for g in self.gaps]
-        gap_prices.sort(key=lambda x: x['price'])
-        
-        clusters = []
-        current_cluster = [gap_prices[0]]
-        
-        for price_data in gap_prices[1:]:
-            if abs(price_data['price'] - current_cluster[-1]['price']) <= price_tolerance:
-                current_cluster.append(price_data)
-            else:
-                clusters.append(current_cluster)
-                current_cluster = [price_data]
-        clusters.append(current_cluster)
-        
-        self.key_levels = [
-            KeyLevel(
-                price=np.mean([g['price'] for g in cluster]),
-                start_index=min(g['index'] for g in cluster),
-                gap_count=len(cluster)
-            ) for cluster in clusters if len(cluster) > 1
+
+        fills = find_gap_fills(
+            self.data['High'].to_numpy(dtype=float),
+            self.data['Low'].to_numpy(dtype=float),
+            self.gaps.index,
+            self.gaps.is_up,
+            self.gaps.gap_from
+        )
+        self.gaps.set_fills(fills, pd.DatetimeIndex(self.data.index))
+        self._index_open_gaps()
+
+    def _index_open_gaps(self) -> None:
+        """Rebuild the price index of open gaps, ids are rows of self.gaps"""
+        open_rows = np.flatnonzero(~self.gaps.filled)
+        self.open_gap_index = PriceIndex(self.gaps.price_level[open_rows], open_rows)
+
+    @instrument()
+    def identify_key_levels(self, method: Optional[str] = None) -> None:
+        """Cluster gaps to identify significant price levels ('chain', 'bins' or 'volume', default key_level_method)"""
+        self.key_levels = []
+        self.level_index = PriceIndex()
+        self._levels = LevelClusters(method or self.key_level_method)
+        if not self.gaps:
+            return
+        self._update_key_levels(np.arange(len(self.gaps)))
+
+    def _update_key_levels(self, rows: np.ndarray) -> None:
+        """Add the gaps at rows of self.gaps to the clusters, only levels near them or a moved boundary change"""
+        change = self._levels.update(
+            self.gaps.price_level[rows],
+            self.gaps.index[rows],
+            0.01 * self._mean_close(),
+            volumes=self.gaps.volume[rows]
+        )
+        if change is None:
+            return
+
+        first, end, levels = change
+        self.level_index.remove(np.arange(first, end), [level.price for level in self.key_levels[first:end]])
+        self.key_levels[first:end] = [
+            KeyLevel(price=price, start_index=start_index, gap_count=gap_count)
+            for price, start_index, gap_count in zip(*(column.tolist() for column in levels))
         ]
+        # Ids are positions in key_levels, the levels past the replaced span moved with the splice
+        self.level_index.ids[self.level_index.ids >= end] += len(levels.price) - (end - first)
+        self.level_index.insert(levels.price, first + np.arange(len(levels.price)))
 
+    @instrument()
     def find_island_reversals(self) -> None:
-        """Detect island reversal patterns in gap data"""
-        for i in range(1, len(self.gaps)):
-            prev_gap, curr_gap = self.gaps[i-1], self.gaps[i]
-            
-            # Check if gaps form a reversal pattern within 13 periods
-            if curr_gap.index - prev_gap.index > 13:
-                continue
-                
-            is_reversal = (
-                (prev_gap.gap_type == 'up' and curr_gap.gap_type == 'down') or
-                (prev_gap.gap_type == 'down' and curr_gap.gap_type == 'up')
-            )
-            
-            if is_reversal:
-                island_data = self.data.iloc[prev_gap.index:curr_gap.index]
-                self.islands.append(Island(
-                    high=island_data['High'].max(),
-                    low=island_data['Low'].min(),
-                    start_index=prev_gap.index,
-                    end_index=curr_gap.index
-                ))
+        """Detect island reversal (and, when enabled, exhaustion gap) patterns in gap data"""
+        self.islands = []
+        self._find_islands(
+            1,
+            0,
+            self.data['High'].to_numpy(dtype=float),
+            self.data['Low'].to_numpy(dtype=float)
+        )
+
+    def _find_islands(self, start: int, filled_from: int, highs: np.ndarray, lows: np.ndarray) -> None:
+        """Append patterns closed by gaps from position start or by fills from bar filled_from"""
+        # Such a pattern opens at most max_run gaps before its last one, and an exhaustion gap filled
+        # from filled_from sits within island_window bars of it, so earlier gaps can be left out
+        first = start
+        if self.exhaustion:
+            first = min(first, int(np.searchsorted(self.gaps.index, filled_from - self.island_window)))
+        first = max(first - self.island_max_run, 0)
+
+        found = find_islands(
+            self.gaps.index[first:],
+            self.gaps.is_up[first:],
+            self.gaps.fill_index[first:],
+            highs,
+            lows,
+            window=self.island_window,
+            max_run=self.island_max_run,
+            exhaustion=self.exhaustion,
+            start=start - first,
+            filled_from=filled_from
+        )
+        if found and self.islands and self._island_key(found[0]) < self._island_key(self.islands[-1]):
+            # A late fill can complete a pattern before the newest island, keep the completion order
+            self.islands = sorted(self.islands + found, key=self._island_key)
+        else:
+            self.islands.extend(found)
+
+    @staticmethod
+    def _island_key(island: Island) -> tuple:
+        return island.end_index, island.kind != 'island', island.start_index
     
     def get_last(self, column: str) -> Optional[float]:
         """Return the last value of the specified column in the stock data"""
-        if self.data is None or column not in self.data.columns:
+        # Streamed bars are still pending, reading the newest one avoids concatenating the frame
+        if self._pending:
+            columns = self._pending[-1][1]
+            if column in columns:
+                return columns[column][-1].item()
+        elif self._data is not None and column in self._data.columns:
+            return self._data[column].iloc[-1].item()
+
+        # Indicators outside the configured columns are computed the first time they are asked for
+        if self._data is None or column in self.OHLCV_COLUMNS or column in self.indicators:
+            return None
+        try:
+            parse_indicator(column)
+        except ValueError:
             return None
-        return self.data[column].iloc[-1]
+        return float(self.indicator(column)[-1])
     
-    def get_surrounding_key_levels(self) -> list[float]:
-        """Find the two KeyLevel prices that are closest above and below the current close"""
-        if not self.key_levels or self.data is None:
+    def get_surrounding_key_levels(self, price: Optional[float] = None, k: int = 1) -> list[float]:
+        """Find the k KeyLevel prices closest below and above price (the current close by default)"""
+        if not self.key_levels or self._data is None:
             return []
 
-        close_price = self.data['Close'].iloc[-1]
+        if price is None:
+            price = self.get_last('Close')
 
-        # Separate key levels into those below and above the current close
-        below = [kl.price for kl in self.key_levels if kl.price < close_price]
-        above = [kl.price for kl in self.key_levels if kl.price > close_price]
+        below = self.level_index.below(price, k)[::-1]
+        above = self.level_index.above(price, k)
+        return [self.key_levels[i].price for i in np.concatenate([below, above]).tolist()]
 
-        lower = max(below) if below else None
-        upper = min(above) if above else None
+    def get_open_gaps(self, low: Optional[float] = None, high: Optional[float] = None) -> list[Gap]:
+        """Return the gaps that are not filled yet, optionally only those priced within [low, high]"""
+        if low is None and high is None:
+            rows = self.open_gap_index.ids
+        else:
+            rows = self.open_gap_index.between(
+                -np.inf if low is None else low,
+                np.inf if high is None else high
+            )
+        return list(self.gaps[np.sort(rows)])
 
-        return [p for p in (lower, upper) if p is not None]
+    def get_nearest_open_gaps(self, price: Optional[float] = None, k: int = 1) -> tuple[list[Gap], list[Gap]]:
+        """The k open gaps priced closest below and above price (the current close by default), nearest first"""
+        if price is None:
+            price = self.get_last('Close')
+        if price is None:
+            return [], []
+        below = self.open_gap_index.below(price, k)
+        above = self.open_gap_index.above(price, k)
+        return [self.gaps[i] for i in below.tolist()], [self.gaps[i] for i in above.tolist()]
 
+    def _update_stream_gaps(self, newly_filled: np.ndarray, first_new_bar: int, first_candidate: int) -> Optional[np.ndarray]:
+        """
+        Bring gaps and islands in line with the streaming candidates, first_new_bar is the first
+        appended bar and first_candidate the first candidate found on them. Returns the rows
+        added to self.gaps, or None when the table was rebuilt.
+        """
+        stream = self._stream
+        min_gap_size = 0.002 * self._mean_close()
+        highs = stream.prices['High'].values
+        lows = stream.prices['Low'].values
 
-    def get_open_gaps(self) -> list[Gap]:
-        """Return a list of gaps that are not filled yet"""
-        return [gap for gap in self.gaps if not getattr(gap, 'filled', False)]
+        if self._gap_ids is not None:
+            # Earlier candidates keep their place unless the moving mean close pushed one across the threshold
+            low, high = sorted((self._gap_size, min_gap_size))
+            sizes = stream.sizes.values[:first_candidate]
+            crossed = bool(np.any((sizes > low) & (sizes <= high)))
+        if self._gap_ids is None or crossed:
+            self._gap_ids = np.flatnonzero(stream.sizes.values > min_gap_size)
+            self._gap_size = min_gap_size
+            self.gaps = stream.gap_table(self._gap_ids)
+            self.islands = []
+            self._find_islands(1, 0, highs, lows)
+            self._index_open_gaps()
+            return None
+        self._gap_size = min_gap_size
 
+        known = len(self._gap_ids)
+        rows = newly_filled[:0]
+        if newly_filled.size:
+            rows = np.searchsorted(self._gap_ids, newly_filled)
+            known_rows = rows < known
+            rows = rows[known_rows][self._gap_ids[rows[known_rows]] == newly_filled[known_rows]]
+            fill_index = stream.fill_index.values[self._gap_ids[rows]]
+            self.gaps.fill_index[rows] = fill_index
+            self.gaps.fill_time[rows] = stream.times.values[fill_index].view('datetime64[ns]')
+            self.open_gap_index.remove(rows, self.gaps.price_level[rows])
 
-    def analyze_pipline(self) -> None:
-        """Run complete analysis pipeline"""
-        self.fetch_data()
-        self.calculate_sma()
+        new_ids = rows[:0]
+        if len(stream.sizes) > first_candidate:
+            new_ids = first_candidate + np.flatnonzero(stream.sizes.values[first_candidate:] > min_gap_size)
+        if new_ids.size:
+            self.gaps.extend(stream.gap_table(new_ids))
+            self._gap_ids = np.concatenate([self._gap_ids, new_ids])
+            new_rows = np.arange(known, len(self._gap_ids))
+            open_rows = new_rows[~self.gaps.filled[new_rows]]
+            self.open_gap_index.insert(self.gaps.price_level[open_rows], open_rows)
+
+        # Patterns only complete on a new gap or, for exhaustion gaps, on a fill
+        if new_ids.size or (self.exhaustion and rows.size):
+            self._find_islands(known, first_new_bar, highs, lows)
+        return known + np.arange(len(new_ids))
+
+    def append_bars(self, bars: pd.DataFrame) -> None:
+        """Append newly closed bars and update SMAs, gaps, key levels and islands incrementally"""
+        values = bars[self.OHLCV_COLUMNS].to_numpy(dtype=float)
+        complete = ~np.isnan(values).any(axis=1)
+        if self._data is None:
+            # The first bars become the frame as they are, keeping their column dtypes
+            if complete.any():
+                self.data = bars.loc[complete, self.OHLCV_COLUMNS]
+                self.analyze()
+            return
+        self.append_arrays(pd.DatetimeIndex(bars.index[complete]), values[complete])
+
+    def append_arrays(self, index: pd.DatetimeIndex, values: np.ndarray) -> None:
+        """append_bars for a (bars x OHLCV_COLUMNS) array, replays use it to skip a DataFrame per step"""
+        if not len(index):
+            return
+
+        if self._data is None:
+            self.data = pd.DataFrame(values, index=index, columns=self.OHLCV_COLUMNS)
+            self.analyze()
+            return
+
+        if self._stream is None:
+            self._stream = StreamState(self.data)
+            self._gap_ids = None
+
+        times = index.as_unit('ns').asi8
+        if times[0] <= self._stream.times.values[-1]:
+            raise ValueError(f"Appended bars for {self.ticker} must start after {self.last_timestamp()}")
+
+        start, first_candidate = len(self._stream), len(self._stream.sizes)
+        columns = dict(zip(self.OHLCV_COLUMNS, values.T))
+        newly_filled = self._stream.extend(times, columns)
+
+        # Rolling indicators only need their lookback before the new bars, recursive ones their state
+        columns.update(self._extend_indicators(start, index))
+        self._pending.append((index, columns))
+        self._last_time = None
+        self._engine = None
+
+        new_rows = self._update_stream_gaps(newly_filled, start, first_candidate)
+        if new_rows is None or self._levels is None or self._levels.method != self.key_level_method:
+            self.identify_key_levels()
+        else:
+            self._update_key_levels(new_rows)
+
+    def last_timestamp(self) -> pd.Timestamp:
+        """Time of the newest bar held, including streamed bars not yet in the frame"""
+        if self._pending:
+            # Boxing a Timestamp out of an index is slow next to an append, so it waits until asked for
+            if self._last_time is None:
+                self._last_time = self._pending[-1][0][-1]
+            return self._last_time
+        return self._data.index[-1]
+
+    def update(self) -> int:
+        """Download bars newer than the last one held and append them, returns how many were added"""
+        if self._data is None:
+            self.analyze_pipline()
+            return len(self.data)
+
+        last_time = self.last_timestamp()
+        bars = self._download(start=last_time)
+        if bars.empty:
+            return 0
+
+        bars = bars[bars.index > last_time]
+        self.append_bars(bars)
+        return len(bars)
+
+    def analyze(self) -> None:
+        """Run every analysis stage on the bars already loaded"""
+        self.calculate_indicators()
         self.analyze_gaps()
         self.identify_key_levels()
         self.find_island_reversals()
+
+    def analyze_pipline(self) -> None:
+        """Run complete analysis pipeline"""
+        self.fetch_data()
+        self.analyze()
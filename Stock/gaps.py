@@ -0,0 +1,55 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from Stock.range_query import SparseTable
+
+
+class GapArrays(NamedTuple):
+    """Column-wise description of every detected gap"""
+    index: np.ndarray
+    is_up: np.ndarray
+    gap_from: np.ndarray
+    gap_to: np.ndarray
+    ref_price: np.ndarray
+    volume: np.ndarray
+
+
+def detect_gaps(opens: np.ndarray, highs: np.ndarray, lows: np.ndarray,
+                closes: np.ndarray, volumes: np.ndarray, min_gap_size: float) -> GapArrays:
+    """Find gap-up/gap-down bars on whole OHLCV arrays at once"""
+    gap_up = lows[1:] - highs[:-1] > min_gap_size
+    # A bar can't gap both ways, but keep the original up-before-down precedence
+    gap_down = ~gap_up & (lows[:-1] - highs[1:] > min_gap_size)
+
+    index = np.flatnonzero(gap_up | gap_down) + 1
+    prev = index - 1
+    is_up = gap_up[prev]
+
+    return GapArrays(
+        index=index,
+        is_up=is_up,
+        gap_from=np.where(is_up, highs[prev], lows[prev]),
+        gap_to=np.where(is_up, lows[index], highs[index]),
+        ref_price=np.where(
+            is_up,
+            np.minimum(opens[prev], closes[prev]),
+            np.maximum(opens[prev], closes[prev])
+        ),
+        volume=volumes[index]
+    )
+
+
+def find_gap_fills(highs: np.ndarray, lows: np.ndarray, index: np.ndarray,
+                   is_up: np.ndarray, gap_from: np.ndarray) -> np.ndarray:
+    """
+    Return the bar index at which each gap was filled, -1 for open gaps.
+    Gap-ups fill on the first Low <= gap_from, gap-downs on the first High >= gap_from.
+    """
+    fills = np.full(len(index), -1, dtype=np.int64)
+
+    for mask, values, op in ((is_up, lows, np.minimum), (~is_up, highs, np.maximum)):
+        if mask.any():
+            table = SparseTable(values, op)
+            fills[mask] = table.find_first(index[mask], gap_from[mask])
+    return fills
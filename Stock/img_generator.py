@@ -1,22 +1,88 @@
-
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
 from io import BytesIO
 from typing import Optional
 
-from Stock.chart import StockChart
 from Stock.data import StockData
+from Stock.render_cache import RenderCache
+
+
+def warm_up_renderer() -> None:
+    """Pool initializer: load the headless backend, the chart style and fonts once per worker"""
+    import matplotlib.pyplot as plt
+
+    from Stock.chart import chart_style
+
+    plt.switch_backend('Agg')
+    chart_style()
+
+    # Drawing text once builds the font cache so the first real chart doesn't pay for it
+    fig = plt.figure(figsize=(1, 1))
+    fig.text(0.5, 0.5, "warm")
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _render_bytes(analyzer: StockData, render_options: dict) -> Optional[bytes]:
+    """Render one chart inside a worker, bytes travel back cheaper than a BytesIO"""
+    image_buf = ImgGenerator.generate_chart(analyzer, **render_options)
+    return image_buf.getvalue() if image_buf is not None else None
 
 
 class ImgGenerator:
     @staticmethod
-    def generate_chart(analyzer:StockData) -> Optional[BytesIO]:
-        """Generate and save stock chart"""
-        visualizer = StockChart(analyzer)
+    def generate_chart(analyzer:StockData, cache: Optional[RenderCache] = None, **render_options) -> Optional[BytesIO]:
+        """Generate and save stock chart, render_options go to StockChart (size, dpi, image_format, quality)"""
+        if cache is not None:
+            # Unchanged bars and options map to the same key, so the stored image is served as is
+            payload = cache.get_or_create(
+                cache.key(analyzer, 'chart', **render_options),
+                partial(_render_bytes, analyzer, render_options)
+            )
+            return BytesIO(payload) if payload is not None else None
+
+        # matplotlib and mplfinance load with the first chart, text-only runs never pay for them
+        from Stock.chart import StockChart
+
+        visualizer = StockChart(analyzer, **render_options)
         return visualizer.visualize_pipline()
 
     @classmethod
-    def run(cls, analyzer:StockData) -> Optional[BytesIO]:
+    def run(cls, analyzer:StockData, cache: Optional[RenderCache] = None, **render_options) -> Optional[BytesIO]:
         """Run the complete chart generation process"""
-        image_buf = cls.generate_chart(analyzer)
+        image_buf = cls.generate_chart(analyzer, cache=cache, **render_options)
         if image_buf is None:
             raise ValueError("Failed to generate chart - received None buffer")
-        return image_buf
\ No newline at end of file
+        return image_buf
+
+    @staticmethod
+    def create_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+        """Process pool of warmed-up renderers that can be reused across run_many calls"""
+        return ProcessPoolExecutor(max_workers=workers, initializer=warm_up_renderer)
+
+    @classmethod
+    def run_many(cls, analyzers: list[StockData], workers: Optional[int] = None,
+                 executor: Optional[Executor] = None, cache: Optional[RenderCache] = None,
+                 **render_options) -> list[Optional[BytesIO]]:
+        """
+        Render many charts in parallel worker processes, only those not in the cache.
+        Buffers come back in the order of analyzers, None where a chart failed.
+        """
+        keys = [cache.key(analyzer, 'chart', **render_options) for analyzer in analyzers] if cache is not None else []
+        payloads = [cache.get(key) for key in keys] if cache is not None else [None] * len(analyzers)
+        todo = [i for i, payload in enumerate(payloads) if payload is None]
+
+        if todo:
+            render = partial(_render_bytes, render_options=render_options)
+            pending = [analyzers[i] for i in todo]
+            if executor is not None:
+                rendered = list(executor.map(render, pending))
+            else:
+                with cls.create_pool(workers) as pool:
+                    rendered = list(pool.map(render, pending))
+            for i, payload in zip(todo, rendered):
+                payloads[i] = payload
+                if cache is not None and payload is not None:
+                    cache.put(keys[i], payload)
+
+        return [BytesIO(payload) if payload is not None else None for payload in payloads]
@@ -0,0 +1,170 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from Stock.custom_dataclasses import GapTable
+from Stock.gaps import GapArrays, detect_gaps, find_gap_fills
+from Stock.range_query import PriceIndex
+
+
+class GrowableArray:
+    """Append-only NumPy buffer with amortized O(1) extends"""
+
+    def __init__(self, values=(), dtype=float):
+        values = np.asarray(values, dtype=dtype)
+        self._buf = np.empty(max(16, 2 * len(values)), dtype=dtype)
+        self._buf[:len(values)] = values
+        self._size = len(values)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def values(self) -> np.ndarray:
+        """Writable view over the filled part of the buffer"""
+        return self._buf[:self._size]
+
+    def extend(self, values) -> None:
+        values = np.asarray(values, dtype=self._buf.dtype)
+        end = self._size + len(values)
+        if end > len(self._buf):
+            buf = np.empty(max(end, 2 * len(self._buf)), dtype=self._buf.dtype)
+            buf[:self._size] = self.values
+            self._buf = buf
+        self._buf[self._size:end] = values
+        self._size = end
+
+
+class StreamState:
+    """
+    Running state that lets StockData absorb new bars without a full recompute.
+
+    Every bar that gaps by any positive amount is kept as a gap candidate together
+    with its fill bar. The gap threshold depends on the mean close of the whole
+    history, so the actual gap list is a cheap mask over the candidates. Open
+    candidates are indexed by price, new bars only fill the ones their lowest low
+    (gap-ups) or highest high (gap-downs) reaches.
+    """
+    PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+    def __init__(self, frame: pd.DataFrame):
+        index = pd.DatetimeIndex(frame.index)
+        self.tz = index.tz
+        self.times = GrowableArray(index.as_unit('ns').asi8, dtype=np.int64)
+        self.prices = {col: GrowableArray(frame[col].to_numpy(dtype=float)) for col in self.PRICE_COLUMNS}
+        self.volumes = GrowableArray(frame['Volume'].to_numpy(dtype=float))
+        self.close_sum = float(self.prices['Close'].values.sum())
+
+        found = self._detect(frame['Volume'].to_numpy(dtype=float), 0)
+        self.candidates = {name: GrowableArray(values, dtype=values.dtype)
+                           for name, values in found._asdict().items()}
+        fills = find_gap_fills(
+            self.prices['High'].values, self.prices['Low'].values,
+            found.index, found.is_up, found.gap_from
+        )
+        self.fill_index = GrowableArray(fills, dtype=np.int64)
+        self.sizes = GrowableArray(np.abs(found.gap_to - found.gap_from))
+        self.open_up = PriceIndex()
+        self.open_down = PriceIndex()
+        self._index_open(0)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def _detect(self, volume: np.ndarray, start: int) -> Optional[GapArrays]:
+        """Gap candidates among the bars from buffer position start onwards, volume holds just those bars"""
+        # Only the boundary bar before the new bars is needed to detect gaps on the first one
+        offset = max(start - 1, 0)
+        columns = [self.prices[col].values[offset:] for col in self.PRICE_COLUMNS]
+        highs, lows = columns[1], columns[2]
+        # Most new bars overlap the one before, two comparisons tell there is nothing to build
+        if start and not ((lows[1:] > highs[:-1]) | (highs[1:] < lows[:-1])).any():
+            return None
+        if offset < start:
+            volume = np.concatenate([[np.nan], volume])
+
+        found = detect_gaps(*columns, volume, 0.0)
+        return found._replace(index=found.index + offset)
+
+    def _index_open(self, first_id: int) -> None:
+        """Add the still open candidates from id first_id on to the price indexes"""
+        ids = first_id + np.flatnonzero(self.fill_index.values[first_id:] == -1)
+        is_up = self.candidates['is_up'].values[ids]
+        gap_from = self.candidates['gap_from'].values[ids]
+        self.open_up.insert(gap_from[is_up], ids[is_up])
+        self.open_down.insert(gap_from[~is_up], ids[~is_up])
+
+    @property
+    def mean_close(self) -> float:
+        return self.close_sum / len(self)
+
+    @property
+    def gaps(self) -> GapArrays:
+        return GapArrays(**{name: arr.values for name, arr in self.candidates.items()})
+
+    def gap_table(self, ids: np.ndarray) -> GapTable:
+        """GapTable of the selected candidates with their current fill state"""
+        found = self.gaps
+        fill_index = self.fill_index.values[ids]
+        fill_time = np.where(
+            fill_index >= 0,
+            self.times.values[np.maximum(fill_index, 0)],
+            np.datetime64('NaT').astype(np.int64)
+        ).view('datetime64[ns]')
+        return GapTable(
+            tz=self.tz,
+            index=found.index[ids],
+            price_level=found.gap_from[ids],
+            gap_from=found.gap_from[ids],
+            gap_to=found.gap_to[ids],
+            is_up=found.is_up[ids],
+            volume=found.volume[ids],
+            ref_price=found.ref_price[ids],
+            fill_index=fill_index,
+            fill_time=fill_time
+        )
+
+    def extend(self, times: np.ndarray, columns: dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Append bars given as their int64 nanosecond times and one array per OHLCV column,
+        then update fills of still-open candidates. Returns ids of newly filled candidates.
+        """
+        start = len(self)
+        self.times.extend(times)
+        for col in self.PRICE_COLUMNS:
+            self.prices[col].extend(columns[col])
+        self.volumes.extend(columns['Volume'])
+        self.close_sum += float(np.sum(columns['Close']))
+        highs = self.prices['High'].values[start:]
+        lows = self.prices['Low'].values[start:]
+
+        # Earlier gap-ups fill at the first new bar whose running low reaches them, gap-downs on the running high
+        filled = []
+        for open_gaps, running, sign in ((self.open_up, np.minimum.accumulate(lows), -1),
+                                         (self.open_down, np.maximum.accumulate(highs), 1)):
+            reached = (running[-1], np.inf) if sign < 0 else (-np.inf, running[-1])
+            prices, ids = open_gaps.pop_between(*reached)
+            if ids.size:
+                self.fill_index.values[ids] = start + np.searchsorted(sign * running, sign * prices)
+                filled.append(ids)
+
+        found = self._detect(np.asarray(columns['Volume'], dtype=float), start)
+        if found is not None and len(found.index):
+            first_id = len(self.fill_index)
+            for name, values in found._asdict().items():
+                self.candidates[name].extend(values)
+            self.sizes.extend(np.abs(found.gap_to - found.gap_from))
+            self.fill_index.extend(np.full(len(found.index), -1))
+
+            # A gap can't fill on its own bar, only a later one of the new bars can fill it
+            if len(times) > 1:
+                fills = find_gap_fills(highs, lows, found.index - start, found.is_up, found.gap_from)
+                hit = np.flatnonzero(fills >= 0)
+                self.fill_index.values[first_id + hit] = fills[hit] + start
+                filled.append(first_id + hit)
+            self._index_open(first_id)
+
+        if not filled:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(filled))
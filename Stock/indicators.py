@@ -0,0 +1,173 @@
+"""
+Indicators computed on request from OHLCV arrays, sharing the passes they have in common.
+
+Names are KIND_PERIOD, e.g. SMA_20, EMA_50, ATR_14, VWAP_20, or plain VWAP for the
+session VWAP that restarts every calendar day. All SMAs share the block prefix sums of the
+closes and rolling VWAPs share the price-volume sums, so every further SMA or VWAP is
+a few vectorized subtractions. EMA and ATR are one recursive pass each, with ATR using
+Wilder's smoothing of the true range.
+
+The engine can also continue a series: given the trailing bars it needs (lookback)
+and the state of the previous run, it computes only the bars from start onwards.
+"""
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+INDICATOR_KINDS = ('SMA', 'EMA', 'ATR', 'VWAP')
+_NAME = re.compile(r'^(SMA|EMA|ATR|VWAP)(?:_(\d+))?$')
+
+
+def parse_indicator(name: str) -> tuple[str, Optional[int]]:
+    """(kind, period) of an indicator name, period is None only for the session VWAP"""
+    match = _NAME.match(name)
+    if match is None:
+        raise ValueError(f"Unknown indicator {name!r}, expected one of {INDICATOR_KINDS} with a period, e.g. SMA_20")
+    kind, period = match.group(1), match.group(2)
+    if (period is None and kind != 'VWAP') or (period is not None and int(period) < 1):
+        raise ValueError(f"Indicator {name!r} needs a period of at least 1")
+    return kind, int(period) if period is not None else None
+
+
+def lookback(name: str) -> int:
+    """Bars before the first computed one that the engine needs to continue a series"""
+    kind, period = parse_indicator(name)
+    if kind in ('SMA', 'VWAP') and period is not None:
+        return period - 1
+    # The true range needs the previous close, recursive kinds carry the rest in their state
+    return 1 if kind == 'ATR' else 0
+
+
+BLOCK = 1024  # Prefix sums restart every BLOCK bars (or the next power of two above a longer period)
+
+
+def block_prefix_sums(values: np.ndarray, block: int) -> np.ndarray:
+    """
+    Running sums that restart at every block boundary, one row per block (the last one
+    zero padded). A plain prefix sum over a long history grows until subtracting two of
+    its entries loses the digits of a window, restarting keeps the rounding error at the
+    scale of one block.
+    """
+    padded = np.zeros(-(-len(values) // block) * block)
+    padded[:len(values)] = values
+    return padded.reshape(-1, block).cumsum(axis=1)
+
+
+def _block_size(period: int) -> int:
+    return max(BLOCK, 1 << (period - 1).bit_length())
+
+
+def _window_sums(sums: np.ndarray, length: int, period: int) -> np.ndarray:
+    """Sum of each trailing window of period values from block_prefix_sums, NaN until the window is full"""
+    out = np.empty_like(sums)
+    # Windows inside one block, then windows that start in the block before (period <= block)
+    out[:, period:] = sums[:, period:] - sums[:, :-period]
+    out[0, :period] = sums[0, :period]
+    out[1:, :period] = sums[1:, :period] + sums[:-1, -1:] - sums[:-1, -period:]
+    out = out.ravel()[:length]
+    out[:period - 1] = np.nan
+    return out
+
+
+class IndicatorEngine:
+    """
+    Computes indicators from OHLCV arrays on first request and caches them.
+
+    columns holds High/Low/Close/Volume arrays (only those the requested indicators
+    need). Results cover the bars from start onwards, the bars before it are lookback
+    history, and index holds the times of the covered bars (session VWAP only). state
+    is IndicatorEngine.state of the run that ended right before start.
+    """
+
+    def __init__(self, columns: dict[str, np.ndarray], index: Optional[pd.DatetimeIndex] = None,
+                 dtype: type = np.float64, start: int = 0, state: Optional[dict] = None):
+        self.columns = {name: np.asarray(values, dtype=float) for name, values in columns.items()}
+        self.index = index
+        self.dtype = np.dtype(dtype)
+        self.start = start
+        self.state = dict(state or {})
+        self._shared: dict = {}
+        self._cache: dict[str, np.ndarray] = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._cache:
+            kind, period = parse_indicator(name)
+            values = getattr(self, f'_{kind.lower()}')(name, period)
+            self._cache[name] = values.astype(self.dtype, copy=False)
+        return self._cache[name]
+
+    def compute(self, names) -> dict[str, np.ndarray]:
+        return {name: self[name] for name in names}
+
+    def _window_sums(self, key: str, values, period: int) -> np.ndarray:
+        """Trailing window sums of a column, from block prefix sums shared by every period of that block size"""
+        block = _block_size(period)
+        if (key, block) not in self._shared:
+            values = values() if callable(values) else values
+            self._shared[key, block] = block_prefix_sums(values, block), len(values)
+        return _window_sums(*self._shared[key, block], period)
+
+    def _typical_price(self) -> np.ndarray:
+        if 'typical' not in self._shared:
+            self._shared['typical'] = (self.columns['High'] + self.columns['Low'] + self.columns['Close']) / 3
+        return self._shared['typical']
+
+    def _true_range(self) -> np.ndarray:
+        if 'true_range' not in self._shared:
+            high, low, close = self.columns['High'], self.columns['Low'], self.columns['Close']
+            prev_close = np.concatenate([[np.nan], close[:-1]])
+            # fmax skips the missing previous close of the very first bar
+            self._shared['true_range'] = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        return self._shared['true_range']
+
+    def _recursive(self, name: str, values: np.ndarray, alpha: float, period: int) -> np.ndarray:
+        """y = alpha * x + (1 - alpha) * y_prev from the carried state, NaN until period bars were seen"""
+        last, seen = self.state.get(name, (None, 0))
+        if last is None:
+            smoothed = pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+        else:
+            smoothed = pd.Series(np.concatenate([[last], values])).ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+        self.state[name] = (float(smoothed[-1]) if len(smoothed) else last, seen + len(values))
+        counts = seen + np.arange(1, len(values) + 1)
+        return np.where(counts >= period, smoothed, np.nan)
+
+    def _sma(self, name: str, period: int) -> np.ndarray:
+        return self._window_sums('Close', self.columns['Close'], period)[self.start:] / period
+
+    def _ema(self, name: str, period: int) -> np.ndarray:
+        return self._recursive(name, self.columns['Close'][self.start:], 2 / (period + 1), period)
+
+    def _atr(self, name: str, period: int) -> np.ndarray:
+        return self._recursive(name, self._true_range()[self.start:], 1 / period, period)
+
+    def _vwap(self, name: str, period: Optional[int]) -> np.ndarray:
+        volume = self.columns['Volume']
+        if period is not None:
+            price_volume = self._window_sums('price_volume', lambda: self._typical_price() * volume, period)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return (price_volume / self._window_sums('Volume', volume, period))[self.start:]
+
+        # Session VWAP: running sums restart on the first bar of every calendar day (in the bars' timezone)
+        index = self.index
+        wall = index.tz_localize(None) if index.tz is not None else index
+        days = wall.as_unit('ns').asi8 // (86_400 * 10 ** 9)
+        prev_day, pv_carry, v_carry = self.state.get(name, (None, 0.0, 0.0))
+
+        pv = (self._typical_price() * volume)[self.start:]
+        v = volume[self.start:]
+        session = np.concatenate([[0], np.cumsum(days[1:] != days[:-1])])
+        firsts = np.flatnonzero(np.concatenate([[True], days[1:] != days[:-1]]))
+        pv_sums = np.cumsum(pv) - np.concatenate([[0.0], np.cumsum(pv)])[firsts][session]
+        v_sums = np.cumsum(v) - np.concatenate([[0.0], np.cumsum(v)])[firsts][session]
+        if len(days) and days[0] == prev_day:
+            # The first session continues the one the previous run ended in
+            pv_sums[session == 0] += pv_carry
+            v_sums[session == 0] += v_carry
+
+        if len(days):
+            self.state[name] = (int(days[-1]), float(pv_sums[-1]), float(v_sums[-1]))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pv_sums / v_sums
@@ -0,0 +1,95 @@
+"""
+Island reversal and exhaustion gap patterns found from the gap columns.
+
+Patterns are matched with a handful of array passes over the gaps, and the high/low
+of every pattern comes from an O(1) sparse table range query, so the search stays
+linear in the number of gaps however wide the window or long the gap runs are.
+
+island:     a run of up to max_run same-direction gaps, then a gap the other way
+            within window bars of the run's first gap
+exhaustion: a gap that extends a run of same-direction gaps and is itself filled
+            within window bars
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from Stock.custom_dataclasses import Island
+from Stock.range_query import SparseTable
+
+ISLAND_WINDOW = 13  # Most bars between the first and the last gap of a pattern
+ISLAND_KINDS = ('island', 'exhaustion')
+
+
+class PatternArrays(NamedTuple):
+    """Gap positions (rows of the gap columns) that open and close every pattern"""
+    first: np.ndarray
+    last: np.ndarray
+
+
+def _run_lengths(is_up: np.ndarray) -> np.ndarray:
+    """Length of the run of same-direction gaps ending at each gap"""
+    positions = np.arange(len(is_up))
+    run_start = np.zeros(len(is_up), dtype=np.int64)
+    changes = np.flatnonzero(is_up[1:] != is_up[:-1]) + 1
+    run_start[changes] = changes
+    return positions - np.maximum.accumulate(run_start) + 1
+
+
+def _leading_gaps(index: np.ndarray, runs: np.ndarray, last: np.ndarray, window: int, max_run: int) -> np.ndarray:
+    """How many gaps before each last gap can open its pattern: the run, capped by max_run and the window"""
+    in_window = last - np.searchsorted(index, index[last] - window, side='left')
+    return np.minimum(np.minimum(runs, max_run), in_window)
+
+
+def island_pairs(index: np.ndarray, is_up: np.ndarray, window: int = ISLAND_WINDOW,
+                 max_run: int = 1, start: int = 1) -> PatternArrays:
+    """Island reversals closed by the gap at each position >= start, opened by the earliest gap of the run before it"""
+    last = np.arange(max(start, 1), len(index))
+    runs = _run_lengths(is_up)
+    reversal = is_up[last] != is_up[last - 1]
+    leading = _leading_gaps(index, runs[last - 1], last, window, max_run)
+    keep = reversal & (leading >= 1)
+    return PatternArrays(first=last[keep] - leading[keep], last=last[keep])
+
+
+def exhaustion_gaps(index: np.ndarray, is_up: np.ndarray, fill_index: np.ndarray, window: int = ISLAND_WINDOW,
+                    max_run: int = 1, filled_from: int = 0) -> PatternArrays:
+    """Gaps extending a same-direction run that were filled within window bars, at bar filled_from or later"""
+    last = np.flatnonzero((fill_index >= filled_from) & (fill_index - index <= window))
+    last = last[last >= 1]
+    runs = _run_lengths(is_up)
+    leading = _leading_gaps(index, runs[last] - 1, last, window, max_run)
+    keep = leading >= 1
+    return PatternArrays(first=last[keep] - leading[keep], last=last[keep])
+
+
+def find_islands(index: np.ndarray, is_up: np.ndarray, fill_index: np.ndarray, highs: np.ndarray,
+                 lows: np.ndarray, window: int = ISLAND_WINDOW, max_run: int = 1, exhaustion: bool = False,
+                 start: int = 1, filled_from: int = 0) -> list[Island]:
+    """
+    Islands closed by gaps from position start and, with exhaustion, exhaustion gaps filled
+    from bar filled_from, ordered by the bar they complete on. An island spans the bars from
+    its first gap up to its closing gap, an exhaustion pattern up to the fill.
+    """
+    patterns = [(island_pairs(index, is_up, window, max_run, start), index, 'island')]
+    if exhaustion:
+        patterns.append((exhaustion_gaps(index, is_up, fill_index, window, max_run, filled_from), fill_index, 'exhaustion'))
+
+    starts = np.concatenate([index[p.first] for p, _, _ in patterns])
+    ends = np.concatenate([end[p.last] for p, end, _ in patterns])
+    gap_counts = np.concatenate([p.last - p.first + 1 for p, _, _ in patterns])
+    kinds = np.concatenate([np.full(len(p.last), i) for i, (p, _, _) in enumerate(patterns)])
+    if not len(starts):
+        return []
+
+    # Only the bars the patterns cover need a table
+    lo, hi = int(starts.min()), int(ends.max())
+    high = SparseTable(highs[lo:hi], np.maximum).query(starts - lo, ends - lo)
+    low = SparseTable(lows[lo:hi], np.minimum).query(starts - lo, ends - lo)
+
+    order = np.lexsort((starts, kinds, ends))
+    return [
+        Island(high=h, low=l, start_index=s, end_index=e, gap_count=c, kind=ISLAND_KINDS[k])
+        for h, l, s, e, c, k in zip(*(column[order].tolist() for column in (high, low, starts, ends, gap_counts, kinds)))
+    ]
@@ -0,0 +1,174 @@
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+
+KEY_LEVEL_METHODS = ('chain', 'bins', 'volume')
+
+
+class LevelArrays(NamedTuple):
+    """Column-wise description of every key level, ordered by price"""
+    price: np.ndarray
+    start_index: np.ndarray
+    gap_count: np.ndarray
+
+
+def _breaks(prices: np.ndarray, tolerance: Union[float, np.ndarray], method: str) -> np.ndarray:
+    """Whether a new cluster starts between each pair of neighbours of the sorted prices"""
+    if method == 'bins':
+        bins = np.floor(prices / tolerance)
+        return bins[1:] != bins[:-1]
+    return prices[1:] - prices[:-1] > (tolerance[1:] if np.ndim(tolerance) else tolerance)
+
+
+def cluster_bounds(prices: np.ndarray, tolerance: Union[float, np.ndarray], method: str = 'chain',
+                   groups: Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sort order of the prices and the offset in that order where every cluster starts.
+    With groups (e.g. one id per ticker) prices only cluster within their group, and
+    tolerance may then be given per price.
+    """
+    order = np.argsort(prices, kind='stable') if groups is None else np.lexsort((prices, groups))
+    prices = prices[order]
+    if np.ndim(tolerance):
+        tolerance = np.asarray(tolerance, dtype=float)[order]
+    breaks = _breaks(prices, tolerance, method)
+    if groups is not None:
+        breaks |= np.diff(np.asarray(groups)[order]) != 0
+    return order, np.concatenate([[0], np.flatnonzero(breaks) + 1])
+
+
+def cluster_levels(prices: np.ndarray, indices: np.ndarray, tolerance: Union[float, np.ndarray],
+                   method: str = 'chain', volumes: Optional[np.ndarray] = None, min_count: int = 2,
+                   groups: Optional[np.ndarray] = None) -> LevelArrays:
+    """
+    Cluster gap prices into key levels with one sort and a handful of segment reductions.
+
+    chain:  neighbours in sorted order at most tolerance apart share a cluster, centred on the mean
+    bins:   fixed price bins of width tolerance, centred on the mean
+    volume: chain clusters centred on the volume-weighted mean (plain mean where volume is missing)
+
+    groups clusters many tickers' gaps in one pass, see cluster_bounds.
+    """
+    if method not in KEY_LEVEL_METHODS:
+        raise ValueError(f"Unknown key level method {method!r}, expected one of {KEY_LEVEL_METHODS}")
+    if method == 'volume' and volumes is None:
+        raise ValueError("The volume method needs gap volumes")
+
+    prices = np.asarray(prices, dtype=float)
+    if not len(prices):
+        return LevelArrays(np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    order, starts = cluster_bounds(prices, tolerance, method, groups)
+    prices, indices = prices[order], np.asarray(indices)[order]
+
+    counts = np.diff(np.append(starts, len(prices)))
+    if method == 'volume':
+        weights = np.nan_to_num(np.asarray(volumes, dtype=float)[order])
+        weight_sums = np.add.reduceat(weights, starts)
+        weighted = np.add.reduceat(prices * weights, starts)
+        means = np.add.reduceat(prices, starts) / counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            centres = np.where(weight_sums > 0, weighted / weight_sums, means)
+    else:
+        centres = np.add.reduceat(prices, starts) / counts
+
+    keep = counts >= min_count
+    return LevelArrays(
+        price=centres[keep],
+        start_index=np.minimum.reduceat(indices, starts)[keep],
+        gap_count=counts[keep]
+    )
+
+
+class LevelClusters:
+    """
+    Key levels of a growing set of gaps, kept up to date as gaps are added and the
+    tolerance moves with the mean close.
+
+    Prices are kept sorted with the cluster boundaries between them. New gaps and
+    boundaries the tolerance moved only re-cluster the clusters around them, the
+    levels elsewhere stay as they are and match what cluster_levels returns.
+    """
+
+    def __init__(self, method: str = 'chain', min_count: int = 2):
+        if method not in KEY_LEVEL_METHODS:
+            raise ValueError(f"Unknown key level method {method!r}, expected one of {KEY_LEVEL_METHODS}")
+        self.method = method
+        self.min_count = min_count
+        self.tolerance = None
+        self.prices = np.empty(0)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.volumes = np.empty(0)
+        self.breaks = np.empty(0, dtype=bool)
+        self.starts = np.empty(0, dtype=np.int64)  # Sorted position each cluster starts at
+        self.clusters = LevelArrays(np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    @property
+    def levels(self) -> LevelArrays:
+        """Clusters with at least min_count gaps, ordered by price"""
+        keep = self.clusters.gap_count >= self.min_count
+        return LevelArrays(*(column[keep] for column in self.clusters))
+
+    def update(self, prices: np.ndarray, indices: np.ndarray, tolerance: float,
+               volumes: Optional[np.ndarray] = None) -> Optional[tuple[int, int, LevelArrays]]:
+        """
+        Add gaps and move to a new tolerance. Returns None when no level changed, else
+        (first, end, levels): the levels at positions first:end were replaced by these.
+        """
+        prices = np.asarray(prices, dtype=float)
+        if not len(prices) and tolerance == self.tolerance:
+            return None
+
+        dirty = []
+        if len(prices):
+            order = np.argsort(prices, kind='stable')
+            volumes = np.full(len(prices), np.nan) if volumes is None else np.asarray(volumes, dtype=float)
+            prices, indices, volumes = prices[order], np.asarray(indices)[order], volumes[order]
+            # Equal prices go after the ones already there, as a stable sort of all gaps would put them
+            at = np.searchsorted(self.prices, prices, side='right')
+            self.starts = self.starts + np.searchsorted(at, self.starts, side='right')
+            self.prices = np.insert(self.prices, at, prices)
+            self.indices = np.insert(self.indices, at, indices)
+            self.volumes = np.insert(self.volumes, at, volumes)
+            dirty.append(at + np.arange(len(at)))
+            old = _breaks(self.prices, self.tolerance, self.method) if self.tolerance is not None else None
+        else:
+            old = self.breaks
+
+        breaks = _breaks(self.prices, tolerance, self.method)
+        if old is None:
+            old = np.ones(len(breaks), dtype=bool)
+        else:
+            moved = np.flatnonzero(breaks != old)
+            dirty.extend([moved, moved + 1])
+        self.tolerance, self.breaks = tolerance, breaks
+
+        dirty = np.concatenate(dirty) if dirty else np.empty(0, dtype=np.int64)
+        if not dirty.size:
+            return None
+
+        # Widen to boundaries that held before and after, between two gaps that were already neighbours
+        kept = np.flatnonzero(breaks & old)
+        before = np.searchsorted(kept, dirty.min() - 1)
+        after = np.searchsorted(kept, dirty.max() + 1)
+        lo = kept[before - 1] + 1 if before else 0
+        hi = kept[after] + 1 if after < len(kept) else len(self.prices)
+        return self._recluster(int(lo), int(hi))
+
+    def _recluster(self, lo: int, hi: int) -> tuple[int, int, LevelArrays]:
+        """Cluster the sorted gaps lo:hi again and splice them in place of the clusters that started there"""
+        local = cluster_levels(self.prices[lo:hi], self.indices[lo:hi], self.tolerance, self.method,
+                               volumes=self.volumes[lo:hi], min_count=1)
+        first = int(np.searchsorted(self.starts, lo))
+        end = int(np.searchsorted(self.starts, hi))
+        counts = self.clusters.gap_count
+        level_first = int(np.count_nonzero(counts[:first] >= self.min_count))
+        level_end = level_first + int(np.count_nonzero(counts[first:end] >= self.min_count))
+
+        starts = lo + np.concatenate([[0], np.cumsum(local.gap_count)[:-1]]).astype(np.int64)
+        self.starts = np.concatenate([self.starts[:first], starts, self.starts[end:]])
+        self.clusters = LevelArrays(*(
+            np.concatenate([column[:first], new, column[end:]]) for column, new in zip(self.clusters, local)
+        ))
+        keep = local.gap_count >= self.min_count
+        return level_first, level_end, LevelArrays(*(column[keep] for column in local))
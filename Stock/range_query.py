@@ -0,0 +1,149 @@
+import numpy as np
+
+
+class SparseTable:
+    """Precomputed power-of-two range minimum/maximum blocks over one price column"""
+
+    def __init__(self, values: np.ndarray, op: np.ufunc):
+        if op not in (np.minimum, np.maximum):
+            raise ValueError("SparseTable only supports np.minimum or np.maximum")
+        self.values = np.asarray(values, dtype=float)
+        self.op = op
+        self.levels = [self.values]
+
+        # levels[k][i] holds op(values[i:i + 2**k])
+        width = 1
+        while 2 * width <= len(self.values):
+            prev = self.levels[-1]
+            self.levels.append(op(prev[:-width], prev[width:]))
+            width *= 2
+
+    def _hits(self, block: np.ndarray, threshold: np.ndarray) -> np.ndarray:
+        return block <= threshold if self.op is np.minimum else block >= threshold
+
+    def find_first(self, start: np.ndarray, threshold: np.ndarray) -> np.ndarray:
+        """
+        For each query return the first index j >= start whose value reaches threshold
+        (<= for a min table, >= for a max table), or -1 when no such bar exists.
+        Runs in O(log n) per query, vectorized over all queries.
+        """
+        pos = np.array(start, dtype=np.int64)
+        threshold = np.asarray(threshold, dtype=float)
+        n = len(self.values)
+
+        # Binary lifting: skip the widest blocks that contain no hit
+        for k in reversed(range(len(self.levels))):
+            level = self.levels[k]
+            width = 1 << k
+            in_range = pos + width <= n
+            block = level[np.minimum(pos, len(level) - 1)]
+            pos[in_range & ~self._hits(block, threshold)] += width
+
+        return np.where(pos < n, pos, -1)
+
+    def query(self, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        """
+        op over values[start:end] for each query, ranges must not be empty.
+        Two overlapping power-of-two blocks cover any range, so each query is O(1).
+        """
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        if np.any(end <= start):
+            raise ValueError("SparseTable queries need non-empty ranges")
+
+        # floor(log2(length)) picks the widest block that fits the range
+        k = np.frexp((end - start).astype(float))[1] - 1
+        result = np.empty(len(start))
+        for level in np.unique(k).tolist():
+            mask = k == level
+            blocks = self.levels[level]
+            result[mask] = self.op(blocks[start[mask]], blocks[end[mask] - (1 << level)])
+        return result
+
+
+class PriceIndex:
+    """
+    Prices kept sorted next to the id of the item each one belongs to.
+
+    Nearest-above/below and range lookups bisect the sorted prices, so each query
+    is O(log n) and many prices can be queried at once. Below means strictly
+    lower and above strictly higher than the queried price. Updates bisect for
+    their positions and then copy the arrays once per batch, so they are O(n).
+    """
+
+    def __init__(self, prices=(), ids=None):
+        prices = np.asarray(prices, dtype=float)
+        ids = np.arange(len(prices)) if ids is None else np.asarray(ids, dtype=np.int64)
+        order = np.argsort(prices, kind='stable')
+        self.prices = prices[order]
+        self.ids = ids[order]
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def insert(self, prices, ids) -> None:
+        """Add items, each one lands at its bisection point"""
+        prices = np.asarray(prices, dtype=float)
+        if not prices.size:
+            return
+        order = np.argsort(prices, kind='stable')
+        prices, ids = prices[order], np.asarray(ids, dtype=np.int64)[order]
+        positions = np.searchsorted(self.prices, prices, side='right')
+        self.prices = np.insert(self.prices, positions, prices)
+        self.ids = np.insert(self.ids, positions, ids)
+
+    def remove(self, ids, prices=None) -> None:
+        """Drop every entry with one of the given ids, their prices (when given) locate them by bisection"""
+        if not np.size(ids):
+            return
+        if prices is None:
+            keep = ~np.isin(self.ids, ids)
+            self.prices, self.ids = self.prices[keep], self.ids[keep]
+            return
+
+        ids = np.asarray(ids, dtype=np.int64)
+        prices = np.asarray(prices, dtype=float)
+        starts = np.searchsorted(self.prices, prices, side='left')
+        ends = np.searchsorted(self.prices, prices, side='right')
+        # Each id is only looked for among the entries sharing its price
+        positions = np.concatenate([
+            start + np.flatnonzero(self.ids[start:end] == item)
+            for start, end, item in zip(starts.tolist(), ends.tolist(), ids.tolist())
+        ])
+        self.prices = np.delete(self.prices, positions)
+        self.ids = np.delete(self.ids, positions)
+
+    def pop_between(self, low: float, high: float) -> tuple[np.ndarray, np.ndarray]:
+        """Remove the items priced within [low, high] and return their prices and ids in price order"""
+        start = int(np.searchsorted(self.prices, low, side='left'))
+        end = int(np.searchsorted(self.prices, high, side='right'))
+        prices, ids = self.prices[start:end], self.ids[start:end]
+        if end > start:
+            self.prices = np.concatenate([self.prices[:start], self.prices[end:]])
+            self.ids = np.concatenate([self.ids[:start], self.ids[end:]])
+        return prices, ids
+
+    def below(self, price: float, k: int = 1) -> np.ndarray:
+        """Ids of the k highest prices under price, nearest first"""
+        end = int(np.searchsorted(self.prices, price, side='left'))
+        return self.ids[max(end - k, 0):end][::-1]
+
+    def above(self, price: float, k: int = 1) -> np.ndarray:
+        """Ids of the k lowest prices over price, nearest first"""
+        start = int(np.searchsorted(self.prices, price, side='right'))
+        return self.ids[start:start + k]
+
+    def between(self, low: float, high: float) -> np.ndarray:
+        """Ids of prices within [low, high] in price order"""
+        start = np.searchsorted(self.prices, low, side='left')
+        end = np.searchsorted(self.prices, high, side='right')
+        return self.ids[start:end]
+
+    def nearest(self, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Closest price below and above each queried price, NaN where there is none"""
+        prices = np.asarray(prices, dtype=float)
+        lower = np.searchsorted(self.prices, prices, side='left') - 1
+        upper = np.searchsorted(self.prices, prices, side='right')
+        padded = np.append(self.prices, np.nan)
+        return (np.where(lower >= 0, padded[lower], np.nan),
+                np.where(upper < len(self), padded[np.minimum(upper, len(self))], np.nan))
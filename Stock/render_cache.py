@@ -0,0 +1,157 @@
+"""
+Content-addressed cache for rendered charts and caption text.
+
+Entries are keyed by a SHA-256 of the analyzed bars (index and OHLCV values), the
+ticker, interval and analysis settings, the kind of entry with its parameters, and
+RENDER_VERSION. The same bars always produce the same key, so weekend reruns,
+retried sends and several chats asking for one ticker reuse the stored bytes instead
+of running mplfinance again. Recently used entries are kept in memory and every
+entry on disk, both evicted least recently used first once over their byte budget.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from Stock.data import StockData
+
+RENDER_VERSION = 1  # Bump when the chart or caption layout changes, older entries then stop matching
+DEFAULT_RENDER_DIR = os.getenv("RENDER_CACHE_DIR", ".render_cache")
+
+
+def content_key(analyzer: StockData, kind: str, **params) -> str:
+    """Hex digest identifying what rendering `kind` with params from the analyzer's bars produces"""
+    digest = hashlib.sha256()
+    settings = (
+        RENDER_VERSION, kind, sorted(params.items()),
+        analyzer.ticker, analyzer.interval, analyzer.period_days, analyzer.key_level_method,
+        analyzer.island_window, analyzer.island_max_run, analyzer.exhaustion,
+        analyzer.indicators, np.dtype(analyzer.indicator_dtype).str
+    )
+    digest.update(repr(settings).encode())
+
+    frame = analyzer.data
+    index = pd.DatetimeIndex(frame.index)
+    digest.update(str(index.tz).encode())
+    digest.update(index.as_unit('ns').asi8.tobytes())
+    for col in StockData.OHLCV_COLUMNS:
+        digest.update(frame[col].to_numpy(dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    Rendered payloads by content key, in a memory LRU in front of a directory of files.
+
+    Disk recency is the file's modification time, refreshed on every hit. Safe to
+    share between the threads main() renders and builds captions in.
+    """
+
+    def __init__(self, root: str = DEFAULT_RENDER_DIR, memory_bytes: int = 64 * 2 ** 20,
+                 disk_bytes: int = 512 * 2 ** 20):
+        self.root = root
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(analyzer: StockData, kind: str, **params) -> str:
+        return content_key(analyzer, kind, **params)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _remember(self, key: str, payload: bytes) -> None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = payload
+            self._memory_size += len(payload)
+            while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+                _, dropped = self._memory.popitem(last=False)
+                self._memory_size -= len(dropped)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """The stored payload, from memory or else from disk, None on a miss"""
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return payload
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        self._remember(key, payload)
+        return payload
+
+    def put(self, key: str, payload: bytes) -> None:
+        """Store a payload in memory and on disk, written to a temporary file first so readers never see part of it"""
+        self._remember(key, payload)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def get_or_create(self, key: str, create: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        """The cached payload, or create() stored under key; a None from create is returned but not stored"""
+        payload = self.get(key)
+        if payload is None:
+            payload = create()
+            if payload is not None:
+                self.put(key, payload)
+        return payload
+
+    def evict(self) -> int:
+        """Delete the least recently used files until the directory fits disk_bytes, returns how many were removed"""
+        if not os.path.isdir(self.root):
+            return 0
+
+        entries = []
+        for shard in os.listdir(self.root):
+            shard_path = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                if name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(shard_path, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(shard_path, name)))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,326 @@
+"""
+Append-only SQLite store of analysis results, so history questions are a query
+instead of a re-download.
+
+Every recorded analysis becomes a snapshot row (ticker, interval, last bar, close,
+indicators, the message) plus one row per gap, key level and island as they stood
+in that run. Breadth percentages are stored per date and SMA window. Nothing is
+updated or deleted: a later run recording the same date adds a row and queries
+read the newest one. Times are stored as UTC nanoseconds and rows carry their
+ticker and bar time, so lookups by ticker, date and price run on indexes.
+
+Usage:
+    python -m Stock.results_store [--db .results/results.sqlite] [--breadth 20] [--ticker ^GSPC [--price 5000]]
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from Stock.data import StockData
+
+DEFAULT_RESULTS_DB = os.getenv("RESULTS_DB", os.path.join(".results", "results.sqlite"))
+TimeLike = Union[pd.Timestamp, str, None]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    run_id INTEGER PRIMARY KEY,
+    recorded_at REAL NOT NULL,
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    bar_time INTEGER NOT NULL,
+    bars INTEGER NOT NULL,
+    close REAL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS snapshots_ticker_time ON snapshots (ticker, interval, bar_time);
+
+CREATE TABLE IF NOT EXISTS indicators (
+    run_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS indicators_run ON indicators (run_id);
+
+CREATE TABLE IF NOT EXISTS gaps (
+    run_id INTEGER NOT NULL,
+    ticker TEXT NOT NULL,
+    bar_time INTEGER NOT NULL,
+    gap_time INTEGER NOT NULL,
+    price_level REAL NOT NULL,
+    gap_from REAL NOT NULL,
+    gap_to REAL NOT NULL,
+    is_up INTEGER NOT NULL,
+    volume REAL,
+    fill_time INTEGER
+);
+CREATE INDEX IF NOT EXISTS gaps_ticker_time ON gaps (ticker, bar_time);
+CREATE INDEX IF NOT EXISTS gaps_ticker_price ON gaps (ticker, price_level);
+
+CREATE TABLE IF NOT EXISTS key_levels (
+    run_id INTEGER NOT NULL,
+    ticker TEXT NOT NULL,
+    bar_time INTEGER NOT NULL,
+    price REAL NOT NULL,
+    start_time INTEGER NOT NULL,
+    gap_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS key_levels_ticker_time ON key_levels (ticker, bar_time);
+CREATE INDEX IF NOT EXISTS key_levels_ticker_price ON key_levels (ticker, price);
+
+CREATE TABLE IF NOT EXISTS islands (
+    run_id INTEGER NOT NULL,
+    ticker TEXT NOT NULL,
+    bar_time INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    start_time INTEGER NOT NULL,
+    end_time INTEGER NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    gap_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS islands_ticker_time ON islands (ticker, bar_time);
+
+CREATE TABLE IF NOT EXISTS breadth (
+    recorded_at REAL NOT NULL,
+    date INTEGER NOT NULL,
+    sma_window INTEGER NOT NULL,
+    percentage REAL
+);
+CREATE INDEX IF NOT EXISTS breadth_window_date ON breadth (sma_window, date, recorded_at);
+"""
+
+
+def _ns(timestamp: TimeLike) -> Optional[int]:
+    """UTC nanoseconds of a timestamp, naive ones are taken as UTC"""
+    if timestamp is None:
+        return None
+    timestamp = pd.Timestamp(timestamp)
+    return (timestamp.tz_convert('UTC') if timestamp.tz is not None else timestamp).as_unit('ns').value
+
+
+def _times(values: pd.Series) -> pd.Series:
+    return pd.to_datetime(values, unit='ns', utc=True)
+
+
+class ResultsStore:
+    """
+    Records StockData results and breadth into one SQLite file and reads their history back.
+
+    The connection opens on first use and is shared by threads under a lock. Pickled
+    copies (e.g. sent to a worker process) only carry the path and open their own.
+    """
+
+    def __init__(self, path: str = DEFAULT_RESULTS_DB, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        return {'path': self.path, 'clock': self.clock}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # WAL lets readers (charts, backtests) query while a run is appending
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def record_analysis(self, analyzer: StockData, message: Optional[str] = None) -> int:
+        """Append one snapshot of the analyzer's results, returns its run_id"""
+        data = analyzer.data
+        times = pd.DatetimeIndex(data.index).as_unit('ns').asi8
+        bar_time = int(times[-1])
+        ticker = analyzer.ticker
+        indicators = [(name, float(analyzer.get_last(name))) for name in analyzer.indicators]
+
+        gaps = analyzer.gaps
+        fill_times = [fill_time if filled else None
+                      for fill_time, filled in zip(gaps.fill_time.astype('int64').tolist(), gaps.filled.tolist())]
+        gap_rows = zip(
+            times[gaps.index].tolist(), gaps.price_level.tolist(), gaps.gap_from.tolist(), gaps.gap_to.tolist(),
+            gaps.is_up.astype(int).tolist(), gaps.volume.tolist(), fill_times
+        )
+        level_rows = [(ticker, bar_time, level.price, int(times[level.start_index]), level.gap_count)
+                      for level in analyzer.key_levels]
+        island_rows = [(ticker, bar_time, island.kind, int(times[island.start_index]), int(times[island.end_index]),
+                        island.high, island.low, island.gap_count) for island in analyzer.islands]
+
+        with self._lock, self.connection as connection:
+            run_id = connection.execute(
+                "INSERT INTO snapshots (recorded_at, ticker, interval, bar_time, bars, close, message) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.clock(), ticker, analyzer.interval, bar_time, len(data),
+                 float(analyzer.get_last('Close')), message)
+            ).lastrowid
+            connection.executemany(
+                "INSERT INTO indicators (run_id, name, value) VALUES (?, ?, ?)",
+                [(run_id, name, None if np.isnan(value) else value) for name, value in indicators]
+            )
+            connection.executemany(
+                "INSERT INTO gaps (run_id, ticker, bar_time, gap_time, price_level, gap_from, gap_to, is_up, volume, "
+                "fill_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((run_id, ticker, bar_time, *row) for row in gap_rows)
+            )
+            connection.executemany(
+                "INSERT INTO key_levels (run_id, ticker, bar_time, price, start_time, gap_count) VALUES (?, ?, ?, ?, ?, ?)",
+                ((run_id, *row) for row in level_rows)
+            )
+            connection.executemany(
+                "INSERT INTO islands (run_id, ticker, bar_time, kind, start_time, end_time, high, low, gap_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((run_id, *row) for row in island_rows)
+            )
+        return run_id
+
+    def record_breadth(self, breadth: pd.DataFrame) -> int:
+        """Append the percentages of a get_breadth / compute_breadth frame (SMA_<window> columns), returns rows written"""
+        dates = pd.DatetimeIndex(breadth.index).as_unit('ns').asi8.tolist()
+        recorded_at = self.clock()
+        rows = []
+        for column in breadth.columns:
+            window = int(str(column).split('_')[-1])
+            values = breadth[column].to_numpy(dtype=float)
+            rows.extend((recorded_at, date, window, None if np.isnan(value) else value)
+                        for date, value in zip(dates, values.tolist()))
+        with self._lock, self.connection as connection:
+            connection.executemany("INSERT INTO breadth (recorded_at, date, sma_window, percentage) VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def _query(self, sql: str, params: tuple) -> pd.DataFrame:
+        with self._lock:
+            cursor = self.connection.execute(sql, params)
+            columns = [description[0] for description in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    @staticmethod
+    def _range(column: str, start: TimeLike, end: TimeLike) -> tuple[str, tuple]:
+        """SQL condition and parameters bounding a time column to [start, end]"""
+        return f"{column} BETWEEN ? AND ?", (_ns(start) if start is not None else -2 ** 63,
+                                             _ns(end) if end is not None else 2 ** 63 - 1)
+
+    def breadth_history(self, window: int = 20, start: TimeLike = None, end: TimeLike = None) -> pd.Series:
+        """Percentage above the window-day SMA per date, the newest recording of each date wins"""
+        condition, bounds = self._range('date', start, end)
+        # SQLite takes the bare columns of a MAX() aggregate from the row holding the maximum
+        frame = self._query(
+            f"SELECT date, percentage, MAX(recorded_at) FROM breadth WHERE sma_window = ? AND {condition} "
+            f"GROUP BY date ORDER BY date",
+            (window, *bounds)
+        )
+        return pd.Series(frame['percentage'].to_numpy(dtype=float), index=_times(frame['date']), name=f'SMA_{window}')
+
+    def snapshots(self, ticker: str, interval: Optional[str] = None, start: TimeLike = None,
+                  end: TimeLike = None) -> pd.DataFrame:
+        """One row per recorded run of ticker with its close and indicator values, indexed by last bar time"""
+        condition, bounds = self._range('s.bar_time', start, end)
+        interval_condition = "AND s.interval = ?" if interval is not None else ""
+        params = (ticker.upper(), *((interval,) if interval is not None else ()), *bounds)
+        frame = self._query(
+            f"SELECT s.run_id, s.recorded_at, s.interval, s.bar_time, s.bars, s.close, i.name, i.value "
+            f"FROM snapshots s LEFT JOIN indicators i ON i.run_id = s.run_id "
+            f"WHERE s.ticker = ? {interval_condition} AND {condition} ORDER BY s.bar_time, s.run_id",
+            params
+        )
+        if frame.empty:
+            return frame.drop(columns=['name', 'value']).set_index('bar_time')
+        runs = frame.drop(columns=['name', 'value']).drop_duplicates('run_id').set_index('run_id')
+        named = frame.dropna(subset=['name'])
+        if not named.empty:
+            runs = runs.join(named.pivot(index='run_id', columns='name', values='value'))
+        runs = runs.reset_index()
+        runs['bar_time'] = _times(runs['bar_time'])
+        return runs.set_index('bar_time')
+
+    def _history(self, table: str, columns: str, ticker: str, start: TimeLike, end: TimeLike,
+                 price_column: Optional[str] = None, price: Optional[float] = None,
+                 tolerance: float = 0.0) -> pd.DataFrame:
+        condition, bounds = self._range('bar_time', start, end)
+        params = (ticker.upper(), *bounds)
+        if price is not None:
+            condition += f" AND {price_column} BETWEEN ? AND ?"
+            params += (price - tolerance, price + tolerance)
+        return self._query(
+            f"SELECT run_id, bar_time, {columns} FROM {table} WHERE ticker = ? AND {condition} ORDER BY bar_time, run_id",
+            params
+        )
+
+    def level_history(self, ticker: str, price: Optional[float] = None, tolerance: float = 0.0,
+                      start: TimeLike = None, end: TimeLike = None) -> pd.DataFrame:
+        """Key levels of every run of ticker (within price +- tolerance when given), with the run's last bar time"""
+        frame = self._history('key_levels', 'price, start_time, gap_count', ticker, start, end, 'price', price, tolerance)
+        for column in ('bar_time', 'start_time'):
+            frame[column] = _times(frame[column])
+        return frame
+
+    def gap_history(self, ticker: str, price: Optional[float] = None, tolerance: float = 0.0,
+                    start: TimeLike = None, end: TimeLike = None) -> pd.DataFrame:
+        """Gaps of every run of ticker with their fill status at the time, fill_time is NaT while open"""
+        frame = self._history('gaps', 'gap_time, price_level, gap_from, gap_to, is_up, volume, fill_time',
+                              ticker, start, end, 'price_level', price, tolerance)
+        for column in ('bar_time', 'gap_time', 'fill_time'):
+            frame[column] = _times(frame[column])
+        frame['is_up'] = frame['is_up'].astype(bool)
+        return frame
+
+    def island_history(self, ticker: str, start: TimeLike = None, end: TimeLike = None) -> pd.DataFrame:
+        """Islands and exhaustion patterns of every run of ticker"""
+        frame = self._history('islands', 'kind, start_time, end_time, high, low, gap_count', ticker, start, end)
+        for column in ('bar_time', 'start_time', 'end_time'):
+            frame[column] = _times(frame[column])
+        return frame
+
+    def level_first_seen(self, ticker: str, price: float, tolerance: float) -> Optional[pd.Timestamp]:
+        """Last bar time of the earliest run that had a key level within price +- tolerance, None if none did"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT MIN(bar_time) FROM key_levels WHERE ticker = ? AND price BETWEEN ? AND ?",
+                (ticker.upper(), price - tolerance, price + tolerance)
+            ).fetchone()
+        return pd.Timestamp(row[0], unit='ns', tz='UTC') if row[0] is not None else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DEFAULT_RESULTS_DB)
+    parser.add_argument('--breadth', type=int, default=None, help="Print the breadth history of this SMA window")
+    parser.add_argument('--ticker', default=None, help="Print the recorded snapshots of a ticker")
+    parser.add_argument('--price', type=float, default=None, help="With --ticker: history of key levels near price")
+    parser.add_argument('--tolerance', type=float, default=None, help="Price tolerance, 1%% of --price by default")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.breadth is not None:
+        print(store.breadth_history(args.breadth).to_string())
+    if args.ticker is not None:
+        if args.price is None:
+            print(store.snapshots(args.ticker).drop(columns='recorded_at').to_string())
+        else:
+            tolerance = args.tolerance if args.tolerance is not None else 0.01 * args.price
+            print(store.level_history(args.ticker, args.price, tolerance).to_string())
+            print(f"\nFirst seen: {store.level_first_seen(args.ticker, args.price, tolerance)}")
+
+
+if __name__ == "__main__":
+    main()
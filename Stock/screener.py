@@ -0,0 +1,267 @@
+"""
+Screen a whole ticker universe for price near open gaps or key levels and for fresh
+island reversals.
+
+Bars of every ticker are packed into one (tickers x bars) panel, right-aligned so
+the last bar of every ticker shares a column. Gaps, fills, key levels and islands
+are then found for all tickers at once with the same rules as StockData, instead
+of one pandas pipeline per ticker.
+
+Usage:
+    python -m Stock.screener [--period-days 500] [--interval 1d] [--within 2] [--fresh 5]
+                             [--top 25] [--post] [--no-cache] [--output screen.csv]
+"""
+import argparse
+import asyncio
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from constants import TICKERS
+from profiler import instrument
+from Stock.cache import OHLCV_COLUMNS, OHLCVCache, YahooFetcher
+from Stock.islands import ISLAND_WINDOW
+from Stock.levels import cluster_levels
+from Stock.range_query import SparseTable
+
+
+class Panel(NamedTuple):
+    """OHLCV bars of many tickers as one (columns x tickers x bars) array, NaN before a ticker's first bar"""
+    tickers: list[str]
+    values: np.ndarray
+    last_time: list[pd.Timestamp]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.values[OHLCV_COLUMNS.index(key)]
+        return tuple.__getitem__(self, key)
+
+    @property
+    def width(self) -> int:
+        return self.values.shape[2]
+
+
+class PanelGaps(NamedTuple):
+    """Column-wise description of the gaps of every ticker, ordered by ticker then bar"""
+    row: np.ndarray
+    index: np.ndarray
+    is_up: np.ndarray
+    gap_from: np.ndarray
+    gap_to: np.ndarray
+    volume: np.ndarray
+    fill_index: np.ndarray
+
+
+def build_panel(frames: dict[str, pd.DataFrame], bars: Optional[int] = None) -> Panel:
+    """Pack the complete bars of each frame into a Panel, keeping at most the last `bars` of each"""
+    # Column by column, selecting a column list costs more than the copy for short frames
+    columns = {ticker: np.column_stack([frame[col].to_numpy(dtype=float) for col in OHLCV_COLUMNS])
+               for ticker, frame in frames.items()}
+    columns = {ticker: values[~np.isnan(values).any(axis=1)] for ticker, values in columns.items()}
+    tickers = [ticker for ticker, values in columns.items() if len(values)]
+    width = max((len(columns[ticker]) for ticker in tickers), default=0)
+    width = min(width, bars) if bars else width
+
+    values = np.full((len(OHLCV_COLUMNS), len(tickers), width), np.nan)
+    last_time = []
+    for row, ticker in enumerate(tickers):
+        rows = columns[ticker][-width:]
+        values[:, row, width - len(rows):] = rows.T
+        last_time.append(frames[ticker].index[-1])
+    return Panel(tickers, values, last_time)
+
+
+def detect_panel_gaps(panel: Panel) -> PanelGaps:
+    """Gaps and their fill bar for every ticker of the panel, thresholds scaled by each ticker's mean close"""
+    highs, lows = panel['High'], panel['Low']
+    min_gap_size = 0.002 * np.nanmean(panel['Close'], axis=1)[:, None]
+
+    # NaN padding compares False, so no gap is found before a ticker's first bar
+    gap_up = lows[:, 1:] - highs[:, :-1] > min_gap_size
+    gap_down = ~gap_up & (lows[:, :-1] - highs[:, 1:] > min_gap_size)
+    row, prev = np.nonzero(gap_up | gap_down)
+    index = prev + 1
+    is_up = gap_up[row, prev]
+    gap_from = np.where(is_up, highs[row, prev], lows[row, prev])
+
+    return PanelGaps(
+        row=row,
+        index=index,
+        is_up=is_up,
+        gap_from=gap_from,
+        gap_to=np.where(is_up, lows[row, index], highs[row, index]),
+        volume=panel['Volume'][row, index],
+        fill_index=find_panel_fills(highs, lows, row, index, is_up, gap_from)
+    )
+
+
+def find_panel_fills(highs: np.ndarray, lows: np.ndarray, row: np.ndarray, index: np.ndarray,
+                     is_up: np.ndarray, gap_from: np.ndarray) -> np.ndarray:
+    """
+    find_gap_fills over every ticker at once: the rows are laid end to end in one sparse
+    table, each closed by a sentinel bar that always fills, so no search runs into the
+    next ticker. Fills on the sentinel mean the gap is still open (-1).
+    """
+    tickers, width = highs.shape
+    fills = np.full(len(index), -1, dtype=np.int64)
+
+    for mask, values, op, never in ((is_up, lows, np.minimum, np.inf), (~is_up, highs, np.maximum, -np.inf)):
+        if not mask.any():
+            continue
+        # Padding must never fill, and NaN would poison every block it falls in
+        rows = np.column_stack([np.where(np.isnan(values), never, values), np.full(tickers, -never)])
+        found = SparseTable(rows.ravel(), op).find_first(row[mask] * (width + 1) + index[mask], gap_from[mask])
+        column = found % (width + 1)
+        fills[mask] = np.where(column < width, column, -1)
+    return fills
+
+
+def panel_key_levels(panel: Panel, gaps: PanelGaps, method: str = 'chain') -> tuple[np.ndarray, np.ndarray]:
+    """(row, price) of every key level, clustered per ticker with StockData's tolerance"""
+    tolerance = 0.01 * np.nanmean(panel['Close'], axis=1)
+    levels = cluster_levels(
+        gaps.gap_from,
+        gaps.row * panel.width + gaps.index,
+        tolerance[gaps.row],
+        method=method,
+        volumes=gaps.volume,
+        groups=gaps.row
+    )
+    # Gap positions were made unique across tickers, the earliest one tells the ticker
+    return levels.start_index // panel.width, levels.price
+
+
+def panel_islands(gaps: PanelGaps, window: int = ISLAND_WINDOW) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(row, end_index, is_up) of every island reversal: opposite gaps of one ticker within window bars"""
+    pairs = np.flatnonzero(
+        (gaps.row[1:] == gaps.row[:-1])
+        & (np.diff(gaps.index) <= window)
+        & (gaps.is_up[1:] != gaps.is_up[:-1])
+    ) + 1
+    return gaps.row[pairs], gaps.index[pairs], gaps.is_up[pairs]
+
+
+def _nearest(rows: np.ndarray, prices: np.ndarray, closes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Per ticker, the price closest to its close (NaN where the ticker has none) and its distance in %"""
+    nearest = np.full(len(closes), np.nan)
+    if len(rows):
+        distance = np.abs(prices - closes[rows])
+        order = np.lexsort((distance, rows))
+        first = order[np.unique(rows[order], return_index=True)[1]]
+        nearest[rows[first]] = prices[first]
+    return nearest, (nearest - closes) / closes * 100
+
+
+@instrument()
+def screen_panel(panel: Panel, within: float = 2.0, fresh: int = 5, key_level_method: str = 'chain') -> pd.DataFrame:
+    """
+    One row per ticker whose close is within `within` % of an open gap or key level, or
+    that completed an island reversal in its last `fresh` bars. Fresh islands rank first,
+    then tickers closest to a gap or level.
+    """
+    closes = panel['Close'][:, -1]
+    gaps = detect_panel_gaps(panel)
+
+    open_gaps = gaps.fill_index < 0
+    gap, gap_pct = _nearest(gaps.row[open_gaps], gaps.gap_from[open_gaps], closes)
+    level, level_pct = _nearest(*panel_key_levels(panel, gaps, key_level_method), closes)
+
+    island_bars_ago = np.full(len(closes), np.nan)
+    island_up = np.zeros(len(closes), dtype=bool)
+    island_row, island_end, island_is_up = panel_islands(gaps)
+    # Islands come ordered by ticker then bar, keep the newest one of each ticker
+    newest = np.flatnonzero(np.append(island_row[1:] != island_row[:-1], True)) if len(island_row) else []
+    island_bars_ago[island_row[newest]] = panel.width - 1 - island_end[newest]
+    island_up[island_row[newest]] = island_is_up[newest]
+
+    table = pd.DataFrame({
+        'close': closes,
+        'open_gap': gap,
+        'gap_pct': gap_pct,
+        'key_level': level,
+        'level_pct': level_pct,
+        'island_bars_ago': island_bars_ago,
+        'island': np.where(np.isnan(island_bars_ago), None, np.where(island_up, 'bullish', 'bearish')),
+        'as_of': panel.last_time
+    }, index=pd.Index(panel.tickers, name='ticker'))
+
+    table['distance_pct'] = table[['gap_pct', 'level_pct']].abs().min(axis=1)
+    table['fresh_island'] = table['island_bars_ago'] < fresh
+    matches = table[table['fresh_island'] | (table['distance_pct'] <= within)]
+    # The age of an island only orders the fresh ones, the rest rank by distance alone
+    fresh_bars_ago = matches['island_bars_ago'].where(matches['fresh_island'])
+    order = matches.assign(fresh_bars_ago=fresh_bars_ago).sort_values(
+        ['fresh_island', 'fresh_bars_ago', 'distance_pct'], ascending=[False, True, True]).index
+    return matches.loc[order]
+
+
+def format_screen(table: pd.DataFrame, top: int = 25) -> str:
+    """Plain-text version of the ranked table for a Telegram message"""
+    lines = [f"Screener: {len(table)} names near an open gap or key level, or with a fresh island"]
+    for ticker, row in table.head(top).iterrows():
+        parts = [f"{ticker} {row['close']:.2f}"]
+        if not np.isnan(row['gap_pct']):
+            parts.append(f"gap {row['open_gap']:.2f} ({row['gap_pct']:+.1f}%)")
+        if not np.isnan(row['level_pct']):
+            parts.append(f"level {row['key_level']:.2f} ({row['level_pct']:+.1f}%)")
+        if row['fresh_island']:
+            parts.append(f"{row['island']} island {row['island_bars_ago']:.0f} bars ago")
+        lines.append(" | ".join(parts))
+    if len(table) > top:
+        lines.append(f"... and {len(table) - top} more")
+    return "\n".join(lines)
+
+
+def run_screen(tickers: list[str] = TICKERS, period_days: int = 500, interval: str = '1d',
+               cache: Optional[OHLCVCache] = None, **screen) -> pd.DataFrame:
+    """Load the universe in one bulk call (or from the cache) and screen it"""
+    if cache is not None:
+        frames = cache.get_many(list(tickers), interval, period_days)
+    else:
+        frames = YahooFetcher()(list(tickers), interval, period=f"{period_days}d")
+    return screen_panel(build_panel(frames), **screen)
+
+
+async def post_screen(table: pd.DataFrame, top: int = 25) -> None:
+    from telegram_bot import MyBot
+
+    async with MyBot() as bot:
+        await bot.send_message_to_group(format_screen(table, top))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--period-days', type=int, default=500)
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--within', type=float, default=2.0, help="Max distance to an open gap or key level in %%")
+    parser.add_argument('--fresh', type=int, default=5, help="Islands completed within this many bars count as fresh")
+    parser.add_argument('--key-level-method', default='chain')
+    parser.add_argument('--top', type=int, default=25, help="Rows printed and posted")
+    parser.add_argument('--post', action='store_true', help="Post the table to the Telegram group")
+    parser.add_argument('--no-cache', action='store_true', help="Download directly instead of using the OHLCV cache")
+    parser.add_argument('--output', default=None, help="Optional CSV path for the full table")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = run_screen(
+        period_days=args.period_days,
+        interval=args.interval,
+        cache=None if args.no_cache else OHLCVCache(),
+        within=args.within,
+        fresh=args.fresh,
+        key_level_method=args.key_level_method
+    )
+    elapsed = time.perf_counter() - start
+
+    print(format_screen(table, args.top))
+    print(f"\nScreened {len(TICKERS)} tickers in {elapsed:.2f}s")
+    if args.output:
+        table.to_csv(args.output)
+    if args.post:
+        asyncio.run(post_screen(table, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Multi-timeframe analysis from a single download.
+
+Bars are fetched once at the finest requested interval and aggregated locally
+into every coarser one, each timeframe gets its own StockData analysis and the
+key levels of all timeframes are merged into one ladder. Yahoo only serves
+intraday history for a limited window (60 days of 5m, 730 days of 1h), so
+period_days has to fit the finest interval.
+"""
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from profiler import instrument
+from Stock.cache import OHLCVCache
+from Stock.custom_dataclasses import TimeframeLevel
+from Stock.data import StockData
+from Stock.levels import cluster_bounds
+
+DEFAULT_TIMEFRAMES = ('1h', '1d', '1wk')
+INTERVAL_PATTERN = re.compile(r'(\d+)(m|h|d|wk|mo)')
+UNIT_LENGTHS = {
+    'm': pd.Timedelta(minutes=1),
+    'h': pd.Timedelta(hours=1),
+    'd': pd.Timedelta(days=1),
+    'wk': pd.Timedelta(weeks=1),
+    'mo': pd.Timedelta(days=30)
+}
+
+
+def _parse_interval(interval: str) -> tuple[int, str]:
+    match = INTERVAL_PATTERN.fullmatch(interval.lower())
+    if not match:
+        raise ValueError(f"Unsupported interval {interval!r}")
+    count, unit = int(match.group(1)), match.group(2)
+    if unit in ('d', 'wk', 'mo') and count != 1:
+        raise ValueError(f"Only single {unit} buckets are supported, got {interval!r}")
+    return count, unit
+
+
+def interval_length(interval: str) -> pd.Timedelta:
+    """Nominal bar length, months count as 30 days"""
+    count, unit = _parse_interval(interval)
+    return count * UNIT_LENGTHS[unit]
+
+
+def bucket_labels(index: pd.DatetimeIndex, interval: str) -> pd.DatetimeIndex:
+    """Start of the coarser bar every timestamp falls into, in the index's own timezone"""
+    count, unit = _parse_interval(interval)
+    local = index.tz_localize(None) if index.tz is not None else index
+
+    if unit in ('m', 'h'):
+        # Intraday buckets are anchored on the first bar's wall-clock time, e.g. 9:30 for US
+        # equity hours, but the offset into the bucket is taken off the absolute timestamp so
+        # the repeated hour of a daylight saving change stays two bars and never needs localizing
+        width = interval_length(interval)
+        origin = local[0].floor('min')
+        return pd.DatetimeIndex(index - (local - origin) % width)
+
+    # Calendar buckets are computed on wall-clock time so daylight saving can't shift a midnight
+    if unit == 'd':
+        labels = local.normalize()
+    elif unit == 'wk':
+        labels = local.normalize() - pd.to_timedelta(local.weekday, unit='D')
+    else:
+        labels = local.normalize() - pd.to_timedelta(local.day - 1, unit='D')
+
+    labels = pd.DatetimeIndex(labels)
+    return labels.tz_localize(index.tz) if index.tz is not None else labels
+
+
+def resample_ohlcv(frame: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Aggregate time-sorted bars into coarser ones: first open, max high, min low,
+    last close and summed volume, reading the frame's columns in place.
+    """
+    if frame.empty:
+        return frame[StockData.OHLCV_COLUMNS].copy()
+
+    labels = bucket_labels(pd.DatetimeIndex(frame.index), interval)
+    keys = labels.asi8
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    ends = np.append(starts[1:], len(keys)) - 1
+
+    return pd.DataFrame({
+        'Open': frame['Open'].to_numpy()[starts],
+        'High': np.maximum.reduceat(frame['High'].to_numpy(), starts),
+        'Low': np.minimum.reduceat(frame['Low'].to_numpy(), starts),
+        'Close': frame['Close'].to_numpy()[ends],
+        'Volume': np.add.reduceat(frame['Volume'].to_numpy(), starts)
+    }, index=labels[starts])
+
+
+def merge_key_levels(timeframes: dict[str, StockData], tolerance: float,
+                     method: str = 'chain', min_timeframes: int = 1) -> list[TimeframeLevel]:
+    """
+    Pool the key levels of every timeframe and cluster them again by price. Merged
+    levels are centred on the gap-count weighted mean and list the timeframes they came from.
+    """
+    names, prices, counts, first_seen = [], [], [], []
+    for position, (interval, analyzer) in enumerate(timeframes.items()):
+        if not analyzer.key_levels:
+            continue
+        index = pd.DatetimeIndex(analyzer.data.index)
+        names.append(np.full(len(analyzer.key_levels), position))
+        prices.append([level.price for level in analyzer.key_levels])
+        counts.append([level.gap_count for level in analyzer.key_levels])
+        first_seen.append(index[[level.start_index for level in analyzer.key_levels]])
+    if not prices:
+        return []
+
+    prices, counts = np.concatenate(prices).astype(float), np.concatenate(counts)
+    codes = np.concatenate(names)
+    times = first_seen[0].append(first_seen[1:])
+
+    order, starts = cluster_bounds(prices, tolerance, method)
+    prices, counts, codes, times = prices[order], counts[order], codes[order], times[order]
+    gap_counts = np.add.reduceat(counts, starts)
+    centres = np.add.reduceat(prices * counts, starts) / gap_counts
+
+    intervals = list(timeframes)
+    levels = []
+    for cluster, (start, end) in enumerate(zip(starts.tolist(), np.append(starts[1:], len(prices)).tolist())):
+        members = sorted(set(codes[start:end].tolist()))
+        if len(members) < min_timeframes:
+            continue
+        levels.append(TimeframeLevel(
+            price=float(centres[cluster]),
+            gap_count=int(gap_counts[cluster]),
+            timeframes=tuple(intervals[code] for code in members),
+            first_seen=times[start:end].min()
+        ))
+    return levels
+
+
+class MultiTimeframeData:
+    """StockData analyses of one ticker on several intervals, all built from one download"""
+
+    def __init__(self, ticker: str, period_days: int, intervals=DEFAULT_TIMEFRAMES,
+                 cache: Optional[OHLCVCache] = None, key_level_method: str = 'chain'):
+        self.intervals = sorted((interval.lower() for interval in intervals), key=interval_length)
+        self.base = StockData(ticker, period_days, self.intervals[0], cache=cache, key_level_method=key_level_method)
+        self.key_level_method = key_level_method
+        self.timeframes: dict[str, StockData] = {}
+        self.key_levels: list[TimeframeLevel] = []
+
+    def fetch_data(self) -> None:
+        """Download the finest interval, the only network call"""
+        self.base.fetch_data()
+
+    @instrument()
+    def analyze(self, min_timeframes: int = 1) -> None:
+        """Aggregate the base bars into every timeframe, analyze each and merge their key levels"""
+        base_bars = self.base.data[StockData.OHLCV_COLUMNS]
+        self.timeframes = {}
+        for interval in self.intervals:
+            if interval == self.base.interval:
+                analyzer = self.base
+            else:
+                analyzer = StockData(self.base.ticker, self.base.period_days, interval,
+                                     key_level_method=self.key_level_method)
+                analyzer.data = resample_ohlcv(base_bars, interval)
+            analyzer.analyze()
+            self.timeframes[interval] = analyzer
+
+        tolerance = 0.01 * self.base._mean_close()
+        self.key_levels = merge_key_levels(self.timeframes, tolerance, method=self.key_level_method,
+                                           min_timeframes=min_timeframes)
+
+    def analyze_pipline(self) -> None:
+        """Run complete multi-timeframe pipeline"""
+        self.fetch_data()
+        self.analyze()
+
+    def __getitem__(self, interval: str) -> StockData:
+        return self.timeframes[interval.lower()]
@@ -0,0 +1,68 @@
+"""
+Compare what a poll of the alert daemon costs against the cold run it replaces
+(re-analyzing every ticker's whole history), over a replayed synthetic watchlist.
+
+Usage:
+    python -m benchmarks.bench_alerts [--tickers 300] [--bars 2000] [--polls 50]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.synthetic import make_ohlcv
+from Stock.alerts import AlertDaemon, ReplayFeed
+from Stock.data import StockData
+
+
+class NullNotifier:
+    async def send_message_to_group(self, text: str) -> None:
+        pass
+
+
+def cold_poll(feed: ReplayFeed) -> None:
+    """The pre-daemon way: every run analyzes every ticker from scratch"""
+    for ticker, frame in feed(list(feed.frames), '5m', period='3650d').items():
+        analyzer = StockData(ticker, 30, '5m')
+        analyzer.data = frame.copy()
+        analyzer.analyze()
+
+
+def run(tickers: int, bars: int, polls: int) -> None:
+    frames = {f'SYN{i}': make_ohlcv(bars + polls, seed=i, gap_probability=0.05) for i in range(tickers)}
+    feed = ReplayFeed(frames, '5m', warmup=bars)
+    daemon = AlertDaemon(list(frames), '5m', fetcher=feed, clock=feed.clock, notifier=NullNotifier(), render=False)
+
+    start = time.perf_counter()
+    daemon.poll()
+    load_time = time.perf_counter() - start
+
+    cold_polls = min(3, polls)
+    start = time.process_time()
+    for _ in range(cold_polls):
+        cold_poll(feed)
+    cold_time = (time.process_time() - start) / cold_polls
+
+    poll_cpu, fired = [], 0
+    while feed.advance():
+        alerts = daemon.poll()
+        poll_cpu.append(daemon.last_poll_cpu)
+        fired += len(alerts)
+        if alerts:
+            asyncio.run(daemon.notify(alerts))
+    poll_cpu.sort()
+
+    print(f"{tickers} tickers, {bars} bars each, initial load {load_time:.2f}s")
+    print(f"{'cold run (ms cpu)':>18} {'poll median (ms cpu)':>21} {'poll p95 (ms cpu)':>18} "
+          f"{'per ticker (ms)':>16} {'speedup':>8} {'alerts':>7}")
+    median = poll_cpu[len(poll_cpu) // 2]
+    print(f"{cold_time * 1000:>18.1f} {median * 1000:>21.1f} {poll_cpu[int(len(poll_cpu) * 0.95)] * 1000:>18.1f} "
+          f"{median * 1000 / tickers:>16.3f} {cold_time / median:>7.0f}x {fired:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=300)
+    parser.add_argument('--bars', type=int, default=2_000)
+    parser.add_argument('--polls', type=int, default=50)
+    args = parser.parse_args()
+    run(args.tickers, args.bars, args.polls)
@@ -0,0 +1,65 @@
+"""
+Time run_batch over a synthetic universe with a growing number of worker processes and
+report the speedup over a single worker, checking every run produces the same summary.
+
+Usage:
+    python -m benchmarks.bench_batch [--tickers 200] [--bars 2000] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_ohlcv
+from Stock.batch import run_batch
+from Stock.cache import LocalFetcher, OHLCVCache
+
+
+def default_workers() -> list[int]:
+    """1, 2, 4, ... up to the number of cores, the core count itself included"""
+    cores = os.cpu_count() or 1
+    workers = [1]
+    while workers[-1] * 2 < cores:
+        workers.append(workers[-1] * 2)
+    return workers + [cores] if cores > 1 else workers
+
+
+def run(tickers: int, bars: int, workers: list[int]) -> None:
+    # Daily bars ending today so the cache window is fully covered
+    first_day = pd.Timestamp.now().normalize() - pd.Timedelta(days=bars - 1)
+    frames = {f'SYN{i}': make_ohlcv(bars, seed=i, freq='1D', start=first_day) for i in range(tickers)}
+    names = list(frames)
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = OHLCVCache(root, fetcher=LocalFetcher(frames))
+        # Fill the cache first so every run reads the same files and only the analysis scales
+        cache.get_many(names, '1d', bars)
+
+        print(f"{tickers} tickers, {bars} bars each, {os.cpu_count()} cores")
+        print(f"{'workers':>8} {'elapsed (s)':>12} {'analysis (s)':>13} {'speedup':>8} {'efficiency':>11}")
+        baseline = reference = None
+        for count in workers:
+            start = time.perf_counter()
+            summary, _ = run_batch(names, period_days=bars, interval='1d', cache=cache, workers=count)
+            elapsed = time.perf_counter() - start
+
+            counts = summary.drop(columns='seconds')
+            if reference is None:
+                baseline, reference = elapsed, counts
+            elif not counts.equals(reference):
+                raise AssertionError(f"Summary with {count} workers differs from the first run")
+
+            speedup = baseline / elapsed
+            print(f"{count:>8} {elapsed:>12.3f} {summary['seconds'].sum():>13.3f} "
+                  f"{speedup:>7.2f}x {speedup / count * workers[0]:>10.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=200)
+    parser.add_argument('--bars', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=None)
+    args = parser.parse_args()
+    run(args.tickers, args.bars, args.workers or default_workers())
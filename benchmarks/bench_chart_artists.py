@@ -0,0 +1,107 @@
+"""
+Drawing time of per-artist gap / level / island plotting versus the batched
+collection path as the number of gaps grows.
+
+Usage:
+    python -m benchmarks.bench_chart_artists [--bars 1000 5000 20000]
+"""
+import argparse
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+from benchmarks.synthetic import make_ohlcv
+from Stock.chart import StockChart
+from Stock.data import StockData
+
+
+class LegacyStockChart(StockChart):
+    """One axvspan / hlines / text / fill call per gap, level and island, as before batching"""
+
+    def plot_gaps(self) -> None:
+        y_min, y_max = self.ax.get_ylim()
+        y_range = y_max - y_min
+        for gap in self.analyzer.gaps:
+            self.ax.axvspan(
+                gap.index - 0.5, gap.index + 0.5,
+                ymin=(gap.gap_from - y_min) / y_range, ymax=(gap.gap_to - y_min) / y_range,
+                facecolor='none', alpha=0.3 if gap.filled else 0.6, edgecolor='none'
+            )
+            self.ax.text(
+                gap.index - 0.4, (gap.gap_from + gap.gap_to) / 2, "Filled" if gap.filled else "Open",
+                ha='left', va='center', color='black' if gap.filled else 'red', fontsize=7,
+                bbox=dict(facecolor='none', alpha=0.7, edgecolor='none')
+            )
+            if not gap.filled:
+                self.ax.hlines(
+                    y=gap.ref_price, xmin=gap.index - 0.5, xmax=len(self.analyzer.data) + 10,
+                    color='red', linestyle='--', alpha=0.5, linewidth=1.5
+                )
+                self.ax.text(
+                    gap.index - 0.5, gap.ref_price, f'{gap.ref_price:.2f}',
+                    ha='right', va='center', color='red', fontsize=8,
+                    bbox=dict(facecolor='none', alpha=0, edgecolor='none')
+                )
+
+    def plot_key_levels(self) -> None:
+        for level in self.analyzer.key_levels:
+            self.ax.hlines(
+                y=level.price, xmin=level.start_index - 0.5, xmax=len(self.analyzer.data) + 10,
+                color='blue', linestyle='--', alpha=0.5, linewidth=1.5
+            )
+            self.ax.text(
+                level.start_index - 0.5, level.price, f'{level.price:.2f} ({level.gap_count})',
+                ha='right', va='center', color='blue', fontsize=8,
+                bbox=dict(facecolor='none', alpha=0, edgecolor='none')
+            )
+
+    def plot_islands(self) -> None:
+        for island in self.analyzer.islands:
+            x = [island.start_index - 0.5, island.end_index + 0.5, island.end_index + 0.5, island.start_index - 0.5]
+            y = [island.low, island.low, island.high, island.high]
+            self.ax.fill(x, y, facecolor='purple', alpha=0.1, edgecolor='none')
+            self.ax.text(
+                island.start_index, island.high, 'Island', rotation=0, va='bottom',
+                color='black', fontsize=8, bbox=dict(facecolor='none', alpha=0)
+            )
+
+
+def time_overlays(chart_cls: type, analyzer: StockData) -> float:
+    """Seconds spent adding and rendering the overlays on top of an already drawn base chart"""
+    chart = chart_cls(analyzer)
+    chart.create_base_chart()
+    chart.finalize_chart()
+    chart.fig.canvas.draw()
+    base_start = time.perf_counter()
+    chart.fig.canvas.draw()
+    base = time.perf_counter() - base_start
+
+    start = time.perf_counter()
+    chart.plot_gaps()
+    chart.plot_key_levels()
+    chart.plot_islands()
+    chart.fig.canvas.draw()
+    elapsed = time.perf_counter() - start - base
+    chart.save_chart_to_buffer()
+    return elapsed
+
+
+def run(bar_counts: list[int]) -> None:
+    print(f"{'bars':>8} {'gaps':>7} {'levels':>7} {'islands':>8} {'per-artist (s)':>15} {'batched (s)':>12}")
+    for bars in bar_counts:
+        analyzer = StockData('SYNTH', bars, '1d')
+        analyzer.data = make_ohlcv(bars, seed=bars, freq='1D', gap_probability=0.1)
+        analyzer.analyze()
+
+        legacy = time_overlays(LegacyStockChart, analyzer)
+        batched = time_overlays(StockChart, analyzer)
+        print(f"{bars:>8} {len(analyzer.gaps):>7} {len(analyzer.key_levels):>7} {len(analyzer.islands):>8} "
+              f"{legacy:>15.2f} {batched:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, nargs='+', default=[1_000, 5_000, 20_000])
+    run(parser.parse_args().bars)
@@ -0,0 +1,82 @@
+"""
+Render time and peak memory of the old 600 DPI + PIL downscale pipeline versus
+drawing directly at the target resolution.
+
+Every mode renders in a fresh process so ru_maxrss reflects only that mode.
+
+Usage:
+    python -m benchmarks.bench_chart_image [--bars 500]
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+from io import BytesIO
+
+MODES = ['legacy-600dpi', 'png', 'jpeg', 'webp']
+
+
+def legacy_save_chart_to_buffer(chart) -> BytesIO:
+    """The pipeline as it was: rasterize at 600 DPI, decode, downscale and re-encode"""
+    import matplotlib.pyplot as plt
+    from PIL import Image
+
+    buffer = BytesIO()
+    chart.fig.savefig(buffer, format='PNG', dpi=600, bbox_inches='tight')
+    plt.close(chart.fig)
+
+    buffer.seek(0)
+    resized_img = Image.open(buffer).resize((1920, 1080), Image.LANCZOS)
+    optimized_buffer = BytesIO()
+    resized_img.save(optimized_buffer, format='PNG', optimize=True, quality=95)
+    optimized_buffer.seek(0)
+    return optimized_buffer
+
+
+def measure(mode: str, bars: int) -> tuple[float, float, int]:
+    """Return (seconds, peak MB added by rendering, encoded bytes) for one chart"""
+    import matplotlib
+    matplotlib.use('Agg')
+
+    from benchmarks.synthetic import make_ohlcv
+    from Stock.chart import StockChart
+    from Stock.data import StockData
+
+    analyzer = StockData('SYNTH', bars, '1d')
+    analyzer.data = make_ohlcv(bars, freq='1D')
+    analyzer.analyze()
+
+    if mode == 'legacy-600dpi':
+        chart = StockChart(analyzer, size=(1920, 960), dpi=96)
+    else:
+        chart = StockChart(analyzer, image_format=mode)
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    chart.create_base_chart()
+    chart.plot_gaps()
+    chart.plot_key_levels()
+    chart.plot_islands()
+    chart.add_sma_labels()
+    chart.finalize_chart()
+    buffer = legacy_save_chart_to_buffer(chart) if mode == 'legacy-600dpi' else chart.save_chart_to_buffer()
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is reported in kilobytes on Linux
+    return elapsed, (peak - baseline) / 1024, len(buffer.getvalue())
+
+
+def run(bars: int) -> None:
+    context = multiprocessing.get_context('spawn')
+    print(f"{'mode':>14} {'seconds':>9} {'peak MB':>9} {'bytes':>10}")
+    for mode in MODES:
+        with context.Pool(1) as pool:
+            elapsed, peak_mb, size = pool.apply(measure, (mode, bars))
+        print(f"{mode:>14} {elapsed:>9.2f} {peak_mb:>9.1f} {size:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, default=500)
+    run(parser.parse_args().bars)
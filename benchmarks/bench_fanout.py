@@ -0,0 +1,82 @@
+"""
+Post a batch of charts to several chats through a local fake Bot API server, once the
+way MyBot used to (one awaited send_photo per chart and chat, every image uploaded to
+every chat) and once through FanoutBot (albums, one upload per image, chats in parallel).
+
+The rate limiter is relaxed to --global-rate / --chat-interval so the run measures
+request and upload overhead rather than Telegram's flood limits. --flood-every makes
+the server answer every n-th request with a 429 to exercise the retry path.
+
+Usage:
+    python -m benchmarks.bench_fanout [--charts 25] [--chats 4] [--image-kb 150] [--latency 0.05]
+                                      [--flood-every 0]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from telegram import Bot
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from telegram_bot import FanoutBot, RateLimiter
+
+
+async def legacy_send(base_url: str, chat_ids: list[int], charts: list[tuple[bytes, str]]) -> None:
+    """The pre-fan-out pattern: one sequential send_photo per chart and chat"""
+    async with Bot(token="1:fake", base_url=base_url) as bot:
+        for chat_id in chat_ids:
+            for image, caption in charts:
+                await bot.send_photo(chat_id=chat_id, photo=image, caption=caption)
+
+
+async def fanout_send(base_url: str, chat_ids: list[int], charts: list[tuple[bytes, str]],
+                      limiter: RateLimiter) -> dict:
+    async with FanoutBot("1:fake", chat_ids, base_url=base_url, limiter=limiter, backoff=0.05) as bot:
+        return await bot.send_charts(charts)
+
+
+def report(name: str, server: FakeTelegramServer, seconds: float) -> None:
+    uploaded = sum(r.uploaded_bytes for r in server.requests)
+    flooded = sum(r.flooded for r in server.requests)
+    print(f"{name:>8} {seconds:>10.3f} {len(server.requests):>10} {uploaded / 1024 ** 2:>14.1f} {flooded:>8}")
+
+
+def run(charts: int, chats: int, image_kb: int, latency: float, flood_every: int,
+        global_rate: float, chat_interval: float) -> None:
+    images = [(os.urandom(image_kb * 1024), f"TICKER{i} chart") for i in range(charts)]
+    chat_ids = [-(1000 + i) for i in range(chats)]
+    print(f"{charts} charts of {image_kb}KB to {chats} chats, {latency * 1000:.0f}ms per request\n")
+    print(f"{'sender':>8} {'seconds':>10} {'requests':>10} {'uploaded (MB)':>14} {'flooded':>8}")
+
+    # The legacy sender never retried, so it runs without injected flood waits
+    with FakeTelegramServer(latency=latency) as server:
+        start = time.perf_counter()
+        asyncio.run(legacy_send(server.base_url, chat_ids, images))
+        report('legacy', server, time.perf_counter() - start)
+
+    limiter = RateLimiter(global_rate=global_rate, chat_interval=chat_interval, group_interval=chat_interval)
+    with FakeTelegramServer(latency=latency, flood_every=flood_every or None, retry_after=0) as server:
+        start = time.perf_counter()
+        errors = asyncio.run(fanout_send(server.base_url, chat_ids, images, limiter))
+        report('fanout', server, time.perf_counter() - start)
+
+    failed = {chat_id: error for chat_id, error in errors.items() if error is not None}
+    if failed:
+        raise AssertionError(f"Fan-out failed for {failed}")
+    delivered = sum(r.photos for r in server.requests if not r.flooded)
+    if delivered != charts * chats:
+        raise AssertionError(f"Delivered {delivered} photos, expected {charts * chats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--charts', type=int, default=25)
+    parser.add_argument('--chats', type=int, default=4)
+    parser.add_argument('--image-kb', type=int, default=150)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds the fake server takes per request")
+    parser.add_argument('--flood-every', type=int, default=0, help="Answer every n-th request with a 429, 0 never")
+    parser.add_argument('--global-rate', type=float, default=1000.0)
+    parser.add_argument('--chat-interval', type=float, default=0.0)
+    args = parser.parse_args()
+    run(args.charts, args.chats, args.image_kb, args.latency, args.flood_every, args.global_rate, args.chat_interval)
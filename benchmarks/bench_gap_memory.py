@@ -0,0 +1,103 @@
+"""
+Compare memory and filter speed of a list of plain Gap dataclasses against the
+slotted Gap and the struct-of-arrays GapTable.
+
+Usage:
+    python -m benchmarks.bench_gap_memory [--sizes 10000 100000 1000000]
+"""
+import argparse
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from Stock.custom_dataclasses import Gap, GapTable
+
+
+@dataclass
+class LegacyGap:
+    """Gap as it was declared before slots, one __dict__ per instance"""
+    index: int
+    price_level: float
+    gap_from: float
+    gap_to: float
+    gap_type: str
+    volume: float
+    ref_price: float
+    filled: bool = False
+    fill_index: Optional[int] = None
+    fill_time: Optional[datetime] = None
+
+
+def make_columns(size: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    gap_from = 100 + rng.standard_normal(size).cumsum()
+    is_up = rng.random(size) < 0.5
+    fill_index = np.where(rng.random(size) < 0.7, np.arange(size) + 5, -1)
+    return {
+        'index': np.arange(size),
+        'price_level': gap_from,
+        'gap_from': gap_from,
+        'gap_to': gap_from + np.where(is_up, 0.5, -0.5),
+        'is_up': is_up,
+        'volume': rng.integers(1_000, 100_000, size).astype(float),
+        'ref_price': gap_from,
+        'fill_index': fill_index
+    }
+
+
+def build_objects(cls, columns: dict) -> list:
+    return [
+        cls(index=i, price_level=p, gap_from=f, gap_to=t, gap_type='up' if u else 'down',
+            volume=v, ref_price=r, filled=fi >= 0, fill_index=fi if fi >= 0 else None)
+        for i, p, f, t, u, v, r, fi in zip(*(columns[name].tolist() for name in GapTable.COLUMNS if name in columns))
+    ]
+
+
+def measure(build) -> tuple[object, int]:
+    """Build an object and return it with the bytes it kept allocated"""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(func, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes: list[int]) -> None:
+    print(f"{'gaps':>10} {'legacy B/gap':>13} {'slots B/gap':>12} {'table B/gap':>12} "
+          f"{'list filter (s)':>16} {'mask filter (s)':>16}")
+    for size in sizes:
+        columns = make_columns(size, seed=size)
+
+        legacy, legacy_bytes = measure(lambda: build_objects(LegacyGap, columns))
+        slotted, slotted_bytes = measure(lambda: build_objects(Gap, columns))
+        table = GapTable(**columns)
+        table_bytes = table.nbytes
+
+        if len(table.open()) != sum(not gap.filled for gap in legacy):
+            raise AssertionError(f"Open gap mismatch on {size} gaps")
+
+        list_time = timed(lambda: [gap for gap in legacy if not gap.filled])
+        mask_time = timed(lambda: table.open())
+        del legacy, slotted
+
+        print(f"{size:>10} {legacy_bytes / size:>13.0f} {slotted_bytes / size:>12.0f} {table_bytes / size:>12.0f} "
+              f"{list_time:>16.4f} {mask_time:>16.5f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    run(parser.parse_args().sizes)
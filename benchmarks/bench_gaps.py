@@ -0,0 +1,79 @@
+"""
+Compare the original row-by-row gap detection against the NumPy detector.
+
+Usage:
+    python -m benchmarks.bench_gaps [--sizes 10000 100000 1000000]
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import make_ohlcv
+from Stock.custom_dataclasses import Gap
+from Stock.data import StockData
+
+
+def legacy_analyze_gaps(analyzer: StockData) -> list[Gap]:
+    """Row-by-row detection as it was implemented before vectorization"""
+    gaps = []
+    min_gap_size = 0.002 * analyzer.data['Close'].mean()
+
+    for i in range(1, len(analyzer.data)):
+        prev, curr = analyzer.data.iloc[i-1], analyzer.data.iloc[i]
+
+        gap_up = curr['Low'] - prev['High'] > min_gap_size
+        gap_down = prev['Low'] - curr['High'] > min_gap_size
+
+        if gap_up:
+            gaps.append(Gap(
+                index=i,
+                price_level=prev['High'],
+                gap_from=prev['High'],
+                gap_to=curr['Low'],
+                gap_type='up',
+                volume=curr['Volume'],
+                ref_price=min(prev['Open'], prev['Close'])
+            ))
+        elif gap_down:
+            gaps.append(Gap(
+                index=i,
+                price_level=prev['Low'],
+                gap_from=prev['Low'],
+                gap_to=curr['High'],
+                gap_type='down',
+                volume=curr['Volume'],
+                ref_price=max(prev['Open'], prev['Close'])
+            ))
+    return gaps
+
+
+def vectorized_analyze_gaps(analyzer: StockData) -> list[Gap]:
+    """Detection only, fill status is benchmarked separately"""
+    analyzer._check_gap_fill_status = lambda: None
+    analyzer.analyze_gaps()
+    return list(analyzer.gaps)
+
+
+def run(sizes: list[int]) -> None:
+    print(f"{'bars':>10} {'gaps':>8} {'legacy (s)':>12} {'numpy (s)':>12} {'speedup':>9}")
+    for bars in sizes:
+        analyzer = StockData('SYNTH', bars, '5m')
+        analyzer.data = make_ohlcv(bars, seed=bars)
+
+        start = time.perf_counter()
+        expected = legacy_analyze_gaps(analyzer)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = vectorized_analyze_gaps(analyzer)
+        numpy_time = time.perf_counter() - start
+
+        if actual != expected:
+            raise AssertionError(f"Gap mismatch on {bars} bars")
+
+        print(f"{bars:>10} {len(actual):>8} {legacy_time:>12.3f} {numpy_time:>12.4f} {legacy_time / numpy_time:>8.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    run(parser.parse_args().sizes)
@@ -0,0 +1,60 @@
+"""
+Cold import cost of the entry modules, measured with python -X importtime in a
+fresh interpreter per module.
+
+Reports the cumulative import time, the slowest modules pulled in, and whether
+the plotting stack (matplotlib, mplfinance), yfinance or the Telegram client got
+loaded, importing the entry modules should load none of them.
+
+Usage:
+    python -m benchmarks.bench_imports [--modules main sma_analyzer Stock.data] [--top 5] [--repeats 3]
+"""
+import argparse
+import subprocess
+import sys
+
+HEAVY_MODULES = ('matplotlib', 'mplfinance', 'yfinance', 'telegram')
+DEFAULT_MODULES = ['main', 'sma_analyzer', 'message', 'Stock.data', 'Stock.chart']
+
+
+def import_profile(module: str) -> tuple[dict[str, int], list[str]]:
+    """Cumulative import time in microseconds of every module loaded by `import module`, and the heavy ones loaded"""
+    probe = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe],
+                             capture_output=True, text=True, check=True)
+
+    cumulative = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # import time: self [us] | cumulative | imported package
+        _, cumulative_us, name = line.split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+    heavy = [name for name in process.stdout.strip().split(',') if name]
+    return cumulative, heavy
+
+
+def run(modules: list[str], top: int, repeats: int) -> None:
+    print(f"{'module':>14} {'import (s)':>11} {'heavy modules loaded':<30}")
+    for module in modules:
+        best, heavy, slowest = float('inf'), [], {}
+        for _ in range(repeats):
+            cumulative, heavy = import_profile(module)
+            total = cumulative.get(module, 0) / 1e6
+            if total < best:
+                best, slowest = total, cumulative
+        print(f"{module:>14} {best:>11.3f} {', '.join(heavy) or '-':<30}")
+
+        # Only top-level packages, their submodules are already part of the cumulative time
+        packages = {name: us for name, us in slowest.items() if '.' not in name and name != module}
+        for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            print(f"{'':>14} {us / 1e6:>11.3f}   {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('--top', type=int, default=5, help="Slowest top-level packages listed per module")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    run(args.modules, args.top, args.repeats)
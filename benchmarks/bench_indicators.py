@@ -0,0 +1,65 @@
+"""
+Compare the original per-period pandas rolling SMAs against the indicator engine, for
+the default columns and for a wider indicator set.
+
+Usage:
+    python -m benchmarks.bench_indicators [--sizes 10000 100000 1000000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_ohlcv
+from Stock.indicators import IndicatorEngine
+
+DEFAULT = ('SMA_20', 'SMA_94')
+WIDE = ('SMA_20', 'SMA_50', 'SMA_94', 'SMA_200', 'EMA_12', 'EMA_26', 'ATR_14', 'VWAP_20')
+
+
+def legacy_sma(data, periods=(1, 20, 94)) -> None:
+    """calculate_sma as it was implemented before the engine, SMA_1 included"""
+    for period in periods:
+        data[f'SMA_{period}'] = data['Close'].rolling(window=period).mean()
+
+
+def engine_columns(data, names, dtype) -> None:
+    engine = IndicatorEngine({col: data[col].to_numpy(dtype=float) for col in ('High', 'Low', 'Close', 'Volume')},
+                             data.index, dtype=dtype)
+    for name in names:
+        data[name] = engine[name]
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run(sizes: list[int]) -> None:
+    print(f"{'bars':>10} {'legacy (s)':>11} {'engine (s)':>11} {'float32 (s)':>12} {'speedup':>8} "
+          f"{'wide set (s)':>13} {'per extra (ms)':>15}")
+    for size in sizes:
+        data = make_ohlcv(size, seed=size)
+
+        legacy_time = timed(legacy_sma, data.copy())
+        engine_time = timed(engine_columns, data.copy(), DEFAULT, np.float64)
+        float32_time = timed(engine_columns, data.copy(), DEFAULT, np.float32)
+        wide_time = timed(engine_columns, data.copy(), WIDE, np.float64)
+
+        checked = data.copy()
+        legacy_sma(checked, (20, 94))
+        engine_columns(data, DEFAULT, np.float64)
+        if not np.allclose(checked[list(DEFAULT)], data[list(DEFAULT)], equal_nan=True):
+            raise AssertionError(f"SMA mismatch on {size} bars")
+
+        per_extra = (wide_time - engine_time) / (len(WIDE) - len(DEFAULT)) * 1000
+        print(f"{size:>10} {legacy_time:>11.4f} {engine_time:>11.4f} {float32_time:>12.4f} "
+              f"{legacy_time / engine_time:>7.1f}x {wide_time:>13.4f} {per_extra:>15.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    run(args.sizes)
@@ -0,0 +1,71 @@
+"""
+Compare the original island detection (a DataFrame slice per consecutive gap pair)
+against the sparse table detector, and time the wider pattern searches.
+
+Usage:
+    python -m benchmarks.bench_islands [--sizes 10000 100000 1000000] [--gap-probability 0.1]
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import make_ohlcv
+from Stock.custom_dataclasses import Island
+from Stock.data import StockData
+
+
+def legacy_find_islands(analyzer: StockData) -> list[Island]:
+    """Consecutive-pair detection as it was implemented before the range queries"""
+    islands = []
+    gaps = list(analyzer.gaps)
+    for i in range(1, len(gaps)):
+        prev_gap, curr_gap = gaps[i-1], gaps[i]
+        if curr_gap.index - prev_gap.index <= 13 and prev_gap.gap_type != curr_gap.gap_type:
+            island_data = analyzer.data.iloc[prev_gap.index:curr_gap.index]
+            islands.append(Island(
+                high=island_data['High'].max(),
+                low=island_data['Low'].min(),
+                start_index=prev_gap.index,
+                end_index=curr_gap.index
+            ))
+    return islands
+
+
+def run(sizes: list[int], gap_probability: float) -> None:
+    patterns = {'window 40, runs of 5, exhaustion': dict(island_window=40, island_max_run=5, exhaustion=True)}
+    print(f"{'bars':>10} {'islands':>8} {'legacy (s)':>11} {'sparse (s)':>11} {'speedup':>8} "
+          f"{'patterns':>9} {'wide search (s)':>16}")
+    for size in sizes:
+        data = make_ohlcv(size, seed=size, gap_probability=gap_probability)
+        analyzer = StockData('SYNTH', size, '5m')
+        analyzer.data = data
+        analyzer.analyze_gaps()
+
+        start = time.perf_counter()
+        expected = legacy_find_islands(analyzer)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        analyzer.find_island_reversals()
+        sparse_time = time.perf_counter() - start
+        if analyzer.islands != expected:
+            raise AssertionError(f"Island mismatch on {size} bars")
+
+        for name, options in patterns.items():
+            wide = StockData('SYNTH', size, '5m', **options)
+            wide.data = data
+            wide.gaps = analyzer.gaps
+            start = time.perf_counter()
+            wide.find_island_reversals()
+            wide_time = time.perf_counter() - start
+
+        print(f"{size:>10} {len(expected):>8} {legacy_time:>11.3f} {sparse_time:>11.4f} "
+              f"{legacy_time / sparse_time:>7.0f}x {len(wide.islands):>9} {wide_time:>16.4f}")
+    print(f"\nwide search: {', '.join(patterns)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--gap-probability', type=float, default=0.1)
+    args = parser.parse_args()
+    run(args.sizes, args.gap_probability)
@@ -0,0 +1,85 @@
+"""
+Compare the original dict-list key-level clustering against the NumPy clustering,
+on gaps pooled from many synthetic tickers.
+
+Usage:
+    python -m benchmarks.bench_key_levels [--sizes 10000 50000 200000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from Stock.custom_dataclasses import KeyLevel
+from Stock.levels import KEY_LEVEL_METHODS, cluster_levels
+
+
+def make_gaps(size: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Gap prices, bar indices and volumes concentrated around a few hundred price zones"""
+    rng = np.random.default_rng(seed)
+    zones = rng.uniform(10, 500, max(1, size // 50))
+    prices = rng.choice(zones, size) * (1 + rng.normal(0, 0.01, size))
+    indices = rng.integers(1, 1_000_000, size)
+    volumes = rng.integers(1_000, 1_000_000, size).astype(float)
+    return prices, indices, volumes
+
+
+def legacy_key_levels(prices: np.ndarray, indices: np.ndarray, price_tolerance: float) -> list[KeyLevel]:
+    """Chain clustering as it was implemented before vectorization"""
+    gap_prices = [{'price': p, 'index': i} for p, i in zip(prices.tolist(), indices.tolist())]
+    gap_prices.sort(key=lambda x: x['price'])
+
+    clusters = []
+    current_cluster = [gap_prices[0]]
+
+    for price_data in gap_prices[1:]:
+        if abs(price_data['price'] - current_cluster[-1]['price']) <= price_tolerance:
+            current_cluster.append(price_data)
+        else:
+            clusters.append(current_cluster)
+            current_cluster = [price_data]
+    clusters.append(current_cluster)
+
+    return [
+        KeyLevel(
+            price=np.mean([g['price'] for g in cluster]),
+            start_index=min(g['index'] for g in cluster),
+            gap_count=len(cluster)
+        ) for cluster in clusters if len(cluster) > 1
+    ]
+
+
+def run(sizes: list[int], tolerance: float) -> None:
+    header = ''.join(f"{method + ' (s)':>13}" for method in KEY_LEVEL_METHODS)
+    print(f"{'gaps':>10} {'levels':>8} {'legacy (s)':>12}{header} {'speedup':>9}")
+    for size in sizes:
+        prices, indices, volumes = make_gaps(size, seed=size)
+
+        start = time.perf_counter()
+        expected = legacy_key_levels(prices, indices, tolerance)
+        legacy_time = time.perf_counter() - start
+
+        timings = {}
+        for method in KEY_LEVEL_METHODS:
+            start = time.perf_counter()
+            levels = cluster_levels(prices, indices, tolerance, method=method, volumes=volumes)
+            timings[method] = time.perf_counter() - start
+            if method == 'chain':
+                actual = levels
+
+        if (len(actual.price) != len(expected)
+                or not np.allclose(actual.price, [level.price for level in expected])
+                or actual.start_index.tolist() != [level.start_index for level in expected]
+                or actual.gap_count.tolist() != [level.gap_count for level in expected]):
+            raise AssertionError(f"Key level mismatch on {size} gaps")
+
+        columns = ''.join(f"{timings[method]:>13.4f}" for method in KEY_LEVEL_METHODS)
+        print(f"{size:>10} {len(expected):>8} {legacy_time:>12.3f}{columns} {legacy_time / timings['chain']:>8.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 50_000, 200_000])
+    parser.add_argument('--tolerance', type=float, default=0.05, help="Clustering tolerance in price units")
+    args = parser.parse_args()
+    run(args.sizes, args.tolerance)
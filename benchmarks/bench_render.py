@@ -0,0 +1,47 @@
+"""
+Chart rendering throughput of ImgGenerator.run_many versus worker count.
+
+Usage:
+    python -m benchmarks.bench_render [--charts 16] [--bars 500] [--workers 1 2 4 8]
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import make_ohlcv
+from Stock.data import StockData
+from Stock.img_generator import ImgGenerator
+
+
+def make_analyzers(charts: int, bars: int) -> list[StockData]:
+    analyzers = []
+    for seed in range(charts):
+        analyzer = StockData(f'SYN{seed}', bars, '1d')
+        analyzer.data = make_ohlcv(bars, seed=seed, freq='1D')
+        analyzer.analyze()
+        analyzers.append(analyzer)
+    return analyzers
+
+
+def run(charts: int, bars: int, workers: list[int]) -> None:
+    analyzers = make_analyzers(charts, bars)
+    print(f"{'workers':>8} {'seconds':>9} {'charts/s':>9}")
+    for count in workers:
+        # Warm the pool first so process start-up isn't counted as rendering time
+        with ImgGenerator.create_pool(count) as pool:
+            list(pool.map(abs, range(count)))
+            start = time.perf_counter()
+            buffers = ImgGenerator.run_many(analyzers, executor=pool)
+            elapsed = time.perf_counter() - start
+
+        if any(buf is None for buf in buffers):
+            raise RuntimeError("Some charts failed to render")
+        print(f"{count:>8} {elapsed:>9.2f} {charts / elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--charts', type=int, default=16)
+    parser.add_argument('--bars', type=int, default=500)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    run(args.charts, args.bars, args.workers)
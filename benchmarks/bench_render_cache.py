@@ -0,0 +1,60 @@
+"""
+Time a chart and caption rendered from scratch against the same request served by the
+render cache, from memory and from disk (a fresh cache over the same directory).
+
+Usage:
+    python -m benchmarks.bench_render_cache [--bars 350 2000] [--repeat 20]
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.synthetic import make_ohlcv
+from message import levels_text, message_generator
+from Stock.data import StockData
+from Stock.img_generator import ImgGenerator
+from Stock.render_cache import RenderCache
+
+
+def timed(func, repeat: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(sizes: list[int], repeat: int) -> None:
+    print(f"{'bars':>6} {'render (s)':>11} {'key (ms)':>9} {'memory hit (ms)':>16} {'disk hit (ms)':>14} "
+          f"{'caption (ms)':>13} {'cached caption (ms)':>20}")
+    for bars in sizes:
+        analyzer = StockData('SYNTH', bars, '1d')
+        # The caption needs a key level on both sides of the close, this walk has them at both sizes
+        analyzer.data = make_ohlcv(bars, seed=3, freq='1D', gap_probability=0.05)
+        analyzer.analyze()
+        ImgGenerator.run(analyzer)  # Loads matplotlib and fonts so the render below is a warm one
+
+        with tempfile.TemporaryDirectory() as root:
+            cache = RenderCache(root)
+            render_time = timed(lambda: ImgGenerator.run(analyzer, cache=cache))
+            expected = ImgGenerator.run(analyzer).getvalue()
+            if ImgGenerator.run(analyzer, cache=cache).getvalue() != expected:
+                raise AssertionError(f"Cached chart differs from a fresh render on {bars} bars")
+
+            key_time = timed(lambda: cache.key(analyzer, 'chart'), repeat)
+            memory_time = timed(lambda: ImgGenerator.run(analyzer, cache=cache), repeat)
+            disk_time = timed(lambda: ImgGenerator.run(analyzer, cache=RenderCache(root)), repeat)
+
+            caption_time = timed(lambda: levels_text(analyzer), repeat)
+            message_generator(analyzer, breadth='', cache=cache)
+            cached_caption_time = timed(lambda: message_generator(analyzer, breadth='', cache=cache), repeat)
+
+        print(f"{bars:>6} {render_time:>11.3f} {key_time * 1000:>9.3f} {memory_time * 1000:>16.3f} "
+              f"{disk_time * 1000:>14.3f} {caption_time * 1000:>13.3f} {cached_caption_time * 1000:>20.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, nargs='+', default=[350, 2_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    run(args.bars, args.repeat)
@@ -0,0 +1,94 @@
+"""
+Fill a results store with replayed daily runs of a synthetic universe, then time the
+history queries against recomputing the same answer by replaying the bars again.
+
+Usage:
+    python -m benchmarks.bench_results_store [--tickers 20] [--bars 1000] [--warmup 250]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_ohlcv
+from sma_analyzer import compute_breadth
+from Stock.backtest import replay
+from Stock.results_store import ResultsStore
+
+
+def timed(func, repeat: int = 20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def level_history_by_replay(frame, warmup: int, price: float, tolerance: float):
+    """The pre-store way to find when a level first appeared: replay the bars and look at every step"""
+    for analyzer in replay(frame, warmup=warmup):
+        if any(abs(level.price - price) <= tolerance for level in analyzer.key_levels):
+            return analyzer.last_timestamp()
+    return None
+
+
+def run(tickers: int, bars: int, warmup: int) -> None:
+    frames = {f'SYN{i}': make_ohlcv(bars, seed=i, freq='1D', start='2015-01-02', gap_probability=0.05)
+              for i in range(tickers)}
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'results.sqlite')
+        store = ResultsStore(path)
+
+        runs, record_time = 0, 0.0
+        for ticker, frame in frames.items():
+            for analyzer in replay(frame, warmup=warmup, ticker=ticker):
+                start = time.perf_counter()
+                store.record_analysis(analyzer)
+                record_time += time.perf_counter() - start
+                runs += 1
+
+        breadth = compute_breadth(pd.DataFrame({ticker: frame['Close'] for ticker, frame in frames.items()}))
+        for day in range(len(breadth)):
+            store.record_breadth(breadth.iloc[day:day + 1])
+
+        ticker, frame = next(iter(frames.items()))
+        analyzer = next(iter(replay(frame, warmup=len(frame))))
+        price = analyzer.key_levels[len(analyzer.key_levels) // 2].price
+        tolerance = 0.005 * price
+
+        series, breadth_time = timed(lambda: store.breadth_history(20))
+        if not np.allclose(series.to_numpy(), breadth['SMA_20'].to_numpy(), equal_nan=True):
+            raise AssertionError("Stored breadth differs from the computed one")
+        snapshots, snapshot_time = timed(lambda: store.snapshots(ticker))
+        levels, level_time = timed(lambda: store.level_history(ticker, price, tolerance))
+        first, first_time = timed(lambda: store.level_first_seen(ticker, price, tolerance))
+
+        start = time.perf_counter()
+        replayed = level_history_by_replay(frame, warmup, price, tolerance)
+        replay_time = time.perf_counter() - start
+        if replayed is None or first is None or replayed.tz_localize('UTC') != first:
+            raise AssertionError(f"First appearance differs: replay {replayed}, store {first}")
+
+        size = os.path.getsize(path) / 2 ** 20
+
+    print(f"{runs} runs of {tickers} tickers recorded in {record_time:.2f}s "
+          f"({record_time / runs * 1000:.2f}ms per run), {len(breadth)} breadth dates, {size:.1f}MB")
+    print(f"{'query':>22} {'rows':>7} {'ms':>8}")
+    for name, rows, seconds in [('breadth history', len(series), breadth_time),
+                                ('snapshots of ticker', len(snapshots), snapshot_time),
+                                ('level history', len(levels), level_time),
+                                ('level first seen', 1, first_time)]:
+        print(f"{name:>22} {rows:>7} {seconds * 1000:>8.2f}")
+    print(f"\nlevel first seen by replaying the bars instead: {replay_time * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=20)
+    parser.add_argument('--bars', type=int, default=1_000)
+    parser.add_argument('--warmup', type=int, default=250)
+    args = parser.parse_args()
+    run(args.tickers, args.bars, args.warmup)
@@ -0,0 +1,71 @@
+"""
+Compare screening a synthetic universe ticker by ticker through StockData against the
+panel screener, and check both find the same gaps, fills, key levels and islands.
+
+Usage:
+    python -m benchmarks.bench_screener [--tickers 500] [--bars 350 2000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_ohlcv
+from Stock.data import StockData
+from Stock.screener import build_panel, detect_panel_gaps, panel_islands, panel_key_levels, screen_panel
+
+
+def per_ticker(frames: dict) -> list[StockData]:
+    """The pre-screener way: one StockData pipeline per ticker"""
+    analyzers = []
+    for ticker, frame in frames.items():
+        analyzer = StockData(ticker, len(frame), '1d')
+        analyzer.data = frame
+        analyzer.analyze()
+        analyzers.append(analyzer)
+    return analyzers
+
+
+def check(frames: dict, analyzers: list[StockData]) -> None:
+    panel = build_panel(frames)
+    gaps = detect_panel_gaps(panel)
+    level_rows, level_prices = panel_key_levels(panel, gaps)
+    island_rows, island_ends, _ = panel_islands(gaps)
+
+    for row, analyzer in enumerate(analyzers):
+        pad = panel.width - len(analyzer.data)
+        mask = gaps.row == row
+        fills = gaps.fill_index[mask]
+        if ((gaps.index[mask] - pad).tolist() != analyzer.gaps.index.tolist()
+                or np.where(fills >= 0, fills - pad, -1).tolist() != analyzer.gaps.fill_index.tolist()
+                or not np.allclose(np.sort(level_prices[level_rows == row]), [k.price for k in analyzer.key_levels])
+                or (island_ends[island_rows == row] - pad).tolist() != [i.end_index for i in analyzer.islands]):
+            raise AssertionError(f"Screener mismatch on {analyzer.ticker}")
+
+
+def run(tickers: int, sizes: list[int]) -> None:
+    print(f"{'tickers':>8} {'bars':>8} {'per ticker (s)':>15} {'panel (s)':>10} {'matches':>8} {'speedup':>8}")
+    for bars in sizes:
+        # Uneven histories, like a universe with recent listings
+        frames = {f'SYN{i}': make_ohlcv(bars - (i * 7) % (bars // 2), seed=i, freq='1D', start='2015-01-02')
+                  for i in range(tickers)}
+
+        start = time.perf_counter()
+        analyzers = per_ticker(frames)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        table = screen_panel(build_panel(frames))
+        panel_time = time.perf_counter() - start
+
+        check(frames, analyzers)
+        print(f"{tickers:>8} {bars:>8} {legacy_time:>15.3f} {panel_time:>10.3f} {len(table):>8} "
+              f"{legacy_time / panel_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--bars', type=int, nargs='+', default=[350, 2_000])
+    args = parser.parse_args()
+    run(args.tickers, args.bars)
@@ -0,0 +1,148 @@
+"""
+A local stand-in for the Telegram Bot API, enough of it to exercise the senders in
+telegram_bot.py without network access or a real bot.
+
+It answers getMe, sendMessage, sendPhoto and sendMediaGroup, hands out a file_id for every
+uploaded photo, records each request, and can add latency or answer every n-th
+request with a 429 flood wait.
+
+Usage:
+    with FakeTelegramServer(latency=0.02) as server:
+        bot = FanoutBot("1:fake", [-1, -2], base_url=server.base_url)
+        ...
+        print(server.requests)
+"""
+import itertools
+import json
+import threading
+import time
+from dataclasses import dataclass
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs
+
+
+@dataclass
+class FakeRequest:
+    method: str
+    chat_id: int
+    photos: int = 0
+    uploads: int = 0
+    uploaded_bytes: int = 0
+    flooded: bool = False
+
+
+def _parse_form(content_type: str, body: bytes) -> tuple[dict[str, str], dict[str, bytes]]:
+    """Plain fields and uploaded files of a form encoded or multipart request"""
+    if not content_type.startswith('multipart/'):
+        return {k: v[0] for k, v in parse_qs(body.decode()).items()}, {}
+
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    fields, files = {}, {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        if part.get_filename() is not None:
+            files[name] = part.get_payload(decode=True)
+        else:
+            fields[name] = part.get_payload(decode=True).decode()
+    return fields, files
+
+
+class FakeTelegramServer:
+    """Bot API server on localhost running in a background thread"""
+
+    def __init__(self, latency: float = 0.0, flood_every: Optional[int] = None, retry_after: int = 1):
+        self.latency = latency
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.requests: list[FakeRequest] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/bot"
+
+    def __enter__(self) -> 'FakeTelegramServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _photo(self, media, files: dict[str, bytes], request: FakeRequest) -> dict:
+        """PhotoSize list for one photo, a new file_id when it was uploaded"""
+        request.photos += 1
+        if media.startswith('attach://') or media in files:
+            request.uploads += 1
+            request.uploaded_bytes += len(files[media.replace('attach://', '')])
+            media = f"photo-{next(self._ids)}"
+        return [{'file_id': media, 'file_unique_id': media, 'width': 1280, 'height': 720}]
+
+    def _message(self, chat_id: int, photo: Optional[list] = None, caption: Optional[str] = None) -> dict:
+        message = {
+            'message_id': next(self._ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'group' if chat_id < 0 else 'private'}
+        }
+        if photo is not None:
+            message['photo'] = photo
+        if caption:
+            message['caption'] = caption
+        return message
+
+    def handle(self, method: str, fields: dict[str, str], files: dict[str, bytes]) -> dict:
+        """The Bot API answer to one request"""
+        if method == 'getMe':
+            return {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}}
+        chat_id = int(fields['chat_id'])
+        request = FakeRequest(method=method, chat_id=chat_id)
+        with self._lock:
+            self.requests.append(request)
+            if self.flood_every and len(self.requests) % self.flood_every == 0:
+                request.flooded = True
+                return {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                        'parameters': {'retry_after': self.retry_after}}
+
+            if method == 'sendMessage':
+                result = self._message(chat_id)
+            elif method == 'sendPhoto':
+                photo = self._photo(fields.get('photo', 'photo'), files, request)
+                result = self._message(chat_id, photo, fields.get('caption'))
+            elif method == 'sendMediaGroup':
+                result = [self._message(chat_id, self._photo(item['media'], files, request), item.get('caption'))
+                          for item in json.loads(fields['media'])]
+            else:
+                return {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+        return {'ok': True, 'result': result}
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                fields, files = _parse_form(self.headers.get('Content-Type', ''), body)
+                if server.latency:
+                    time.sleep(server.latency)
+                answer = server.handle(self.path.rsplit('/', 1)[-1], fields, files)
+                payload = json.dumps(answer).encode()
+
+                self.send_response(200 if answer['ok'] else answer['error_code'])
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
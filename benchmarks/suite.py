@@ -0,0 +1,185 @@
+"""
+Benchmark suite for the analysis pipeline on seeded synthetic OHLCV data.
+
+Times every StockData stage over a range of bar counts, chart rendering, and
+the S5TW breadth calculation with downloads stubbed by a LocalFetcher. Results
+are written as JSON, and --compare prints the ratio against an earlier run so
+regressions between versions stand out.
+
+Usage:
+    python -m benchmarks.suite [--bars 500 5000 50000 500000 1000000] [--chart-bars 500 5000]
+                               [--tickers 500] [--repeats 3] [--output bench_results.json]
+                               [--compare previous.json]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_ohlcv
+from Stock.cache import LocalFetcher, OHLCVCache
+from Stock.data import StockData
+
+
+def best_of(func: Callable[[], object], repeats: int) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def make_analyzer(bars: int, seed: int, **generator) -> StockData:
+    analyzer = StockData('SYNTH', bars, '5m')
+    analyzer.data = make_ohlcv(bars, seed=seed, **generator)
+    return analyzer
+
+
+def bench_pipeline(bars: int, repeats: int, **generator) -> dict[str, float]:
+    """Best time of every analyze stage, run in pipeline order so each sees the state it expects"""
+    analyzer = make_analyzer(bars, seed=bars, **generator)
+    check_fills = analyzer._check_gap_fill_status
+
+    def detect_only() -> None:
+        # analyze_gaps also checks fills, which is timed as its own stage
+        analyzer._check_gap_fill_status = lambda: None
+        try:
+            analyzer.analyze_gaps()
+        finally:
+            del analyzer._check_gap_fill_status
+
+    stages = {
+        'calculate_indicators': analyzer.calculate_indicators,
+        'analyze_gaps': detect_only,
+        '_check_gap_fill_status': check_fills,
+        'identify_key_levels': analyzer.identify_key_levels,
+        'find_island_reversals': analyzer.find_island_reversals
+    }
+    timings = {name: float('inf') for name in stages}
+    for _ in range(repeats):
+        for name, stage in stages.items():
+            timings[name] = min(timings[name], best_of(stage, 1))
+    return timings
+
+
+def bench_chart(bars: int, repeats: int, **generator) -> float:
+    import matplotlib
+    matplotlib.use('Agg')
+    from Stock.chart import StockChart
+
+    analyzer = make_analyzer(bars, seed=bars, **generator)
+    analyzer.analyze()
+
+    def render() -> None:
+        if StockChart(analyzer).visualize_pipline() is None:
+            raise RuntimeError(f"Chart rendering failed on {bars} bars")
+
+    return best_of(render, repeats)
+
+
+def bench_breadth(tickers: int, repeats: int) -> dict[str, float]:
+    """get_total_stocks_sma through an OHLCV cache whose downloads are served from memory"""
+    from sma_analyzer import get_total_stocks_sma, lookback_days
+
+    days = lookback_days((20,))
+    # Daily bars ending today so the cache window is fully covered
+    first_day = pd.Timestamp.now().normalize() - pd.Timedelta(days=days - 1)
+    frames = {f'SYN{i}': make_ohlcv(days, seed=i, freq='1D', start=first_day) for i in range(tickers)}
+    names = list(frames)
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = OHLCVCache(root, fetcher=LocalFetcher(frames))
+        start = time.perf_counter()
+        get_total_stocks_sma(names, cache=cache)
+        cold = time.perf_counter() - start
+        warm = best_of(lambda: get_total_stocks_sma(names, cache=cache), repeats)
+    return {'get_total_stocks_sma (cold cache)': cold, 'get_total_stocks_sma (warm cache)': warm}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(bars: list[int], chart_bars: list[int], tickers: int, repeats: int, generator: dict) -> dict:
+    results = []
+
+    def record(stage: str, size: int, seconds: float) -> None:
+        results.append({'stage': stage, 'size': size, 'seconds': seconds})
+        print(f"{stage:>36} {size:>10} {seconds:>12.5f}")
+
+    print(f"{'stage':>36} {'size':>10} {'seconds':>12}")
+    for size in bars:
+        for stage, seconds in bench_pipeline(size, repeats, **generator).items():
+            record(stage, size, seconds)
+    for size in chart_bars:
+        record('StockChart.visualize_pipline', size, bench_chart(size, repeats, **generator))
+    if tickers:
+        for stage, seconds in bench_breadth(tickers, repeats).items():
+            record(stage, tickers, seconds)
+
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.platform(),
+            'repeats': repeats,
+            'generator': generator
+        },
+        'results': results
+    }
+
+
+def compare(report: dict, baseline_path: str) -> None:
+    """Print current / baseline time for every (stage, size) both runs have"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r['stage'], r['size']): r['seconds'] for r in baseline['results']}
+
+    print(f"\nAgainst {baseline_path} ({baseline['meta'].get('revision')})")
+    print(f"{'stage':>36} {'size':>10} {'ratio':>8}")
+    for r in report['results']:
+        before = previous.get((r['stage'], r['size']))
+        if before:
+            print(f"{r['stage']:>36} {r['size']:>10} {r['seconds'] / before:>7.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, nargs='+', default=[500, 5_000, 50_000, 500_000, 1_000_000])
+    parser.add_argument('--chart-bars', type=int, nargs='*', default=[500, 5_000])
+    parser.add_argument('--tickers', type=int, default=500, help="Tickers for the breadth benchmark, 0 to skip")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--gap-probability', type=float, default=0.02)
+    parser.add_argument('--trend', type=float, default=0.0)
+    parser.add_argument('--volatility', type=float, default=0.01)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', default=None, help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    generator = {'gap_probability': args.gap_probability, 'trend': args.trend, 'volatility': args.volatility}
+    report = run(args.bars, args.chart_bars, args.tickers, args.repeats, generator)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {len(report['results'])} timings to {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+def make_ohlcv(bars: int, seed: int = 0, start_price: float = 100.0,
+               gap_probability: float = 0.02, trend: float = 0.0,
+               volatility: float = 0.01, freq: str = '5min',
+               start: Optional[str] = '2000-01-03') -> pd.DataFrame:
+    """Build a reproducible random-walk OHLCV frame with occasional opening gaps"""
+    rng = np.random.default_rng(seed)
+
+    returns = rng.normal(trend, volatility, bars)
+    jumps = rng.random(bars) < gap_probability
+    returns[jumps] += rng.choice([-1.0, 1.0], jumps.sum()) * rng.uniform(3, 8, jumps.sum()) * volatility
+
+    closes = start_price * np.exp(np.cumsum(returns))
+    opens = np.empty(bars)
+    opens[0] = start_price
+    opens[1:] = closes[:-1] * np.exp(np.where(jumps[1:], returns[1:] * 0.8, 0.0))
+
+    wick = np.abs(rng.normal(0, volatility / 2, (2, bars)))
+    highs = np.maximum(opens, closes) * (1 + wick[0])
+    lows = np.minimum(opens, closes) * (1 - wick[1])
+    volumes = rng.integers(1_000, 1_000_000, bars)
+
+    index = pd.date_range(start=start, periods=bars, freq=freq)
+    return pd.DataFrame(
+        {'Open': opens, 'High': highs, 'Low': lows, 'Close': closes, 'Volume': volumes},
+        index=index
+    )
@@ -1,27 +1,91 @@
 # pip install -r requirements.txt
+import argparse
 import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Optional
 
+from github_logger import log
 from message import message_generator
+from profiler import profiler, run_profiled
+from sma_analyzer import get_total_stocks_sma
+from Stock.cache import OHLCVCache
 from Stock.data import StockData
 from Stock.img_generator import ImgGenerator
-from telegram_bot import MyBot
 
 
-async def main():
+async def run_stage(name: str, executor: Optional[Executor], func: Callable, *args, **kwargs):
+    """Run a blocking stage in an executor (None = default thread pool) under the profiler"""
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, ProcessPoolExecutor):
+        # Worker processes have their own profiler, so their records travel back with the result
+        result, records = await loop.run_in_executor(
+            executor, partial(run_profiled, name, profiler.trace_memory, func, *args, **kwargs)
+        )
+        profiler.merge(records)
+        return result
+    return await loop.run_in_executor(executor, partial(profiler.call, name, func, *args, **kwargs))
+
+
+async def main(text_only: bool = False):
+    """Analyze, render and post the chart with its caption, or only the caption when text_only"""
+    # Importing main stays light, the Telegram client and the stores only load once a run starts
+    from Stock.render_cache import RenderCache
+    from Stock.results_store import ResultsStore
+    from telegram_bot import MyBot
+
+    profiler.enable(trace_memory=os.getenv("PROFILE_TRACEMALLOC") == "1")
     bot = MyBot()
+    start = time.perf_counter()
     try:
         ticker, period_days, interval = "^GSPC", 500, "1d"
-        analyzer = StockData(ticker, period_days, interval)
-        analyzer.analyze_pipline()
+        cache = OHLCVCache()
+        # Reruns on unchanged bars (weekends, retries after a failed send) reuse the chart and price lines
+        render_cache = RenderCache()
+        results = ResultsStore()
+        analyzer = StockData(ticker, period_days, interval, cache=cache)
 
-        message = message_generator(analyzer)
+        # yfinance keeps per-download global state, so the breadth download gets its own process
+        with ProcessPoolExecutor(max_workers=1) as breadth_pool:
+            breadth_task = asyncio.ensure_future(
+                run_stage("breadth", breadth_pool, get_total_stocks_sma, cache=cache, store=results)
+            )
+            try:
+                await run_stage("analysis", None, analyzer.analyze_pipline)
 
+                if text_only:
+                    img, breadth = None, await breadth_task
+                else:
+                    # Rendering overlaps with whatever is left of the breadth download
+                    img, breadth = await asyncio.gather(
+                        run_stage("chart", None, ImgGenerator.run, analyzer, cache=render_cache),
+                        breadth_task
+                    )
+            finally:
+                # A failed analysis or chart must not leave the download running unawaited, no-op once it is done
+                breadth_task.cancel()
 
-        img = ImgGenerator.run(analyzer)
-        await bot.send_img_to_group(img, caption=message)
+        message = message_generator(analyzer, breadth=breadth, cache=render_cache)
+        # Results are kept even when the send below fails
+        await run_stage("store", None, results.record_analysis, analyzer, message)
+        if text_only:
+            await bot.send_message_to_group(message)
+        else:
+            await bot.send_img_to_group(img, caption=message)
     except Exception as e:
         print(f"Error in main: {e}")
         raise
+    finally:
+        await bot.shutdown()
+        log(f"total: {time.perf_counter() - start:.2f}s")
+        profiler.log_summary()
+        profile_path = os.getenv("PROFILE_JSON")
+        if profile_path:
+            profiler.write_json(profile_path)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Post the daily S&P 500 chart and levels to Telegram")
+    parser.add_argument('--text-only', action='store_true', help="Post the message without rendering a chart")
+    asyncio.run(main(text_only=parser.parse_args().text_only))
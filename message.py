@@ -1,13 +1,16 @@
 from datetime import datetime
+from typing import Optional
 
 import pytz
 
 from helpers import format_number, format_value, precentage_to_close
 from sma_analyzer import get_total_stocks_sma
 from Stock.data import StockData
+from Stock.render_cache import RenderCache
 
 
-def message_generator(analyzer: StockData):
+def levels_text(analyzer: StockData) -> str:
+    """The price lines of the message, levels sorted from the highest down with their distance to the close"""
     # Prices details
     sma_fast = round(analyzer.get_last("SMA_20"), 2)
     sma_slow = round(analyzer.get_last("SMA_94"), 2)
@@ -33,14 +36,30 @@ def message_generator(analyzer: StockData):
 
     # Sort by original float values for consistency (strip % if needed for sorting)
     sorted_items = sorted(data.items(), key=lambda x: float(x[1].split()[0]), reverse=True)
+    return "\n".join(f"{key}: {format_value(value)}" for key, value in sorted_items)
+
+
+def message_generator(analyzer: StockData, breadth: Optional[str] = None, as_of: Optional[datetime] = None,
+                      cache: Optional[RenderCache] = None):
+    # The price lines only depend on the bars, a cache serves them again while those are unchanged
+    if cache is not None:
+        levels = cache.get_or_create(cache.key(analyzer, 'levels'), lambda: levels_text(analyzer).encode()).decode()
+    else:
+        levels = levels_text(analyzer)
 
     ny_timezone = pytz.timezone("America/New_York")
-    current_time = datetime.now(ny_timezone).strftime("%d-%m-%Y %H:%M")       
+    # Backtests stamp the message with the replayed bar time instead of the wall clock
+    if as_of is None:
+        as_of = datetime.now(ny_timezone)
+    elif as_of.tzinfo is not None:
+        as_of = as_of.astimezone(ny_timezone)
+    current_time = as_of.strftime("%d-%m-%Y %H:%M")
 
-    message = f"{current_time}\n" + "\n".join(
-        f"{key}: {format_value(value)}" for key, value in sorted_items
-    )
-    message += f"\n{get_total_stocks_sma()}"
+    message = f"{current_time}\n{levels}"
+    # The caller may already have computed breadth concurrently with the analysis
+    if breadth is None:
+        breadth = get_total_stocks_sma(cache=analyzer.cache)
+    message += f"\n{breadth}"
     # print(message)
 
     return message
\ No newline at end of file
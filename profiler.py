@@ -0,0 +1,272 @@
+"""
+Per-stage timing and memory instrumentation reported through github_logger.
+
+Each stage records wall time, CPU time of its thread, the process peak RSS,
+the tracemalloc peak (when enabled) and payload bytes received or sent. The
+outermost stage of a thread shows up as a collapsible GitHub Actions group,
+nested stages are only recorded. The profiler is disabled by default so library
+code can stay decorated at no cost, scheduled runs enable it.
+
+Usage:
+    from profiler import add_bytes, instrument, profiler
+
+    profiler.enable(trace_memory=True)
+
+    @instrument("download")
+    def download():
+        ...
+        add_bytes(received=len(payload))
+
+    with profiler.stage("render"):
+        ...
+
+    profiler.log_summary()
+    profiler.write_json("profile.json")
+"""
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterator, Optional
+
+from github_logger import log, log_group_end, log_group_start
+
+try:
+    import resource
+except ImportError:  # Windows has no getrusage, peak RSS is then reported as 0
+    resource = None
+
+
+@dataclass
+class StageRecord:
+    name: str
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak_rss_mb: float = 0.0
+    peak_traced_mb: Optional[float] = None
+    bytes_in: int = 0
+    bytes_out: int = 0
+    depth: int = 0
+    started: float = 0.0
+    id: str = ''
+    parent: Optional[str] = None
+    error: Optional[str] = None
+    _traced_peak: int = field(default=0, repr=False)
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _format_bytes(count: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if count < 1024:
+            return f"{count:.0f}{unit}"
+        count /= 1024
+    return f"{count:.1f}GB"
+
+
+class Profiler:
+    """Collects StageRecords, stages of concurrent threads and asyncio tasks are tracked independently"""
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.groups = True
+        self.records: list[StageRecord] = []
+        # Each thread and asyncio task sees its own stack of running stages
+        self._stack = contextvars.ContextVar('profiler_stack', default=())
+        self._group_lock = threading.Lock()
+        self._group_open = False
+        self._ids = itertools.count()
+
+    def enable(self, trace_memory: bool = False) -> None:
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def current(self) -> Optional[StageRecord]:
+        """Innermost running stage of the calling thread or task"""
+        stack = self._stack.get()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Optional[StageRecord]]:
+        """Measure the enclosed block as one stage, yields its record (None when disabled)"""
+        if not self.enabled:
+            yield None
+            return
+
+        stack = self._stack.get()
+        record = StageRecord(
+            name=name,
+            depth=len(stack),
+            id=f"{os.getpid()}-{next(self._ids)}",
+            parent=stack[-1].id if stack else None
+        )
+
+        # GitHub Actions groups can't nest or interleave, so only one is open at a time
+        with self._group_lock:
+            opens_group = self.groups and not stack and not self._group_open
+            self._group_open = self._group_open or opens_group
+        if opens_group:
+            log_group_start(name)
+
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            # The peak counter is global, keep what the enclosing stage reached so far
+            if stack:
+                stack[-1]._traced_peak = max(stack[-1]._traced_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+        token = self._stack.set(stack + (record,))
+        record.started = time.time()
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        except BaseException as e:
+            record.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record.wall = time.perf_counter() - wall_start
+            record.cpu = time.thread_time() - cpu_start
+            record.peak_rss_mb = _peak_rss_mb()
+            self._stack.reset(token)
+            if stack:
+                stack[-1].bytes_in += record.bytes_in
+                stack[-1].bytes_out += record.bytes_out
+            if tracing:
+                record._traced_peak = max(record._traced_peak, tracemalloc.get_traced_memory()[1])
+                record.peak_traced_mb = record._traced_peak / 1024 ** 2
+                if stack:
+                    stack[-1]._traced_peak = max(stack[-1]._traced_peak, record._traced_peak)
+            self.records.append(record)
+
+            log(self._describe(record))
+            if opens_group:
+                log_group_end()
+                with self._group_lock:
+                    self._group_open = False
+
+    def call(self, name: str, func: Callable, *args, **kwargs):
+        """Run func(*args, **kwargs) as one stage"""
+        with self.stage(name):
+            return func(*args, **kwargs)
+
+    def instrument(self, name: Optional[str] = None) -> Callable:
+        """Decorator running every call of a function or coroutine function as a stage"""
+        def decorator(func: Callable) -> Callable:
+            stage_name = name or func.__qualname__
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    with self.stage(stage_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.stage(stage_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_bytes(self, received: int = 0, sent: int = 0) -> None:
+        """Attribute payload bytes to the innermost stage of the calling thread or task"""
+        record = self.current() if self.enabled else None
+        if record is not None:
+            record.bytes_in += int(received)
+            record.bytes_out += int(sent)
+
+    @staticmethod
+    def _describe(record: StageRecord) -> str:
+        parts = [f"{record.name}: {record.wall:.3f}s wall", f"{record.cpu:.3f}s cpu", f"peak RSS {record.peak_rss_mb:.0f}MB"]
+        if record.peak_traced_mb is not None:
+            parts.append(f"traced peak {record.peak_traced_mb:.1f}MB")
+        if record.bytes_in or record.bytes_out:
+            parts.append(f"{_format_bytes(record.bytes_in)} in / {_format_bytes(record.bytes_out)} out")
+        if record.error:
+            parts.append(f"failed: {record.error}")
+        return " | ".join(parts)
+
+    def summary(self) -> str:
+        """Markdown table of every recorded stage, nested stages indented under the one they ran in"""
+        rows = ["| stage | wall (s) | cpu (s) | peak RSS (MB) | traced peak (MB) | in | out |",
+                "|---|---:|---:|---:|---:|---:|---:|"]
+        children = defaultdict(list)
+        for r in self.records:
+            children[r.parent].append(r)
+
+        def add_rows(parent: Optional[str]) -> None:
+            for r in sorted(children[parent], key=lambda r: r.started):
+                traced = f"{r.peak_traced_mb:.1f}" if r.peak_traced_mb is not None else "-"
+                name = "&nbsp;&nbsp;" * r.depth + r.name + (" (failed)" if r.error else "")
+                rows.append(f"| {name} | {r.wall:.3f} | {r.cpu:.3f} | {r.peak_rss_mb:.0f} | {traced} "
+                            f"| {_format_bytes(r.bytes_in)} | {_format_bytes(r.bytes_out)} |")
+                add_rows(r.id)
+
+        add_rows(None)
+        return "\n".join(rows)
+
+    def log_summary(self) -> None:
+        """Log the summary table and add it to the GitHub Actions job summary when available"""
+        if not self.records:
+            return
+        table = self.summary()
+        log_group_start("Stage profile")
+        log(table)
+        log_group_end()
+
+        summary_path = os.getenv("GITHUB_STEP_SUMMARY")
+        if summary_path:
+            with open(summary_path, 'a') as f:
+                f.write(f"### Stage profile\n\n{table}\n")
+
+    def merge(self, records: list[dict]) -> None:
+        """Add records collected elsewhere, e.g. returned by run_profiled from a worker process"""
+        self.records.extend(StageRecord(**record) for record in records)
+
+    def to_dicts(self) -> list[dict]:
+        return [{k: v for k, v in asdict(r).items() if not k.startswith('_')} for r in self.records]
+
+    def write_json(self, path: str) -> None:
+        """Write the records as a JSON profile, e.g. for upload as a workflow artifact"""
+        with open(path, 'w') as f:
+            json.dump({'created': time.time(), 'stages': self.to_dicts()}, f, indent=2)
+
+
+profiler = Profiler()
+instrument = profiler.instrument
+add_bytes = profiler.add_bytes
+
+
+def run_profiled(name: str, trace_memory: bool, func: Callable, *args, **kwargs) -> tuple[object, list[dict]]:
+    """
+    Run func as a stage inside a worker process and return (result, records) so the
+    parent can merge them, the worker's own profiler is otherwise invisible to it.
+    """
+    profiler.enable(trace_memory=trace_memory)
+    # The worker runs alongside the parent's stages, its log lines can't own a group
+    profiler.groups = False
+    profiler.records = []
+    result = profiler.call(name, func, *args, **kwargs)
+    return result, profiler.to_dicts()
@@ -1,31 +1,126 @@
-import yfinance as yf
+import asyncio
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
 
 from constants import TICKERS
+from github_logger import log_notice
+from profiler import add_bytes, instrument
+from Stock.cache import OHLCVCache
+from Stock.results_store import ResultsStore
+
+BREADTH_WINDOWS = (20, 50, 200)  # SMA windows reported by the breadth engine
+
+
+def lookback_days(windows=BREADTH_WINDOWS, history_bars: int = 1) -> int:
+    """Calendar days to download so every window has a full SMA on each of the last history_bars days"""
+    trading_days = max(windows) + history_bars - 1
+    # ~252 trading days a year plus slack for market holidays
+    return math.ceil(trading_days * 365 / 252) + 10
+
+
+@instrument()
+def _download_closes(tickers, cache: Optional[OHLCVCache], period_days: int) -> Optional[pd.DataFrame]:
+    """Daily closes as a (dates x tickers) frame, None if nothing came back"""
+    if cache is not None:
+        frames = cache.get_many(list(tickers), "1d", period_days)
+        if not frames:
+            return None
+        return pd.DataFrame({ticker: frame['Close'] for ticker, frame in frames.items()})
+
+    import yfinance as yf
+
+    df = yf.download(tickers, period=f"{period_days}d", interval="1d", group_by='ticker', progress=True, threads=4, timeout=10)
+    if df.empty or 'Close' not in df.columns.levels[1]:
+        return None
+    add_bytes(received=df.memory_usage().sum())
+    return df.xs('Close', axis=1, level=1, drop_level=True)
+
+
+@instrument()
+def compute_breadth(closes: pd.DataFrame, windows=BREADTH_WINDOWS) -> pd.DataFrame:
+    """
+    Percentage of tickers closing above their N-day SMA on every date, one column per window.
+
+    All windows come from a single cumulative sum over the (dates x tickers) close
+    matrix. An SMA needs a full window of valid closes and is carried forward over
+    gaps in a ticker's history. Dates without any valid ticker are NaN.
+    """
+    values = closes.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+
+    # Leading zero row so window sums are cumsum[t + 1] - cumsum[t + 1 - window]
+    sums = np.zeros((len(values) + 1, values.shape[1]))
+    counts = np.zeros((len(values) + 1, values.shape[1]), dtype=np.int64)
+    np.cumsum(np.where(valid, values, 0.0), axis=0, out=sums[1:])
+    np.cumsum(valid, axis=0, out=counts[1:])
 
+    rows = np.arange(len(values))
+    breadth = {}
+    for window in windows:
+        sma = np.full(values.shape, np.nan)
+        if len(values) >= window:
+            window_sums = sums[window:] - sums[:-window]
+            full = (counts[window:] - counts[:-window]) == window
+            sma[window - 1:] = np.where(full, window_sums / window, np.nan)
 
-def get_total_stocks_sma(tickers = TICKERS):
+        # Forward-fill along dates: index of the last row with a valid SMA
+        last_valid = np.maximum.accumulate(np.where(~np.isnan(sma), rows[:, None], 0), axis=0)
+        sma = sma[last_valid, np.arange(values.shape[1])]
+
+        pairs = valid & ~np.isnan(sma)
+        above = (values > sma) & pairs
+        with np.errstate(invalid='ignore', divide='ignore'):
+            breadth[f'SMA_{window}'] = above.sum(axis=1) / pairs.sum(axis=1) * 100
+
+    return pd.DataFrame(breadth, index=closes.index)
+
+
+def get_breadth(tickers = TICKERS, windows=BREADTH_WINDOWS, history_bars: int = 1,
+                cache: Optional[OHLCVCache] = None) -> pd.DataFrame:
+    """Breadth history for several SMA windows, downloading exactly the lookback they need"""
+    closes = _download_closes(tickers, cache, lookback_days(windows, history_bars))
+    if closes is None:
+        return pd.DataFrame(columns=[f'SMA_{window}' for window in windows], dtype=float)
+    return compute_breadth(closes, windows)
+
+
+def get_total_stocks_sma(tickers = TICKERS, cache: Optional[OHLCVCache] = None,
+                         store: Optional[ResultsStore] = None):
     """
     Calculate the percentage of stocks trading above their 20-day SMA
-    
+
     Args:
         tickers: List of stock ticker symbols
-        
+        cache: Optional local OHLCV cache, only missing bars are downloaded when given
+        store: Optional results store the percentage is appended to
+
     Returns:
-        float: Percentage of stocks above their 20-day SMA (rounded to 1 decimal)
+        str: Percentage of stocks above their 20-day SMA (rounded to 2 decimals)
     """
-    # Download data
-    df = yf.download(tickers, period="1mo", interval="1d", group_by='ticker', progress=True, threads=4, timeout=10)
-    
-    # Process data
-    if not df.empty and 'Close' in df.columns.levels[1]:
-        closes = df.xs('Close', axis=1, level=1, drop_level=True)
-        smas = closes.rolling(20).mean().ffill()
-        
-        # Calculate stats
-        valid_pairs = (~closes.iloc[-1].isna()) & (~smas.iloc[-1].isna())
-        above_sma = (closes.iloc[-1] > smas.iloc[-1]).sum()
-        percentage = (above_sma / valid_pairs.sum()) * 100 if valid_pairs.sum() > 0 else 0
-        
-        percentage = round(percentage, 2)
-        return f"S5TW 20 SMA: {percentage}%"
-    return f"S5TW 20 SMA: Error"
+    breadth = get_breadth(tickers, windows=(20,), cache=cache)
+    if breadth.empty:
+        return f"S5TW 20 SMA: Error"
+    if store is not None:
+        store.record_breadth(breadth.iloc[-1:])
+
+    percentage = breadth['SMA_20'].iloc[-1]
+    percentage = round(percentage, 2) if not np.isnan(percentage) else 0
+    return f"S5TW 20 SMA: {percentage}%"
+
+
+async def post_breadth(tickers = TICKERS) -> str:
+    """Post the breadth line on its own as a text message, nothing here loads the plotting stack"""
+    from telegram_bot import MyBot
+
+    breadth = get_total_stocks_sma(tickers, cache=OHLCVCache(), store=ResultsStore())
+    log_notice(breadth)
+    async with MyBot() as bot:
+        await bot.send_message_to_group(breadth)
+    return breadth
+
+
+if __name__ == "__main__":
+    asyncio.run(post_breadth())
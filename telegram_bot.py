@@ -1,41 +1,240 @@
+import asyncio
 import os
-from datetime import datetime
+import random
+import time
+from functools import partial
 from io import BytesIO
+from typing import Awaitable, Callable, Iterable, Optional, Sequence, Union
 
+import httpx
 from dotenv import load_dotenv
-from telegram import Bot, InputFile
+from telegram import Bot, InputMediaPhoto, Message
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from telegram.request import HTTPXRequest
+
+from profiler import add_bytes, instrument
 
 load_dotenv()
 
+MEDIA_GROUP_LIMIT = 10  # Most photos Telegram accepts in one album
+Photo = Union[BytesIO, bytes, str]  # An image to upload, or the file_id of one already on Telegram's servers
+# httpx errors raised before any of the request went out, the only ones a send can be repeated after
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def parse_chat_ids(value: str) -> list[int]:
+    """Chat ids from a comma separated list, e.g. GROUP_CHAT_ID=-100123,-100456"""
+    return [int(chat_id) for chat_id in value.split(',') if chat_id.strip()]
+
+
+def _file_id(message: Message) -> str:
+    # Telegram returns every size it generated, the last one is the full resolution image
+    return message.photo[-1].file_id
+
+
+class RateLimiter:
+    """
+    Spaces out sends to stay within Telegram's flood limits: about 30 messages a second
+    overall, one a second per private chat and 20 a minute per group (negative chat ids).
+    Every send reserves its slot before awaiting, so concurrent tasks queue up in order.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_interval: float = 1.0, group_interval: float = 3.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.global_interval = 1 / global_rate
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self.clock = clock
+        self._next_global = 0.0
+        self._next_chat: dict[int, float] = {}
+
+    async def acquire(self, chat_id: int, messages: int = 1) -> None:
+        """Wait for a slot to post `messages` messages to chat_id, an album counts once per photo"""
+        now = self.clock()
+        start = max(now, self._next_global, self._next_chat.get(chat_id, 0.0))
+        interval = self.group_interval if chat_id < 0 else self.chat_interval
+        self._next_global = start + self.global_interval * messages
+        self._next_chat[chat_id] = start + interval * messages
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def hold(self, chat_id: int, seconds: float) -> None:
+        """Keep chat_id quiet for seconds, after Telegram answered with a flood wait"""
+        self._next_chat[chat_id] = max(self._next_chat.get(chat_id, 0.0), self.clock() + seconds)
+
+
+class FanoutBot:
+    """
+    Posts the same messages and charts to several chats over one pooled HTTP connection.
+
+    Each image is uploaded once and the file_id Telegram returns is reused for every other
+    chat, charts go out as albums of up to 10. Sends to different chats run concurrently
+    under a RateLimiter and are retried with exponential backoff on flood waits and
+    connection errors. base_url (or TELEGRAM_API_URL) points the bot at another Bot API
+    server, e.g. a local fake one for tests and benchmarks.
+    """
+
+    def __init__(self, token: Optional[str] = None, chat_ids: Optional[Iterable[int]] = None,
+                 base_url: Optional[str] = None, limiter: Optional[RateLimiter] = None,
+                 max_retries: int = 3, backoff: float = 1.0, pool_size: int = 8):
+        token = token or os.getenv("BOT_TOKEN")
+        chat_ids = list(chat_ids) if chat_ids is not None else parse_chat_ids(os.getenv("GROUP_CHAT_ID", ""))
+        if not token or not chat_ids:
+            raise ValueError("Missing Telegram credentials in environment variables")
+
+        self.chat_ids = chat_ids
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # One pool shared by every concurrent send, media uploads get a longer write timeout
+        self.request = HTTPXRequest(connection_pool_size=pool_size, media_write_timeout=60.0)
+        self.bot = Bot(
+            token=token,
+            base_url=base_url or os.getenv("TELEGRAM_API_URL") or "https://api.telegram.org/bot",
+            request=self.request
+        )
+
+    async def __aenter__(self) -> 'FanoutBot':
+        await self.request.initialize()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await self.request.shutdown()
+
+    async def _call(self, chat_id: int, send: Callable[[], Awaitable], messages: int = 1):
+        """Run one send under the rate limiter, retrying flood waits and errors from before the request went out"""
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(chat_id, messages)
+            try:
+                return await send()
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.limiter.hold(chat_id, e.retry_after)
+            except BadRequest:
+                # A malformed request fails the same way every time
+                raise
+            except NetworkError as e:
+                # Sends aren't idempotent, a timeout after the upload may come when Telegram already posted it
+                if attempt == self.max_retries or not isinstance(e.__cause__, UNSENT_ERRORS):
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    async def _send_album(self, chat_id: int, photos: Sequence[Union[bytes, str]], captions: Sequence[str]) -> list[str]:
+        """Send up to 10 photos as one album (a lone photo as a plain one) and return their file_ids"""
+        if len(photos) == 1:
+            message = await self._call(chat_id, partial(
+                self.bot.send_photo, chat_id=chat_id, photo=photos[0], caption=captions[0], disable_notification=False))
+            return [_file_id(message)]
+
+        # InputMediaPhoto wraps the bytes in a fresh InputFile, so build them per attempt
+        messages = await self._call(chat_id, lambda: self.bot.send_media_group(
+            chat_id=chat_id,
+            media=[InputMediaPhoto(media=photo, caption=caption) for photo, caption in zip(photos, captions)],
+            disable_notification=False
+        ), messages=len(photos))
+        return [_file_id(message) for message in messages]
+
+    @instrument()
+    async def send_message(self, text: str, chat_ids: Optional[Iterable[int]] = None) -> dict[int, Optional[Exception]]:
+        """Post text to every chat, returns the error per chat (None where it went through)"""
+        chat_ids = list(chat_ids) if chat_ids is not None else self.chat_ids
+        add_bytes(sent=len(text.encode()) * len(chat_ids))
+        results = await asyncio.gather(*(
+            self._call(chat_id, partial(self.bot.send_message, chat_id=chat_id, text=text, disable_notification=False))
+            for chat_id in chat_ids
+        ), return_exceptions=True)
+        return {chat_id: r if isinstance(r, Exception) else None for chat_id, r in zip(chat_ids, results)}
+
+    @instrument()
+    async def send_charts(self, charts: Sequence[tuple[Photo, str]],
+                          chat_ids: Optional[Iterable[int]] = None) -> dict[int, Optional[Exception]]:
+        """
+        Post (image, caption) charts to every chat as albums of up to 10, in order.
+        Each album is uploaded to one chat and forwarded to the others by file_id.
+        Returns the first error per chat (None where everything went through), a chat
+        that failed an album gets none of the later ones.
+        """
+        errors: dict[int, Optional[Exception]] = {chat_id: None for chat_id in
+                                                  (list(chat_ids) if chat_ids is not None else self.chat_ids)}
+        for start in range(0, len(charts), MEDIA_GROUP_LIMIT):
+            album = charts[start:start + MEDIA_GROUP_LIMIT]
+            photos = [photo.getvalue() if isinstance(photo, BytesIO) else photo for photo, _ in album]
+            captions = [caption for _, caption in album]
+            pending = [chat_id for chat_id, error in errors.items() if error is None]
+
+            # Upload to the first chat that takes it, the rest only need the file_ids
+            file_ids = None
+            while pending and file_ids is None:
+                chat_id = pending.pop(0)
+                try:
+                    file_ids = await self._send_album(chat_id, photos, captions)
+                    add_bytes(sent=sum(len(photo) for photo in photos if isinstance(photo, bytes)))
+                except Exception as e:
+                    errors[chat_id] = e
+
+            results = await asyncio.gather(*(
+                self._send_album(chat_id, file_ids, captions) for chat_id in pending
+            ), return_exceptions=True)
+            for chat_id, result in zip(pending, results):
+                if isinstance(result, Exception):
+                    errors[chat_id] = result
+        return errors
+
+
+def _raise_first(errors: dict[int, Optional[Exception]]) -> None:
+    for error in errors.values():
+        if error is not None:
+            raise error
+
+
 class MyBot:
     def __init__(self):
         self.BOT_TOKEN = os.getenv("BOT_TOKEN")
         self.GROUP_CHAT_ID = os.getenv("GROUP_CHAT_ID")
         if not self.BOT_TOKEN or not self.GROUP_CHAT_ID:
             raise ValueError("Missing Telegram credentials in environment variables")
-        self.bot = Bot(token=self.BOT_TOKEN)
+        # GROUP_CHAT_ID may list several chats, every send goes to all of them
+        self.fanout = FanoutBot(self.BOT_TOKEN, parse_chat_ids(self.GROUP_CHAT_ID))
+        self.bot = self.fanout.bot
+
+    async def __aenter__(self) -> 'MyBot':
+        await self.fanout.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.shutdown()
 
+    async def shutdown(self) -> None:
+        """Close the pooled HTTP connections, the bot can't send afterwards"""
+        await self.fanout.close()
+
+    @instrument()
     async def send_message_to_group(self, text):
         try:
-            await self.bot.send_message(
-                chat_id=int(self.GROUP_CHAT_ID),
-                text=text,
-                disable_notification=False
-            )
+            _raise_first(await self.fanout.send_message(text))
             print("Message sent successfully.")
         except Exception as e:
             print(f"Failed to send message: {e}")
             raise
 
+    @instrument()
     async def send_img_to_group(self, image_buf: BytesIO, caption: str = ""):
         try:
-            await self.bot.send_photo(
-                chat_id=int(self.GROUP_CHAT_ID),
-                photo=image_buf,
-                caption=caption,
-                disable_notification=False
-            )
+            _raise_first(await self.fanout.send_charts([(image_buf, caption)]))
             print("High-quality image sent successfully.")
         except Exception as e:
             print(f"Failed to send image: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    async def send_charts_to_group(self, charts: Sequence[tuple[Photo, str]]):
+        """Post (image, caption) charts as albums to every configured chat"""
+        try:
+            _raise_first(await self.fanout.send_charts(charts))
+            print(f"{len(charts)} charts sent successfully.")
+        except Exception as e:
+            print(f"Failed to send charts: {e}")
+            raise